@@ -0,0 +1,324 @@
+"""
+Cross-run vote analytics over the runs' event streams.
+
+    python analytics.py                                  # every run in logs/
+    python analytics.py logs/s3_*.events.jsonl --output logs/s3_analytics.json
+    python analytics.py --save logs/votes.npz            # parse once ...
+    python analytics.py --load logs/votes.npz            # ... analyse many times
+
+Runs are loaded into dense arrays, runs x rounds x agents of int8 vote codes, and every
+metric is computed with vectorized NumPy operations over all runs at once.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+from config import LOG_DIR
+from state import Vote
+
+# int8 vote codes; ABSENT marks agents not (or no longer) on the committee, and rounds a run did not reach
+ABSENT = -1
+VOTE_CODES = {Vote.UNDECIDED: 0, Vote.A: 1, Vote.B: 2}
+UNDECIDED = VOTE_CODES[Vote.UNDECIDED]
+
+# events that happen after a round's votes, so their effect shows from the next round on;
+# the other attacks (information asymmetry, speech corruption) act within their round
+AFTER_ROUND_EVENTS = ("eviction", "memory_injection")
+
+
+class VoteTensor:
+    """
+    End-of-round votes of many runs. `votes[run, r, agent]` is the agent's vote after
+    round r, with r = 0 holding the initial (Undecided) votes. `speakers[run, r]` is the
+    agent index of round r's speaker, and `events[kind][run, r]` flags the rounds in which
+    an attack or eviction of that kind happened.
+    """
+
+    def __init__(self, run_ids: list, experiments: list, agents: list, votes: np.ndarray, speakers: np.ndarray, events: dict):
+        self.run_ids = np.asarray(run_ids)
+        self.experiments = np.asarray(experiments)
+        self.agents = list(agents)
+        self.votes = votes
+        self.speakers = speakers
+        self.events = events
+
+    def __len__(self) -> int:
+        return len(self.run_ids)
+
+    @property
+    def rounds(self) -> int:
+        return self.votes.shape[1] - 1
+
+    def select(self, mask) -> "VoteTensor":
+        """The runs a boolean mask (or index array) selects, e.g. `t.select(t.experiments == "s3")`."""
+        return VoteTensor(self.run_ids[mask], self.experiments[mask], self.agents, self.votes[mask],
+                          self.speakers[mask], {kind: flags[mask] for kind, flags in self.events.items()})
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path, run_ids=self.run_ids, experiments=self.experiments, agents=np.asarray(self.agents),
+            votes=self.votes, speakers=self.speakers, **{f"event_{kind}": flags for kind, flags in self.events.items()}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "VoteTensor":
+        with np.load(path) as data:
+            events = {name[len("event_"):]: data[name] for name in data.files if name.startswith("event_")}
+            return cls(data["run_ids"], data["experiments"], data["agents"].tolist(), data["votes"], data["speakers"], events)
+
+
+def _read_run(path: str) -> dict:
+    run = {"experiment": None, "branched_from": None, "after_round": 0, "agents": [], "votes": {}, "speakers": {}, "events": []}
+    with open(path) as f:
+        for line in f:
+            event = json.loads(line)
+            kind = event["type"]
+            if kind == "run_start":
+                run["run_id"] = event["run_id"]
+                run["experiment"] = event["experiment"]
+                run["agents"] = list(event.get("agents") or [])
+                run["branched_from"] = event.get("branched_from")
+                run["after_round"] = event.get("after_round") or 0
+            elif kind == "round_end":
+                run["votes"][event["round"]] = event["votes"]
+            elif kind == "speaker_turn":
+                run["speakers"][event["round"]] = event["agent"]
+            elif kind == "eviction":
+                run["events"].append(("eviction", event["round"]))
+            elif kind == "attack":
+                run["events"].append((event["kind"], event["round"]))
+    return run
+
+
+def load_runs(paths: list) -> VoteTensor:
+    """
+    Loads the event streams of many runs into a VoteTensor. A branch inherits the rounds
+    before its fork from its trunk, when the trunk's stream is among the loaded ones.
+    """
+    runs = [_read_run(path) for path in paths]
+    runs = [run for run in runs if "run_id" in run]
+    by_id = {run["run_id"]: run for run in runs}
+    for run in runs:
+        trunk = by_id.get(run["branched_from"])
+        if trunk is not None:
+            run["agents"] = trunk["agents"]
+            for field in ("votes", "speakers"):
+                inherited = {r: v for r, v in trunk[field].items() if r <= run["after_round"]}
+                inherited.update(run[field])
+                run[field] = inherited
+            run["events"] = [event for event in trunk["events"] if event[1] <= run["after_round"]] + run["events"]
+            run["inherited"] = True
+
+    agents = list(dict.fromkeys(name for run in runs for name in run["agents"]))
+    agent_index = {name: i for i, name in enumerate(agents)}
+    rounds = max((max(run["votes"], default=0) for run in runs), default=0)
+    kinds = sorted({kind for run in runs for kind, _ in run["events"]})
+
+    votes = np.full((len(runs), rounds + 1, len(agents)), ABSENT, dtype=np.int8)
+    speakers = np.full((len(runs), rounds + 1), ABSENT, dtype=np.int16)
+    events = {kind: np.zeros((len(runs), rounds + 1), dtype=bool) for kind in kinds}
+    for i, run in enumerate(runs):
+        if run["branched_from"] is None or run.get("inherited"):
+            votes[i, 0, [agent_index[name] for name in run["agents"]]] = UNDECIDED
+        for round_number, round_votes in run["votes"].items():
+            votes[i, round_number, [agent_index[name] for name in round_votes]] = [VOTE_CODES[Vote(v)] for v in round_votes.values()]
+        for round_number, speaker in run["speakers"].items():
+            speakers[i, round_number] = agent_index[speaker]
+        for kind, round_number in run["events"]:
+            events[kind][i, round_number] = True
+
+    return VoteTensor([run["run_id"] for run in runs], [run["experiment"] for run in runs], agents, votes, speakers, events)
+
+
+def consensus_mask(t: VoteTensor) -> np.ndarray:
+    """runs x rounds: whether every agent on the committee holds the same decided vote, as check_consensus does."""
+    present = t.votes != ABSENT
+    high = np.where(present, t.votes, np.int8(-128)).max(axis=2)
+    low = np.where(present, t.votes, np.int8(127)).min(axis=2)
+    return present.any(axis=2) & (high == low) & (low != UNDECIDED)
+
+
+def consensus_rounds(t: VoteTensor) -> np.ndarray:
+    """The first round each run reached consensus in, or -1."""
+    reached = consensus_mask(t)
+    return np.where(reached.any(axis=1), reached.argmax(axis=1), -1)
+
+
+def convergence_curve(t: VoteTensor) -> np.ndarray:
+    """Fraction of runs that have reached consensus by the end of each round (index 0 = before round 1)."""
+    return np.logical_or.accumulate(consensus_mask(t), axis=1).mean(axis=0)
+
+
+def _transitions(t: VoteTensor) -> tuple:
+    """runs x rounds x agents masks of (valid, changed, flipped) vote transitions into each round 1..R."""
+    before, after = t.votes[:, :-1], t.votes[:, 1:]
+    valid = (before != ABSENT) & (after != ABSENT)
+    changed = valid & (before != after)
+    # a flip goes straight from one option to the other, without passing through Undecided
+    flipped = changed & (before != UNDECIDED) & (after != UNDECIDED)
+    return valid, changed, flipped
+
+
+def _rate(hits: np.ndarray, valid: np.ndarray, axis) -> np.ndarray:
+    totals = valid.sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, hits.sum(axis=axis) / totals, np.nan)
+
+
+def flip_rates(t: VoteTensor) -> dict:
+    """How often votes change (any change) and flip (A <-> B), overall, per round and per agent."""
+    valid, changed, flipped = _transitions(t)
+    return {
+        "change_rate": float(_rate(changed, valid, None)),
+        "flip_rate": float(_rate(flipped, valid, None)),
+        "change_rate_by_round": _rate(changed, valid, (0, 2)),
+        "flip_rate_by_round": _rate(flipped, valid, (0, 2)),
+        "change_rate_by_agent": _rate(changed, valid, (0, 1)),
+        "flip_rate_by_agent": _rate(flipped, valid, (0, 1))
+    }
+
+
+def speaker_influence(t: VoteTensor) -> tuple:
+    """
+    speakers x listeners matrix of the rate at which a listener's vote changed in the rounds
+    the speaker spoke, and the number of such rounds behind each rate. The diagonal (a
+    speaker's own vote) is NaN.
+    """
+    valid, changed, _ = _transitions(t)
+    speakers = t.speakers[:, 1:]
+    spoke = speakers != ABSENT
+    n = len(t.agents)
+    # flat (speaker, listener) cell of every transition, counted with bincount instead of a one-hot tensor
+    cells = (speakers.astype(np.int64)[:, :, None] * n + np.arange(n))[spoke]
+    counts = np.bincount(cells[valid[spoke]], minlength=n * n).reshape(n, n)
+    hits = np.bincount(cells[changed[spoke]], minlength=n * n).reshape(n, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        influence = np.where(counts > 0, hits / counts, np.nan)
+    np.fill_diagonal(influence, np.nan)
+    return influence, counts
+
+
+def attack_effects(t: VoteTensor, window: int = 1) -> dict:
+    """
+    Per event kind, how the committee moved in the `window` rounds the event affects
+    compared with the other rounds of the same runs: the difference in vote change rate,
+    and the change in the share of decided (A or B) votes across the affected rounds.
+    """
+    valid, changed, _ = _transitions(t)
+    decided = (t.votes != ABSENT) & (t.votes != UNDECIDED)
+    present = t.votes != ABSENT
+    effects = {}
+    for kind, flags in t.events.items():
+        # the transitions into rounds r + 1 .. r + window follow an event after round r,
+        # those into rounds r .. r + window - 1 contain an in-round event of round r
+        shift = 0 if kind in AFTER_ROUND_EVENTS else 1
+        starts = flags[:, shift:shift + t.rounds]
+        affected = starts.copy()
+        for offset in range(1, window):
+            affected[:, offset:] |= starts[:, :-offset]
+        runs = flags.any(axis=1)
+        inside = affected[:, :, None] & valid & runs[:, None, None]
+        outside = ~affected[:, :, None] & valid & runs[:, None, None]
+
+        # decided share just before the first affected round and at the end of the window
+        first = np.where(affected.any(axis=1), affected.argmax(axis=1), -1)
+        last = np.minimum(first + window, t.rounds)
+        rows = np.flatnonzero(first >= 0)
+        before = decided[rows, first[rows]].sum(axis=1) / np.maximum(present[rows, first[rows]].sum(axis=1), 1)
+        after = decided[rows, last[rows]].sum(axis=1) / np.maximum(present[rows, last[rows]].sum(axis=1), 1)
+
+        change_inside = _rate(changed & inside, inside, None)
+        change_outside = _rate(changed & outside, outside, None)
+        effects[kind] = {
+            "runs": int(runs.sum()),
+            "change_rate_affected": float(change_inside),
+            "change_rate_other": float(change_outside),
+            "change_rate_delta": float(change_inside - change_outside),
+            "decided_share_delta": float(np.mean(after - before)) if len(rows) else float("nan")
+        }
+    return effects
+
+
+def report(t: VoteTensor, window: int = 1) -> dict:
+    """Every metric of a set of runs, as plain lists and numbers."""
+    reached = consensus_rounds(t)
+    influence, counts = speaker_influence(t)
+    rates = flip_rates(t)
+    return {
+        "runs": len(t),
+        "experiments": {name: int(count) for name, count in zip(*np.unique(t.experiments, return_counts=True))},
+        "agents": t.agents,
+        "consensus_rate": float((reached >= 0).mean()) if len(t) else float("nan"),
+        "mean_consensus_round": float(reached[reached >= 0].mean()) if (reached >= 0).any() else None,
+        "convergence_curve": convergence_curve(t).round(4).tolist(),
+        "flip_rates": {key: np.round(value, 4).tolist() for key, value in rates.items()},
+        "speaker_influence": {
+            speaker: {listener: (None if np.isnan(rate) else round(float(rate), 4)) for listener, rate in zip(t.agents, row)}
+            for speaker, row in zip(t.agents, influence)
+        },
+        "speaker_rounds": {speaker: int(row.max()) for speaker, row in zip(t.agents, counts)},
+        "attack_effects": attack_effects(t, window)
+    }
+
+
+def format_report(result: dict) -> str:
+    lines = [
+        f"{result['runs']} runs ({', '.join(f'{name}: {count}' for name, count in result['experiments'].items())})",
+        f"consensus rate: {result['consensus_rate']:.3f}"
+        + (f", mean consensus round {result['mean_consensus_round']:.2f}" if result["mean_consensus_round"] is not None else ""),
+        "convergence by round: " + " ".join(f"{value:.2f}" for value in result["convergence_curve"]),
+        f"vote change rate: {result['flip_rates']['change_rate']:.3f}, flip rate (A <-> B): {result['flip_rates']['flip_rate']:.3f}",
+        "",
+        "speaker influence (rate at which each listener changed vote when the row's agent spoke):",
+        f"{'':>12} " + " ".join(f"{name[:8]:>8}" for name in result["agents"])
+    ]
+    for speaker, row in result["speaker_influence"].items():
+        lines.append(f"{speaker[:12]:>12} " + " ".join(f"{'-' if rate is None else f'{rate:.2f}':>8}" for rate in row.values()))
+    if result["attack_effects"]:
+        lines.append("\nattack effects (affected rounds vs. the rest of the same runs):")
+        for kind, effect in result["attack_effects"].items():
+            lines.append(
+                f"{kind:<24} runs={effect['runs']:<6} change rate {effect['change_rate_affected']:.3f} vs {effect['change_rate_other']:.3f} "
+                f"(delta {effect['change_rate_delta']:+.3f}), decided share delta {effect['decided_share_delta']:+.3f}"
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vote analytics across many runs.")
+    parser.add_argument("paths", nargs="*", help=f"Event streams to load (default: {LOG_DIR}/*.events.jsonl).")
+    parser.add_argument("--load", type=str, metavar="NPZ", help="Analyse a tensor saved with --save instead of event streams.")
+    parser.add_argument("--save", type=str, metavar="NPZ", help="Save the loaded tensor for later analyses.")
+    parser.add_argument("--experiment", type=str, default=None, help="Only analyse runs of this experiment.")
+    parser.add_argument("--window", type=int, default=1, help="Rounds after an attack counted as affected (default: 1).")
+    parser.add_argument("--output", type=str, default=None, help="Write the report as JSON.")
+    args = parser.parse_args()
+
+    if args.load:
+        tensor = VoteTensor.load(args.load)
+    else:
+        paths = args.paths or sorted(glob.glob(f"{LOG_DIR}/*.events.jsonl"))
+        if not paths:
+            sys.exit("no event streams found")
+        tensor = load_runs(paths)
+    if args.save:
+        tensor.save(args.save)
+        print(f"tensor of {len(tensor)} runs saved to {args.save}")
+    if args.experiment:
+        tensor = tensor.select(tensor.experiments == args.experiment)
+
+    result = report(tensor, args.window)
+    print(format_report(result))
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from collections import defaultdict, deque, namedtuple
+from functools import lru_cache
+
+from config import (
+    openai_api_key, LLM_MODEL, LLM_TEMPERATURE, MAX_CONCURRENT_CALLS, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE,
+    ESTIMATED_COMPLETION_TOKENS, CHARS_PER_TOKEN, MAX_CONNECTIONS, REQUEST_TIMEOUT, MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    STRUCTURED_OUTPUT_REASKS
+)
+from ratelimit import RateLimiter
+
+# what one backend call produced: the parsed response, token usage (or None), retries spent, whether it
+# was served by an offline batch job (billed at the batch discount) and how often the model was re-asked
+# after an answer that did not match the schema (its tokens are included in the usage)
+CallResult = namedtuple("CallResult", ["response", "usage", "retries", "batch", "reasks"], defaults=[False, 0])
+
+# request/token limits of the live backend; the batch runner swaps in a limiter shared across processes
+_rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+
+def set_rate_limiter(limiter) -> None:
+    """Installs the RateLimiter every subsequent live LLM call has to wait on."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def retryable_errors() -> tuple:
+    """Errors worth retrying; anything else (bad request, auth, ...) fails immediately."""
+    import openai
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed run asks for a call that is not on the cassette."""
+
+
+class RecordedCallError(RuntimeError):
+    """Raised when a replayed call failed when it was recorded, e.g. a cheap tier that escalated."""
+
+
+class LLMBackend:
+    """Produces one structured response for a (system prompt, prompt, response_model) call."""
+
+    async def complete(self, system_prompt: str, prompt: str, response_model, model: str = LLM_MODEL) -> CallResult:
+        raise NotImplementedError
+
+
+@lru_cache(maxsize=None)
+def _strict_schema(response_model) -> str:
+    schema = response_model.model_json_schema()
+
+    def close(node):
+        # strict structured output wants every object closed and every property required
+        if isinstance(node, dict):
+            if node.get("type") == "object":
+                node["additionalProperties"] = False
+                node["required"] = list(node.get("properties", {}))
+            for value in node.values():
+                close(value)
+        elif isinstance(node, list):
+            for value in node:
+                close(value)
+
+    close(schema)
+    return json.dumps(schema)
+
+
+def response_format(response_model) -> dict:
+    """The response_format asking the provider for JSON matching the response model's schema."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": response_model.__name__, "schema": json.loads(_strict_schema(response_model)), "strict": True}
+    }
+
+
+def _add_usage(total: dict, usage: dict) -> dict:
+    if total is None or usage is None:
+        return usage or total
+    return {key: total[key] + usage[key] for key in total}
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    The live path: a pooled async OpenAI client patched with 'instructor'.
+    Transient errors are retried with backoff; the last one is re-raised.
+    Built on the first LLM call, so the client libraries are only imported then.
+    """
+
+    def __init__(self):
+        self.api_key = openai_api_key()
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        self.retryable_errors = retryable_errors()
+        self.client = None
+        self.semaphore = None
+        self._pid = None
+
+    def _ensure_client(self) -> None:
+        # connections must not cross a fork, so every worker process builds its own pool
+        if self.client is None or self._pid != os.getpid():
+            import httpx
+            from openai import AsyncOpenAI
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                timeout=REQUEST_TIMEOUT
+            )
+            # retries are handled here, where they can be counted and rate limited
+            self.client = self._wrap(AsyncOpenAI(api_key=self.api_key, http_client=http_client, max_retries=0))
+            self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+            self._pid = os.getpid()
+
+    def _wrap(self, client):
+        import instructor
+        return instructor.from_openai(client)
+
+    async def _create(self, system_prompt: str, prompt: str, response_model, model: str) -> tuple:
+        """One request for a structured response; returns the response, its usage and the re-asks it took."""
+        response, completion = await self.client.chat.completions.create_with_completion(
+            model=model,
+            response_model=response_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=LLM_TEMPERATURE,
+            # a single attempt: instructor's own re-asks would be neither counted nor rate limited
+            max_retries=1,
+        )
+        return response, _usage_dict(completion.usage), 0
+
+    async def complete(self, system_prompt: str, prompt: str, response_model, model: str = LLM_MODEL) -> CallResult:
+        self._ensure_client()
+        estimated_tokens = (len(system_prompt) + len(prompt)) // CHARS_PER_TOKEN + ESTIMATED_COMPLETION_TOKENS
+        for attempt in range(MAX_RETRIES + 1):
+            await _rate_limiter.wait_async(estimated_tokens)
+            try:
+                async with self.semaphore:
+                    response, usage, reasks = await self._create(system_prompt, prompt, response_model, model)
+            except self.retryable_errors as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logging.warning(f"LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                if usage is not None:
+                    _rate_limiter.settle(estimated_tokens, usage["total_tokens"])
+                return CallResult(response, usage, attempt, reasks=reasks)
+
+
+class NativeJSONBackend(OpenAIBackend):
+    """
+    The live path without instructor: the provider's strict JSON-schema output, validated
+    straight from the reply's JSON into the response model. A reply that still fails
+    validation is re-asked with the error, at most STRUCTURED_OUTPUT_REASKS times.
+    """
+
+    def _wrap(self, client):
+        return client
+
+    async def _create(self, system_prompt: str, prompt: str, response_model, model: str) -> tuple:
+        from pydantic import ValidationError
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        usage = None
+        for reasks in range(STRUCTURED_OUTPUT_REASKS + 1):
+            completion = await self.client.chat.completions.create(
+                model=model, messages=messages, temperature=LLM_TEMPERATURE, response_format=response_format(response_model)
+            )
+            usage = _add_usage(usage, _usage_dict(completion.usage))
+            message = completion.choices[0].message
+            if message.refusal:
+                raise ValueError(f"model refused the {response_model.__name__} call: {message.refusal}")
+            try:
+                return response_model.model_validate_json(message.content), usage, reasks
+            except ValidationError as e:
+                if reasks == STRUCTURED_OUTPUT_REASKS:
+                    raise
+                logging.warning(f"{response_model.__name__} reply did not match its schema, re-asking")
+                messages = messages + [
+                    {"role": "assistant", "content": message.content},
+                    {"role": "user", "content": f"Your reply did not match the required JSON schema:\n{e}\nReply again with corrected JSON only."}
+                ]
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Honours the provider's Retry-After header, else exponential backoff with full jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return min(RETRY_MAX_DELAY, float(value) * scale)
+                except ValueError:
+                    pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _usage_dict(usage) -> dict:
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "total_tokens": usage.total_tokens
+    }
+
+
+def cassette_key(system_prompt: str, prompt: str, response_model_name: str, model: str) -> str:
+    """Identifies a call on a cassette; the model is part of it, so the tiers of a routed call stay apart."""
+    payload = json.dumps([system_prompt, prompt, response_model_name, model])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Passes calls through to another backend and appends every result to a JSONL cassette.
+    Failed calls are recorded too, so a replay escalates or falls back where the recording did.
+    """
+
+    def __init__(self, inner: LLMBackend, cassette_path: str):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        os.makedirs(os.path.dirname(cassette_path) or ".", exist_ok=True)
+
+    async def complete(self, system_prompt: str, prompt: str, response_model, model: str = LLM_MODEL) -> CallResult:
+        entry = {
+            "key": cassette_key(system_prompt, prompt, response_model.__name__, model),
+            "response_model": response_model.__name__,
+            "model": model,
+            "system_prompt": system_prompt,
+            "prompt": prompt
+        }
+        try:
+            result = await self.inner.complete(system_prompt, prompt, response_model, model)
+        except Exception as e:
+            self._write(dict(entry, response=None, usage=None, error=f"{type(e).__name__}: {e}"))
+            raise
+        self._write(dict(entry, response=result.response.model_dump(), usage=result.usage))
+        return result
+
+    def _write(self, entry: dict) -> None:
+        # opened per call, so a crash loses nothing and forked workers never share a handle
+        with open(self.cassette_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves responses from a cassette, without network access.
+    Identical calls (same prompts, response model and model) are replayed in the order
+    they were recorded; once only one recording of a call is left, it keeps being served.
+    """
+
+    def __init__(self, cassette_path: str):
+        self.cassette_path = cassette_path
+        self.entries = defaultdict(deque)
+        with open(cassette_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    # keyed from the entry itself, so cassettes recorded before the model was part of the key still replay
+                    key = cassette_key(entry["system_prompt"], entry["prompt"], entry["response_model"], entry["model"])
+                    self.entries[key].append(entry)
+
+    async def complete(self, system_prompt: str, prompt: str, response_model, model: str = LLM_MODEL) -> CallResult:
+        queue = self.entries.get(cassette_key(system_prompt, prompt, response_model.__name__, model))
+        if not queue:
+            raise CassetteMissError(f"No recorded {response_model.__name__} response from {model} for this prompt in {self.cassette_path}")
+        entry = queue[0] if len(queue) == 1 else queue.popleft()
+        if entry.get("error"):
+            raise RecordedCallError(entry["error"])
+        return CallResult(response_model.model_validate(entry["response"]), entry["usage"], 0)
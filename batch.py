@@ -0,0 +1,83 @@
+import logging
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, LLM_CACHE_MODE, random_traits
+from ratelimit import RateLimiter
+
+
+def init_worker(limiter: RateLimiter, cache_mode: str) -> None:
+    """Installs the batch-wide rate limiter and cache mode in a freshly started worker process."""
+    from llm import set_rate_limiter, configure_cache
+    set_rate_limiter(limiter)
+    configure_cache(mode=cache_mode)
+
+
+def _run_replicate(experiment_name: str, replicate: int, run_label: str, agent_traits_list: list,
+                   seed: int = None) -> dict:
+    """Runs one replicate inside a worker process, with its own log file."""
+    from experiments import run_experiment, run_s1, run_s2, run_s3
+    from llm import configure_cache
+
+    # a distinct sample index keeps cached responses of different replicates apart
+    configure_cache(sample_index=replicate)
+    if seed is not None:
+        random.seed(seed)
+
+    if agent_traits_list is not None:
+        return run_experiment(experiment_name, agent_traits_list, run_label=run_label)
+    runners = {"s1": run_s1, "s2": run_s2, "s3": run_s3}
+    return runners[experiment_name](run_label=run_label)
+
+
+def run_replicates(experiment_name: str, replicates: int, workers: int, cache_mode: str = LLM_CACHE_MODE,
+                   traits_list: list = None, seed: int = None) -> list:
+    """
+    Runs independent replicates of one experiment across a pool of worker processes.
+    Every s0 replicate gets freshly drawn random traits; traits_list gives every
+    replicate's committee explicitly instead (one entry per replicate). With a seed,
+    replicate i draws its traits and runs from seed + i, as workqueue jobs do.
+    """
+    limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    summaries = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limiter, cache_mode)) as pool:
+        futures = {}
+        for i in range(replicates):
+            run_label = f"r{i:03d}"
+            replicate_seed = None if seed is None else seed + i
+            if traits_list:
+                agent_traits_list = traits_list[i]
+            else:
+                agent_traits_list = random_traits(random.Random(replicate_seed)) if experiment_name == "s0" else None
+            future = pool.submit(_run_replicate, experiment_name, i, run_label, agent_traits_list, replicate_seed)
+            futures[future] = run_label
+
+        for future in as_completed(futures):
+            run_label = futures[future]
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                logging.error(f"Replicate {run_label} failed: {e}")
+                summaries.append({"run": run_label, "consensus_round": None, "final_votes": {}, "fallbacks": 0, "error": str(e)})
+
+    summaries.sort(key=lambda summary: summary["run"])
+    return summaries
+
+
+def format_summary_table(summaries: list) -> str:
+    """Renders one line per run: run name, consensus round, placeholder responses and final votes."""
+    lines = [f"{'run':<36} {'consensus':>9} {'fallbacks':>9}  final votes"]
+    for summary in summaries:
+        consensus = summary["consensus_round"] if summary["consensus_round"] is not None else "-"
+        votes = summary.get("error") or ", ".join(f"{name}: {vote}" for name, vote in summary["final_votes"].items())
+        lines.append(f"{summary['run']:<36} {consensus:>9} {summary['fallbacks']:>9}  {votes}")
+
+    reached = [s["consensus_round"] for s in summaries if s["consensus_round"] is not None]
+    lines.append(f"\nconsensus reached in {len(reached)}/{len(summaries)} runs")
+    if reached:
+        lines.append(f"mean consensus round: {sum(reached) / len(reached):.2f}")
+    fallbacks = sum(s["fallbacks"] for s in summaries)
+    if fallbacks:
+        lines.append(f"WARNING: {fallbacks} LLM calls returned placeholder responses")
+    return "\n".join(lines)
@@ -0,0 +1,311 @@
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+from config import (
+    openai_api_key, LLM_TEMPERATURE, LLM_CACHE_MODE, BATCH_JOB_DIR, BATCH_JOB_POLL_INTERVAL,
+    BATCH_JOB_COMPLETION_WINDOW, BATCH_JOB_MAX_REQUESTS, BATCH_JOB_MAX_WORKERS, BATCH_JOB_WORKER_TIMEOUT
+)
+from backends import LLMBackend, CallResult, response_format
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# job states after which the provider will not change the job any more
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def request_line(custom_id: str, system_prompt: str, prompt: str, response_model, model: str) -> dict:
+    """One line of a batch input file: a chat completion constrained to the response model's JSON schema."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": LLM_TEMPERATURE,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            "response_format": response_format(response_model)
+        }
+    }
+
+
+def parse_result(result: dict, response_model) -> CallResult:
+    """The CallResult of one line of a batch output file; raises if the request failed."""
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        error = result.get("error") or response.get("body", {}).get("error")
+        raise RuntimeError(f"batch request {result.get('custom_id')} failed: {error}")
+    body = response["body"]
+    content = body["choices"][0]["message"]["content"]
+    usage = body.get("usage")
+    if usage is not None:
+        usage = {
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+            "total_tokens": usage["total_tokens"]
+        }
+    return CallResult(response_model.model_validate_json(content), usage, 0, batch=True)
+
+
+class OpenAIBatchClient:
+    """Submits batch input files to the provider's Batch API and downloads their results."""
+
+    def __init__(self):
+        import openai
+        api_key = openai_api_key()
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        self.client = openai.OpenAI(api_key=api_key)
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        job = self.client.batches.create(
+            input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_JOB_COMPLETION_WINDOW
+        )
+        return job.id
+
+    def status(self, job_id: str) -> str:
+        return self.client.batches.retrieve(job_id).status
+
+    def download(self, job_id: str, output_path: str) -> None:
+        """Writes the job's results, successful and failed requests alike, to one JSONL file."""
+        job = self.client.batches.retrieve(job_id)
+        with open(output_path, "w") as f:
+            for file_id in (job.output_file_id, job.error_file_id):
+                if file_id:
+                    f.write(self.client.files.content(file_id).text)
+
+
+class LocalBatchClient:
+    """
+    File-based stand-in for the Batch API, for running and testing batch mode offline.
+    A submitted input file is answered line by line by an LLMBackend (e.g. a replayed
+    cassette or a fake) and the results are written in the provider's output format.
+    """
+
+    def __init__(self, backend: LLMBackend):
+        from llm import RESPONSE_MODELS
+        self.backend = backend
+        self.response_models = RESPONSE_MODELS
+        self.outputs = {}
+
+    def submit(self, input_path: str) -> str:
+        job_id = os.path.basename(input_path).replace(".input.jsonl", "")
+        output_path = input_path.replace(".input.jsonl", ".local.jsonl")
+        with open(input_path) as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        async def answer_all():
+            return await asyncio.gather(*(self._answer(request) for request in requests))
+
+        with open(output_path, "w") as f:
+            for result in asyncio.run(answer_all()):
+                f.write(json.dumps(result) + "\n")
+        self.outputs[job_id] = output_path
+        return job_id
+
+    async def _answer(self, request: dict) -> dict:
+        body = request["body"]
+        system_prompt, prompt = (message["content"] for message in body["messages"])
+        response_model = self.response_models[body["response_format"]["json_schema"]["name"]]
+        try:
+            result = await self.backend.complete(system_prompt, prompt, response_model, body["model"])
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+        usage = result.usage or {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "total_tokens": 0}
+        return {
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "model": body["model"],
+                    "choices": [{"message": {"role": "assistant", "content": result.response.model_dump_json()}}],
+                    "usage": {
+                        "prompt_tokens": usage["prompt_tokens"],
+                        "completion_tokens": usage["completion_tokens"],
+                        "total_tokens": usage["total_tokens"],
+                        "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]}
+                    }
+                }
+            },
+            "error": None
+        }
+
+    def status(self, job_id: str) -> str:
+        return "completed"
+
+    def download(self, job_id: str, output_path: str) -> None:
+        os.replace(self.outputs.pop(job_id), output_path)
+
+
+def run_batch_job(client, requests: list, name: str, poll_interval: float = BATCH_JOB_POLL_INTERVAL) -> dict:
+    """
+    Sends request lines as batch jobs of at most BATCH_JOB_MAX_REQUESTS, waits for them and
+    returns their output lines by custom_id. Input and output files are kept in BATCH_JOB_DIR.
+    """
+    os.makedirs(BATCH_JOB_DIR, exist_ok=True)
+    jobs = []
+    for part, start in enumerate(range(0, len(requests), BATCH_JOB_MAX_REQUESTS)):
+        input_path = f"{BATCH_JOB_DIR}/{name}_{part:02d}.input.jsonl"
+        with open(input_path, "w") as f:
+            for request in requests[start:start + BATCH_JOB_MAX_REQUESTS]:
+                f.write(json.dumps(request) + "\n")
+        jobs.append((client.submit(input_path), input_path.replace(".input.jsonl", ".output.jsonl")))
+
+    results = {}
+    for job_id, output_path in jobs:
+        status = client.status(job_id)
+        while status not in FINAL_STATUSES:
+            time.sleep(poll_interval)
+            status = client.status(job_id)
+        if status != "completed":
+            logging.error(f"Batch job {job_id} ended as '{status}'; its requests get placeholder responses")
+        client.download(job_id, output_path)
+        with open(output_path) as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    results[result["custom_id"]] = result
+    return results
+
+
+class QueuedBatchBackend(LLMBackend):
+    """
+    Worker side of lock-step mode: instead of calling the provider, a run's calls are sent
+    to the coordinator, which answers them from the next batch job. Calls made together
+    (a round's listeners) are sent as one message, so they go out in the same job.
+    """
+
+    def __init__(self, run_label: str, requests, replies):
+        self.run_label = run_label
+        self.requests = requests
+        self.replies = replies
+        self.pending = []
+        self.sending = None
+        self.ids = itertools.count()
+
+    async def complete(self, system_prompt: str, prompt: str, response_model, model: str = None) -> CallResult:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        custom_id = f"{self.run_label}-{next(self.ids)}"
+        self.pending.append((request_line(custom_id, system_prompt, prompt, response_model, model), response_model, future))
+        if len(self.pending) == 1:
+            # calls started in the same pass of the event loop join this message
+            self.sending = loop.create_task(self._send())
+        return await future
+
+    async def _send(self) -> None:
+        pending, self.pending = self.pending, []
+        self.requests.put(("requests", self.run_label, [request for request, _, _ in pending]))
+        results = await asyncio.to_thread(self.replies.get)
+        for request, response_model, future in pending:
+            result = results.get(request["custom_id"])
+            try:
+                if result is None:
+                    raise RuntimeError(f"batch job returned no result for {request['custom_id']}")
+                future.set_result(parse_result(result, response_model))
+            except Exception as e:
+                future.set_exception(e)
+
+
+def _run_lockstep_job(experiment_name: str, traits: list, sample_index: int, run_label: str, cache_mode: str,
+                      requests, replies) -> None:
+    """
+    Runs one simulation in a process of its own, its calls answered by the coordinator's
+    batch jobs. The run's summary (or its error) goes back with the "done" message.
+    """
+    from experiments import run_experiment
+    from llm import configure_cache, set_backend, set_concurrent_calls
+
+    configure_cache(mode=cache_mode, sample_index=sample_index)
+    set_backend(QueuedBatchBackend(run_label, requests, replies))
+    # a round's independent calls must be pending together to share a job
+    set_concurrent_calls(True)
+    requests.put(("start", run_label, None))
+    try:
+        summary = run_experiment(experiment_name, traits, run_label=run_label)
+    except Exception as e:
+        summary = _failed_summary(run_label, str(e))
+    requests.put(("done", run_label, summary))
+
+
+def _failed_summary(run_label: str, error: str) -> dict:
+    return {"run": run_label, "consensus_round": None, "final_votes": {}, "fallbacks": 0, "error": error}
+
+
+def run_lockstep(experiment_name: str, traits_list: list, client, cache_mode: str = LLM_CACHE_MODE,
+                 poll_interval: float = BATCH_JOB_POLL_INTERVAL, workers: int = BATCH_JOB_MAX_WORKERS) -> list:
+    """
+    Runs one simulation per traits list, all advancing in lock-step: once every running
+    simulation is waiting on the LLM, their pending calls go out together as one batch job
+    and all of them continue when its results are back. Up to `workers` runs are in flight,
+    each in a process of its own since runs spend nearly all their time waiting; the others
+    start as runs finish. A run whose process dies is reported as failed and the others
+    carry on. Returns the run summaries.
+    """
+    manager = multiprocessing.Manager()
+    requests = manager.Queue()
+    labels = [f"r{i:03d}" for i in range(len(traits_list))]
+    replies = {label: manager.Queue() for label in labels}
+    queued = list(zip(range(len(labels)), labels, traits_list))[::-1]
+    started = time.strftime("%Y%m%d-%H%M%S")
+    processes, summaries = {}, {}
+    running, waiting = set(), {}
+    jobs = 0
+
+    def launch() -> None:
+        while queued and len(processes) - len(summaries) < workers:
+            sample_index, label, traits = queued.pop()
+            processes[label] = multiprocessing.Process(
+                target=_run_lockstep_job, name=f"lockstep-{label}",
+                args=(experiment_name, traits, sample_index, label, cache_mode, requests, replies[label])
+            )
+            processes[label].start()
+
+    def drop(label: str, summary: dict) -> None:
+        summaries[label] = summary
+        running.discard(label)
+        waiting.pop(label, None)
+        processes[label].join()
+
+    launch()
+    while len(summaries) < len(labels):
+        try:
+            kind, label, payload = requests.get(timeout=BATCH_JOB_WORKER_TIMEOUT)
+        except queue.Empty:
+            # a run whose process died (OOM, killed) never says "done"; only that run is lost
+            for label, process in processes.items():
+                if label not in summaries and not process.is_alive():
+                    logging.error(f"Lock-step run {label} ended without reporting back (exit code {process.exitcode})")
+                    drop(label, _failed_summary(label, f"process exited with code {process.exitcode}"))
+            launch()
+            kind = None
+        if kind == "start":
+            running.add(label)
+        elif kind == "requests":
+            waiting[label] = payload
+        elif kind == "done":
+            if payload.get("error"):
+                logging.error(f"Lock-step run {label} failed: {payload['error']}")
+            drop(label, payload)
+            launch()
+        if waiting and set(waiting) == running:
+            batch = [request for pending in waiting.values() for request in pending]
+            logging.info(f"Batch job {jobs}: {len(batch)} requests from {len(waiting)} runs")
+            results = run_batch_job(client, batch, f"{experiment_name}_{started}_j{jobs:04d}", poll_interval)
+            for waiting_label, pending in waiting.items():
+                replies[waiting_label].put({request["custom_id"]: results.get(request["custom_id"]) for request in pending})
+            waiting = {}
+            jobs += 1
+
+    manager.shutdown()
+    logging.info(f"{len(labels)} runs completed with {jobs} batch jobs")
+    return sorted(summaries.values(), key=lambda summary: summary["run"])
@@ -0,0 +1,64 @@
+import asyncio
+import hashlib
+import random
+import re
+
+from backends import LLMBackend, CallResult
+from config import CHARS_PER_TOKEN
+
+VOTES = ["A", "B", "Undecided"]
+# the member headings of a batched listener prompt
+LISTENER_HEADING = re.compile(r"^\s*### (\S+)$", re.MULTILINE)
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic stand-in for the provider: the same prompt always gets the same response,
+    after `latency` seconds. Responses are derived from a hash of the prompt, so runs are
+    reproducible without the network and votes still vary between agents and rounds.
+    A `slow_fraction` of requests, drawn from a seeded generator, take `slow_factor` times
+    as long, like the provider's latency tail.
+    """
+
+    def __init__(self, latency: float = 0.0, thoughts_chars: int = 400, slow_fraction: float = 0.0,
+                 slow_factor: float = 20.0, seed: int = 0):
+        self.latency = latency
+        self.thoughts_chars = thoughts_chars
+        self.slow_fraction = slow_fraction
+        self.slow_factor = slow_factor
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def complete(self, system_prompt: str, prompt: str, response_model, model: str = None) -> CallResult:
+        self.calls += 1
+        if self.latency:
+            slow = self.slow_fraction and self.random.random() < self.slow_fraction
+            await asyncio.sleep(self.latency * (self.slow_factor if slow else 1))
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        vote = VOTES[int(digest[:8], 16) % len(VOTES)]
+        thoughts = (digest * (self.thoughts_chars // len(digest) + 1))[:self.thoughts_chars]
+        fields = {
+            "thoughts": thoughts,
+            "speech": f"I propose option {vote}. {thoughts[:120]}",
+            "vote": vote,
+            "rewritten_speech": f"Option {vote}, and nothing else. {thoughts[:120]}",
+            "summary": thoughts[:self.thoughts_chars // 2]
+        }
+        completion_tokens = self.thoughts_chars // CHARS_PER_TOKEN
+        if "responses" in response_model.model_fields:
+            # a batched listener call: one entry per listener named in the prompt, each with its own vote
+            names = LISTENER_HEADING.findall(prompt)
+            fields["responses"] = [
+                {"agent_name": name, "thoughts": thoughts, "vote": VOTES[(int(digest[:8], 16) + i) % len(VOTES)]}
+                for i, name in enumerate(names)
+            ]
+            completion_tokens *= max(1, len(names))
+        response = response_model(**{name: fields[name] for name in response_model.model_fields})
+        prompt_tokens = (len(system_prompt) + len(prompt)) // CHARS_PER_TOKEN
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": 0,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+        return CallResult(response, usage, 0)
@@ -0,0 +1,379 @@
+"""
+Offline benchmarks of the round engine and prompt builders, run against a deterministic fake LLM.
+
+    python -m benchmarks.run                                   # full matrix
+    python -m benchmarks.run --quick                           # small matrix, for a quick check
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Every case reports throughput, p50/p99 latency of its unit of work and peak traced memory.
+With --compare, a case that got slower or bigger than the baseline by more than the
+tolerance is reported as a regression and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import llm
+from benchmarks.fake_llm import FakeLLMBackend
+from config import PROBLEM, TRAIT_NAMES, FIXED_TRAITS
+from core import run_simulation_round, record_round_votes, format_history_for_prompt, set_listener_batch_size
+from ledger import start_ledger
+from memory import append_scratchpad, reset_memory_stats
+from prompts import get_main_prompt, get_listener_prompt, get_eviction_prompt
+from state import SimulationState, AgentState, Scratchpad, Transcript, Vote
+
+COMMITTEE_SIZES = [4, 16, 64, 256]
+RUN_LENGTHS = [10, 100, 1000]
+QUICK_COMMITTEE_SIZES = [4, 16]
+QUICK_RUN_LENGTHS = [10, 100]
+EXPERIMENTS = ["s1", "s2", "s3"]
+# listeners per call in the batched round cases, run for committees larger than this
+LISTENER_BATCH = 8
+# the latency tail of the hedging cases: this fraction of calls takes HEDGE_SLOW_FACTOR times the base latency
+HEDGE_SLOW_FRACTION = 0.02
+HEDGE_SLOW_FACTOR = 25.0
+HEDGE_BASE_LATENCY = 0.002
+
+# metrics compared against a baseline, by suffix: latencies and memory must not grow, throughputs must not drop
+LOWER_IS_BETTER = ("_ms", "peak_mb", "seconds")
+HIGHER_IS_BETTER = ("_per_s",)
+# latency changes smaller than this are timer noise, whatever their relative size
+MIN_LATENCY_DELTA_MS = 0.05
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def timing_metrics(samples: list, unit: str) -> dict:
+    """Throughput and p50/p99 latency of a list of per-unit durations in seconds."""
+    total = sum(samples)
+    return {
+        f"{unit}_per_s": round(len(samples) / total, 2) if total else None,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4)
+    }
+
+
+def peak_memory_mb(workload) -> float:
+    """Peak traced allocation of a workload, measured in a pass of its own so timings stay untraced."""
+    tracemalloc.start()
+    workload()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1_000_000, 2)
+
+
+def committee(size: int, seed: int = 0) -> SimulationState:
+    """A fresh state with `size` agents named Agent000, Agent001, ... and seeded random traits."""
+    rng = random.Random(seed)
+    return SimulationState.create({
+        f"Agent{i:03d}": AgentState(
+            traits={name: round(rng.random(), 2) for name in TRAIT_NAMES}, current_vote=Vote.UNDECIDED,
+            base="My initial thoughts:\n", summary="", entries=Scratchpad.empty()
+        )
+        for i in range(size)
+    })
+
+
+def bench_history(rounds: int, committee_size: int = 4) -> dict:
+    """Appending a round to the transcript and rendering the history, as every round does."""
+    votes = {f"Agent{i:03d}": Vote.A for i in range(committee_size)}
+    speech = "Round 0 - Agent000: " + "x" * 300
+
+    def workload(samples=None):
+        transcript = Transcript.empty()
+        for _ in range(rounds):
+            started = time.perf_counter()
+            transcript = transcript.append_round(speech, votes)
+            format_history_for_prompt(SimulationState.create({}).replace(transcript=transcript))
+            if samples is not None:
+                samples.append(time.perf_counter() - started)
+
+    samples = []
+    workload(samples)
+    return dict(timing_metrics(samples, "rounds"), peak_mb=peak_memory_mb(workload))
+
+
+def bench_prompts(rounds: int, calls: int = 1000) -> dict:
+    """The prompt builders with a history and scratchpad as long as they are after `rounds` rounds."""
+    transcript = Transcript.empty()
+    agent = committee(1).agents["Agent000"]
+    for round_number in range(1, rounds + 1):
+        transcript = transcript.append_round(f"Round {round_number} - Agent000: " + "x" * 300, {"Agent000": Vote.A})
+        agent = append_scratchpad(agent, "\n\nRound note:\n" + "y" * 400, round_number, "listener")
+    history = transcript.render()
+    scratchpad = agent.scratchpad
+    others = ["Agent001", "Agent002", "Agent003"]
+
+    builders = {
+        "main": lambda: get_main_prompt("Agent000", agent.traits, PROBLEM, others, history, scratchpad),
+        "listener": lambda: get_listener_prompt("Agent000", agent.traits, PROBLEM, history, "Agent001", "A speech.", scratchpad),
+        "eviction": lambda: get_eviction_prompt("Agent000", agent.traits, PROBLEM, history, "Agent003 was evicted.", scratchpad)
+    }
+    results = {}
+    for name, build in builders.items():
+        samples = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            build()
+            samples.append(time.perf_counter() - started)
+        for metric, value in timing_metrics(samples, "prompts").items():
+            results[f"{name}_{metric}"] = value
+    results["prompt_chars"] = len(builders["main"]())
+    return results
+
+
+def bench_rounds(committee_size: int, rounds: int, backend: FakeLLMBackend, listener_batch: int = 1) -> dict:
+    """run_simulation_round and the end-of-round bookkeeping, for a committee of `committee_size` agents."""
+
+    def workload(samples=None):
+        set_listener_batch_size(listener_batch)
+        start_ledger()
+        reset_memory_stats()
+        simulation = committee(committee_size)
+        names = list(simulation.agents)
+        for round_number in range(1, rounds + 1):
+            started = time.perf_counter()
+            simulation = run_simulation_round(simulation, round_number, names, PROBLEM)
+            simulation, _ = record_round_votes(simulation)
+            if samples is not None:
+                samples.append(time.perf_counter() - started)
+
+    samples = []
+    calls_before = backend.calls
+    workload(samples)
+    calls = backend.calls - calls_before
+    results = timing_metrics(samples, "rounds")
+    results["calls_per_s"] = round(calls / sum(samples), 2)
+    results["calls_per_round"] = round(calls / rounds, 2)
+    results["peak_mb"] = peak_memory_mb(workload)
+    set_listener_batch_size(1)
+    return results
+
+
+def bench_hedging(rounds: int, hedging: bool) -> dict:
+    """Rounds of a 4-agent committee against a fake LLM with a latency tail, with or without hedged requests."""
+    backend = FakeLLMBackend(latency=HEDGE_BASE_LATENCY, slow_fraction=HEDGE_SLOW_FRACTION, slow_factor=HEDGE_SLOW_FACTOR)
+    previous = llm._backend
+    llm.set_backend(backend)
+    llm.set_hedging(hedging)
+    llm.reset_llm_stats()
+    try:
+        ledger = start_ledger()
+        simulation = committee(4)
+        names = list(simulation.agents)
+        samples = []
+        for round_number in range(1, rounds + 1):
+            started = time.perf_counter()
+            simulation = run_simulation_round(simulation, round_number, names, PROBLEM)
+            simulation, _ = record_round_votes(simulation)
+            samples.append(time.perf_counter() - started)
+    finally:
+        llm.set_hedging(False)
+        llm.set_backend(previous)
+    calls = [record["latency"] for record in ledger.records]
+    return dict(
+        timing_metrics(samples, "rounds"),
+        call_p50_ms=round(percentile(calls, 0.50) * 1000, 4),
+        call_p99_ms=round(percentile(calls, 0.99) * 1000, 4),
+        hedges=llm.get_llm_stats()["hedges"],
+        calls=backend.calls
+    )
+
+
+def bench_parsing(calls: int = 500) -> dict:
+    """
+    Turning a reply into a response model: instructor's handling of a tool-call completion
+    against validating the JSON of a native structured-output reply directly.
+    """
+    import instructor
+    from backends import response_format
+    from instructor.process_response import handle_response_model, process_response
+    from openai.types.chat import ChatCompletion
+
+    backend = FakeLLMBackend()
+    results = {}
+    for response_model in (llm.SpeakerDeliberation, llm.ListenerResponse, llm.Reflection, llm.CorruptedSpeech):
+        content = asyncio.run(backend.complete("", "prompt", response_model)).response.model_dump_json()
+        completion = ChatCompletion.model_validate({
+            "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                "role": "assistant", "content": None,
+                "tool_calls": [{"id": "call", "type": "function", "function": {"name": response_model.__name__, "arguments": content}}]
+            }}]
+        })
+        paths = {
+            # instructor builds the request's tool schema and validates the tool call's arguments on every call
+            "instructor": lambda: process_response(
+                completion, response_model=handle_response_model(response_model, instructor.Mode.TOOLS)[0],
+                stream=False, mode=instructor.Mode.TOOLS
+            ),
+            "native": lambda: (response_format(response_model), response_model.model_validate_json(content))
+        }
+        for path, parse in paths.items():
+            samples = []
+            for _ in range(calls):
+                started = time.perf_counter()
+                parse()
+                samples.append(time.perf_counter() - started)
+            results[f"{response_model.__name__}_{path}_p50_ms"] = round(percentile(samples, 0.50) * 1000, 4)
+    return results
+
+
+def bench_experiment(experiment_name: str) -> dict:
+    """A full experiment as main.py runs it, with logs, ledger, events and checkpoints written to a temp dir."""
+    from experiments import run_experiment, run_s2, run_s3
+
+    runners = {
+        "s1": lambda: run_experiment("s1", FIXED_TRAITS, run_label="bench"),
+        "s2": lambda: run_s2(run_label="bench"),
+        "s3": lambda: run_s3(run_label="bench")
+    }
+
+    def workload():
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                return runners[experiment_name]()
+            finally:
+                os.chdir(cwd)
+                _quiet_logging()
+
+    started = time.perf_counter()
+    summary = workload()
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 4),
+        "calls": summary["calls"],
+        "calls_per_s": round(summary["calls"] / seconds, 2),
+        "peak_mb": peak_memory_mb(workload)
+    }
+
+
+def _quiet_logging() -> None:
+    logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()], force=True)
+
+
+def run_suite(committee_sizes: list, run_lengths: list, experiments: list, latency: float) -> dict:
+    backend = FakeLLMBackend(latency=latency)
+    llm.set_backend(backend)
+    _quiet_logging()
+
+    cases = {}
+    for rounds in run_lengths:
+        cases[f"history/rounds={rounds}"] = lambda rounds=rounds: bench_history(rounds)
+        cases[f"prompts/rounds={rounds}"] = lambda rounds=rounds: bench_prompts(rounds)
+    for size in committee_sizes:
+        cases[f"round/committee={size}/rounds=10"] = lambda size=size: bench_rounds(size, 10, backend)
+        if size > LISTENER_BATCH:
+            cases[f"round/committee={size}/rounds=10/batch={LISTENER_BATCH}"] = (
+                lambda size=size: bench_rounds(size, 10, backend, LISTENER_BATCH)
+            )
+    for rounds in run_lengths:
+        if rounds != 10:
+            cases[f"round/committee=4/rounds={rounds}"] = lambda rounds=rounds: bench_rounds(4, rounds, backend)
+    cases["parse/structured-output"] = bench_parsing
+    for hedging in (False, True):
+        cases[f"round/committee=4/rounds=100/tail/hedge={hedging}"] = lambda hedging=hedging: bench_hedging(100, hedging)
+    for experiment_name in experiments:
+        cases[f"experiment/{experiment_name}"] = lambda experiment_name=experiment_name: bench_experiment(experiment_name)
+
+    results = {}
+    for name, case in cases.items():
+        started = time.perf_counter()
+        results[name] = case()
+        print(f"{name:<36} {time.perf_counter() - started:>7.2f}s  {results[name]}", file=sys.stderr)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fake_latency": latency
+        },
+        "results": results
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Every metric that is worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+    for case, metrics in results["results"].items():
+        base_metrics = baseline["results"].get(case)
+        if base_metrics is None:
+            continue
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(base, (int, float)) or not base:
+                continue
+            if metric.endswith("_ms") and value - base < MIN_LATENCY_DELTA_MS:
+                continue
+            if metric.endswith(LOWER_IS_BETTER):
+                change = (value - base) / base
+            elif metric.endswith(HIGHER_IS_BETTER):
+                change = (base - value) / base
+            else:
+                continue
+            if change > tolerance:
+                regressions.append(f"{case} {metric}: {base} -> {value} ({change:+.0%} worse)")
+    return regressions
+
+
+def format_results(results: dict) -> str:
+    lines = []
+    for case, metrics in results["results"].items():
+        shown = ", ".join(f"{metric}={value}" for metric, value in metrics.items() if value is not None)
+        lines.append(f"{case:<36} {shown}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the round engine and prompt builders.")
+    parser.add_argument("--quick", action="store_true", help="Smaller committees and shorter runs.")
+    parser.add_argument("--committee-sizes", type=int, nargs="+", default=None, help=f"Committee sizes (default: {COMMITTEE_SIZES}).")
+    parser.add_argument("--run-lengths", type=int, nargs="+", default=None, help=f"Run lengths in rounds (default: {RUN_LENGTHS}).")
+    parser.add_argument("--experiments", type=str, nargs="*", default=EXPERIMENTS, help=f"Full experiments to run (default: {EXPERIMENTS}).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake LLM takes per call (default: 0).")
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON.")
+    parser.add_argument("--save-baseline", type=str, metavar="PATH", default=None, help="Write the results as the new baseline.")
+    parser.add_argument("--compare", type=str, metavar="PATH", default=None, help="Compare against a saved baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown/growth vs. the baseline (default: 0.25).")
+    args = parser.parse_args()
+
+    committee_sizes = args.committee_sizes or (QUICK_COMMITTEE_SIZES if args.quick else COMMITTEE_SIZES)
+    run_lengths = args.run_lengths or (QUICK_RUN_LENGTHS if args.quick else RUN_LENGTHS)
+    results = run_suite(committee_sizes, run_lengths, args.experiments, args.latency)
+    print(format_results(results))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import LOG_DIR, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, LLM_CACHE_MODE, BRANCH_SAMPLE_INDEX_BASE, random_traits
+from ratelimit import RateLimiter
+from batch import init_worker
+
+
+def eviction_variants(agents: list, after_round: int) -> list:
+    """One variant per agent, evicting that agent after the given round instead of the scenario's default."""
+    return [
+        {"eviction": {
+            "after_round": after_round, "agent": agent,
+            "message": f"{agent} has been evicted from the committee. {agent} will not participate further."
+        }}
+        for agent in agents
+    ]
+
+
+def eviction_round(scenario: dict, branch_after: int = None) -> int:
+    """
+    The round after which --evict variants evict: the scenario's own eviction round, else
+    the fork round. None when the scenario schedules no eviction and there is no fork.
+    """
+    return (scenario.get("eviction") or {}).get("after_round", branch_after)
+
+
+def branch_sample_index(branch: int) -> int:
+    """The branch's cache sample index, clear of the small indices of local replicates."""
+    return BRANCH_SAMPLE_INDEX_BASE + branch
+
+
+def load_variants(path: str) -> list:
+    """Reads variants from a JSON file holding a list of scenario overrides."""
+    with open(path) as f:
+        variants = json.load(f)
+    if not isinstance(variants, list) or not all(isinstance(variant, dict) for variant in variants):
+        raise ValueError(f"{path} must contain a JSON list of scenario overrides")
+    return variants
+
+
+def apply_variant(scenario: dict, variant: dict) -> dict:
+    """
+    The scenario with a variant's overrides applied. Nested settings (eviction, attacks)
+    are merged key by key, so a variant only has to name what it changes.
+    """
+    merged = dict(scenario)
+    for key, value in variant.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = dict(merged[key], **value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _run_branch(checkpoint: dict, branch: int, run_label: str) -> dict:
+    """Runs one branch inside a worker process, continuing from the trunk's checkpoint."""
+    from experiments import run_scenario
+    from llm import configure_cache
+
+    # a distinct sample index keeps cached responses of different branches apart
+    configure_cache(sample_index=branch_sample_index(branch))
+    return run_scenario(checkpoint["experiment"], checkpoint["scenario"], run_label, checkpoint)
+
+
+def run_branches(experiment_name: str, fork_after_round: int, variants: list, workers: int,
+                 cache_mode: str = LLM_CACHE_MODE, traits: list = None) -> list:
+    """
+    Runs the rounds all variants share once (the trunk), then forks one branch per variant
+    from the trunk's checkpoint and runs the branches across a pool of worker processes.
+    Each variant's overrides apply from the fork round's events on, e.g. a different
+    eviction target after round 3 of s2. `traits` replaces the scenario's committee.
+    Returns the trunk summary followed by the branches'.
+    """
+    from experiments import SCENARIOS, run_scenario
+    from checkpoint import load_checkpoint
+
+    scenario = dict(SCENARIOS[experiment_name])
+    if traits:
+        scenario["traits"] = traits
+    elif "traits" not in scenario:
+        scenario["traits"] = random_traits()
+
+    trunk = run_scenario(experiment_name, scenario, run_label="trunk", stop_after_round=fork_after_round)
+    trunk_checkpoint = load_checkpoint(trunk["run"])
+    if trunk_checkpoint["consensus"]:
+        logging.warning(f"Trunk {trunk['run']} reached consensus before round {fork_after_round}; branches will stop immediately")
+
+    base_run_id = trunk["run"][:-len("_trunk")]
+    limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    summaries = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limiter, cache_mode)) as pool:
+        futures = {}
+        for i, variant in enumerate(variants):
+            run_label = f"b{i:02d}"
+            run_id = f"{base_run_id}_{run_label}"
+            checkpoint = dict(
+                trunk_checkpoint,
+                run_id=run_id,
+                scenario=apply_variant(trunk_checkpoint["scenario"], variant),
+                log_filename=f"{LOG_DIR}/{run_id}.log",
+                branched_from=trunk["run"],
+                finished=False,
+                # a branch is billed for its own rounds only; the trunk's ledger has the shared ones
+                ledger={"records": [], "elapsed": 0.0},
+                events=None
+            )
+            future = pool.submit(_run_branch, checkpoint, i, run_label)
+            futures[future] = run_id
+
+        for future in as_completed(futures):
+            run_id = futures[future]
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                logging.error(f"Branch {run_id} failed: {e}")
+                summaries.append({"run": run_id, "consensus_round": None, "final_votes": {}, "fallbacks": 0, "error": str(e)})
+
+    summaries.sort(key=lambda summary: summary["run"])
+    return [trunk] + summaries
@@ -0,0 +1,80 @@
+import json
+import os
+
+from config import LOG_DIR
+from state import SimulationState, AgentState, MemoryEntry, Rope, Scratchpad, Transcript, Vote
+
+CHECKPOINT_VERSION = 3
+
+
+def checkpoint_path(run_id: str) -> str:
+    return f"{LOG_DIR}/{run_id}.checkpoint.json"
+
+
+def state_to_dict(state: SimulationState) -> dict:
+    """A JSON-serializable copy of the simulation state."""
+    return {
+        "agents": {
+            name: {
+                "traits": agent.traits,
+                "current_vote": agent.current_vote,
+                "base": agent.base,
+                "summary": agent.summary,
+                "entries": [{field: getattr(entry, field) for field in MemoryEntry._fields} for entry in agent.entries]
+            }
+            for name, agent in state.agents.items()
+        },
+        "speeches": list(state.speeches),
+        "votes_history": list(state.votes_history),
+        "transcript": state.transcript.blocks
+    }
+
+
+def state_from_dict(data: dict) -> SimulationState:
+    agents = {
+        name: AgentState(
+            traits=agent["traits"],
+            current_vote=Vote(agent["current_vote"]),
+            base=agent["base"],
+            summary=agent["summary"],
+            entries=Scratchpad.from_segments(MemoryEntry(**entry) for entry in agent["entries"])
+        )
+        for name, agent in data["agents"].items()
+    }
+    return SimulationState.create(agents).replace(
+        speeches=Rope.from_segments(data["speeches"]),
+        votes_history=Rope.from_segments({name: Vote(vote) for name, vote in votes.items()} for votes in data["votes_history"]),
+        transcript=Transcript.from_segments(data["transcript"])
+    )
+
+
+def save_checkpoint(run_id: str, checkpoint: dict) -> None:
+    """
+    Writes the checkpoint atomically: to a temporary file first, flushed to disk,
+    then renamed over the previous checkpoint, so a crash never leaves a torn file.
+    """
+    path = checkpoint_path(run_id)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dict(checkpoint, version=CHECKPOINT_VERSION), f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(run_id: str) -> dict:
+    path = checkpoint_path(run_id)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No checkpoint for run '{run_id}' at {path}")
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint {path} has unsupported version {checkpoint.get('version')}")
+    return checkpoint
+
+
+def mark_finished(run_id: str) -> None:
+    """Flags a run's checkpoint once the run has been summarized, so it is not resumed again."""
+    checkpoint = load_checkpoint(run_id)
+    checkpoint["finished"] = True
+    save_checkpoint(run_id, checkpoint)
@@ -0,0 +1,35 @@
+import random
+
+from config import AGENT_NAMES, TRAIT_NAMES, TRAIT_DISTRIBUTIONS
+
+
+def committee_names(size: int) -> list:
+    """Seat names of a committee: the named agents first, then Agent005, Agent006, ..."""
+    return AGENT_NAMES[:size] + [f"Agent{i:03d}" for i in range(len(AGENT_NAMES) + 1, size + 1)]
+
+
+def committee_problem(problem: str, names: list) -> str:
+    """The problem statement with its {committee} placeholder replaced by the consensus rule and the members."""
+    committee = (
+        f"CONSENSUS RULE: All {len(names)} active committee members must vote for the same option to reach consensus.\n\n"
+        "The committee members are:\n" + "".join(f"- {name}\n" for name in names)
+    )
+    return problem.replace("{committee}", committee)
+
+
+def draw_trait(distribution: tuple, rng=random) -> float:
+    kind, *params = distribution
+    if kind == "uniform":
+        value = rng.uniform(*params)
+    elif kind == "beta":
+        value = rng.betavariate(*params)
+    elif kind == "normal":
+        value = rng.gauss(*params)
+    else:
+        raise ValueError(f"Unknown trait distribution '{kind}', expected 'uniform', 'beta' or 'normal'")
+    return min(1.0, max(0.0, value))
+
+
+def sample_traits(size: int, distributions: dict = TRAIT_DISTRIBUTIONS, rng=random) -> list:
+    """Traits for a committee of `size` agents, each trait drawn from its distribution."""
+    return [{name: draw_trait(distributions[name], rng) for name in TRAIT_NAMES} for _ in range(size)]
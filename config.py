@@ -1,24 +1,145 @@
 import os
-from dotenv import load_dotenv
 import random
 
 # simulation settings
 AGENT_NAMES = ["Alice", "Bob", "Charlie", "David"]
 MAX_ROUNDS = 10
 LOG_DIR = "logs"
+STORE_DIR = "logs/store"  # columnar store of past runs, built from the logs by logstore.py
 
 # llm settings
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+def openai_api_key() -> str:
+    """The API key from the environment or a .env file, read when a client is built so imports need no credentials."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY")
+
 LLM_MODEL = "gpt-5" 
+LLM_TEMPERATURE = 1
+
+# response cache settings - "readwrite" (read-through), "readonly" (offline replay) or "off"
+LLM_CACHE_MODE = "off"
+LLM_CACHE_PATH = ".cache/llm_responses.sqlite"
+LLM_CACHE_MAX_BYTES = 1_000_000_000
+LLM_CACHE_MAX_AGE_DAYS = 90
+BRANCH_SAMPLE_INDEX_BASE = 100_000  # branches use sample indices from here on, clear of the replicates' 0..N-1
+
+# concurrency settings - listeners (and s2 reflections) within a round are independent,
+# so their calls can be sent together; results are still applied in agent order
+CONCURRENT_CALLS = False
+MAX_CONCURRENT_CALLS = 8
+
+# prompt layout - "classic" puts each agent's name and traits first; "shared_prefix" orders content from
+# most to least shared (problem, history, speech, then the agent's own block) so provider prompt caching
+# can reuse the common prefix across all calls of a round
+PROMPT_LAYOUT = "classic"
+# agent identity blocks kept rendered; one per (agent, traits, committee), so a long sweep of sampled
+# committees would otherwise grow the cache without bound
+AGENT_BLOCK_CACHE_SIZE = 1024
+
+# scratchpad memory settings - when a scratchpad exceeds the token budget, its older notes are folded
+# into a summary written by a cheaper model; the most recent notes and injected content stay verbatim
+SCRATCHPAD_TOKEN_BUDGET = None  # None keeps the full scratchpad in every prompt
+SCRATCHPAD_KEEP_RECENT = 3
+SUMMARY_MODEL = "gpt-5-mini"
+CHARS_PER_TOKEN = 4  # rough estimate, used for budgets before the provider reports real usage
+
+# model routing - the models each call role tries in order: the first answers unless its structured output fails
+# (validation error, placeholder), then the call escalates to the next one. A scenario's "models" entry and --route
+# override these per role; the last model of a role is the reference the ledger reports cost and latency savings against
+MODEL_ROUTES = {
+    "speaker": [LLM_MODEL],
+    "listener": [LLM_MODEL],
+    "reflection": [LLM_MODEL],
+    "corruption": [LLM_MODEL],
+    "summarization": [SUMMARY_MODEL],
+}
+
+# cost and budget settings - USD per 1M tokens; a run stops at the end of the round in which a budget is hit
+MODEL_PRICES = {
+    "gpt-5": {"input": 1.25, "cached_input": 0.125, "output": 10.00},
+    "gpt-5-mini": {"input": 0.25, "cached_input": 0.025, "output": 2.00},
+    "gpt-5-nano": {"input": 0.05, "cached_input": 0.005, "output": 0.40},
+}
+RUN_BUDGET_TOKENS = None
+RUN_BUDGET_DOLLARS = None
+RUN_BUDGET_SECONDS = None
+
+# client settings - provider limits (shared by all batch workers), connection pool and retry behaviour
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 2_000_000
+ESTIMATED_COMPLETION_TOKENS = 2000  # reserved per call until the real usage is known
+MAX_CONNECTIONS = 32
+REQUEST_TIMEOUT = 300
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+CIRCUIT_BREAKER_THRESHOLD = 5  # consecutive failures before calls stop being sent
+CIRCUIT_BREAKER_COOLDOWN = 60.0
+
+# structured output - "instructor" patches the client and has the model answer with a tool call; "native" asks for
+# the provider's JSON-schema output and validates the reply straight into the response model, re-asking at most
+# STRUCTURED_OUTPUT_REASKS times (counted in the ledger) when it does not match
+STRUCTURED_OUTPUT = "instructor"
+STRUCTURED_OUTPUT_REASKS = 1
+
+# hedged requests - a call still unanswered after HEDGE_PERCENTILE of its role's recent latencies is sent a
+# second time; the first valid response wins and the other request is cancelled. Off by default: a hedge can
+# double a call's tokens, so it trades spend for tail latency on the round's critical path
+HEDGE_REQUESTS = False
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # latencies a role and model need before their calls are hedged
+HEDGE_WINDOW = 200  # recent latencies per role and model the percentile is taken over
+
+# offline batch-job settings - runs advance in lock-step and every pending call of all runs goes out as one
+# provider batch job (JSONL in, JSONL out), trading latency for throughput and the batch price
+BATCH_JOB_DIR = "logs/batch_jobs"
+BATCH_JOB_POLL_INTERVAL = 30.0  # seconds between status checks of a submitted job
+BATCH_JOB_COMPLETION_WINDOW = "24h"
+BATCH_JOB_MAX_REQUESTS = 50_000  # provider limit per job; larger rounds are split across jobs
+BATCH_JOB_PRICE_FACTOR = 0.5  # batch calls cost this fraction of MODEL_PRICES
+BATCH_JOB_MAX_WORKERS = 64  # runs in flight at once, one worker process each; the rest start as runs finish
+BATCH_JOB_WORKER_TIMEOUT = 60.0  # seconds the coordinator waits for a message before checking for dead workers
 
 # experiment settings - s0: agents with random trait values
-RANDOM_TRAITS = [
-    {"damage_avoidance": random.random(), "conformity_pressure": random.random(), "information_processing_rate": random.random()},
-    {"damage_avoidance": random.random(), "conformity_pressure": random.random(), "information_processing_rate": random.random()},
-    {"damage_avoidance": random.random(), "conformity_pressure": random.random(), "information_processing_rate": random.random()},
-    {"damage_avoidance": random.random(), "conformity_pressure": random.random(), "information_processing_rate": random.random()}
-]
+def random_traits(rng=random) -> list:
+    """Draws a fresh set of random trait values for every agent."""
+    return [
+        {"damage_avoidance": rng.random(), "conformity_pressure": rng.random(), "information_processing_rate": rng.random()}
+        for _ in AGENT_NAMES
+    ]
+
+
+# trait-space sweep settings - a sweep runs committees from a grid or Sobol design over the traits and
+# keeps sampling a design point only until the confidence interval of its consensus rate is narrow enough
+TRAIT_NAMES = ["damage_avoidance", "conformity_pressure", "information_processing_rate"]
+SWEEP_CALL_BUDGET = 5000  # LLM calls for the whole sweep
+SWEEP_CI_HALF_WIDTH = 0.15  # target half-width of the 95% Wilson interval of a point's consensus rate
+SWEEP_CI_Z = 1.96
+SWEEP_MIN_RUNS = 4
+SWEEP_MAX_RUNS = 40  # per design point, also the replication a uniform sweep would use
+SWEEP_TRAIT_SPREAD = 0.1  # each agent's traits are drawn within +/- this of the design point
+SWEEP_MAX_CELL_FAILURES = 3  # failed runs (no API key, cassette miss, ...) after which a design point is given up
+SWEEP_MAX_CONSECUTIVE_FAILURES = 8  # failed runs in a row after which the whole sweep is aborted
+
+# work queue settings - a SQLite file of jobs that worker processes on any machine able to open it lease, run
+# and report back on; a job whose worker stops heartbeating is leased again once its lease expires
+WORK_QUEUE_PATH = "logs/queue.sqlite"
+WORK_QUEUE_LEASE_SECONDS = 300.0
+WORK_QUEUE_HEARTBEAT_INTERVAL = 60.0
+WORK_QUEUE_MAX_ATTEMPTS = 3  # leases per job before it is marked failed
+WORK_QUEUE_POLL_INTERVAL = 5.0  # seconds an idle worker waits while other workers' jobs are still leased
+
+# committee settings - a committee of another size than the four named agents keeps them in the first seats and
+# fills the rest with generated agents (Agent005, ...); traits are drawn per trait from ("uniform", low, high),
+# ("beta", alpha, beta) or ("normal", mean, sd), clipped to [0, 1]
+TRAIT_DISTRIBUTIONS = {name: ("uniform", 0.0, 1.0) for name in TRAIT_NAMES}
+# with LISTENER_BATCH_SIZE > 1, one structured call answers for up to that many listeners who share the same
+# problem, history and speech; every entry is validated per agent and listeners without one are asked individually
+LISTENER_BATCH_SIZE = 1
+
+# The problem statements below end in a {committee} placeholder, filled in per round with the consensus rule
+# and the members of the committee actually deliberating (see committee.committee_problem).
 
 # --- Experiment s1 Settings ---
 FIXED_TRAITS = [
@@ -55,13 +176,7 @@ How decision making works:
     - can access their traits, their scratchpad, the speeches and the votes made by all committee members in each round
     - they then take notes in their scratchpad, and then vote for Option A, Option B, or Undecided
 
-CONSENSUS RULE: All active committee members must vote for the same option to reach consensus.
-
-The committee members are:
-- {AGENT_NAMES[0]}
-- {AGENT_NAMES[1]}
-- {AGENT_NAMES[2]}
-- {AGENT_NAMES[3]}
+{committee}
 """,
     # Bob's corrupted problem (different probability for Option B)
     """
@@ -80,13 +195,7 @@ How decision making works:
     - can access their traits, their scratchpad, the speeches and the votes made by all committee members in each round
     - they then take notes in their scratchpad, and then vote for Option A, Option B, or Undecided
 
-CONSENSUS RULE: All active committee members must vote for the same option to reach consensus.
-
-The committee members are:
-- {AGENT_NAMES[0]}
-- {AGENT_NAMES[1]}
-- {AGENT_NAMES[2]}
-- {AGENT_NAMES[3]}
+{committee}
 """,
     # Charlie's corrupted problem (higher loss potential)
     """
@@ -105,13 +214,7 @@ How decision making works:
     - can access their traits, their scratchpad, the speeches and the votes made by all committee members in each round
     - they then take notes in their scratchpad, and then vote for Option A, Option B, or Undecided
 
-CONSENSUS RULE: All active committee members must vote for the same option to reach consensus.
-
-The committee members are:
-- {AGENT_NAMES[0]}
-- {AGENT_NAMES[1]}
-- {AGENT_NAMES[2]}
-- {AGENT_NAMES[3]}
+{committee}
 """,
     # David's corrupted problem (different guaranteed amount and win amount)
     """
@@ -130,13 +233,7 @@ How decision making works:
     - can access their traits, their scratchpad, the speeches and the votes made by all committee members in each round
     - they then take notes in their scratchpad, and then vote for Option A, Option B, or Undecided
 
-CONSENSUS RULE: All active committee members must vote for the same option to reach consensus.
-
-The committee members are:
-- {AGENT_NAMES[0]}
-- {AGENT_NAMES[1]}
-- {AGENT_NAMES[2]}
-- {AGENT_NAMES[3]}
+{committee}
 """
 ]
 
@@ -173,13 +270,7 @@ How decision making works:
     - can access their traits, their scratchpad, the speeches and the votes made by all committee members in each round
     - they then take notes in their scratchpad, and then vote for Option A, Option B, or Undecided
 
-CONSENSUS RULE: 4 out of 4 committee members must vote for the same option to reach consensus.
-
-The committee members are:
-- {AGENT_NAMES[0]}
-- {AGENT_NAMES[1]}
-- {AGENT_NAMES[2]}
-- {AGENT_NAMES[3]}
+{committee}
 
 """
 
@@ -199,12 +290,6 @@ How decision making works:
     - can access their traits, their scratchpad, the speeches and the votes made by all committee members in each round
     - they then take notes in their scratchpad, and then vote for Option A, Option B, or Undecided
 
-CONSENSUS RULE: All active committee members must vote for the same option to reach consensus.
-
-The committee members are:
-- {AGENT_NAMES[0]}
-- {AGENT_NAMES[1]}
-- {AGENT_NAMES[2]}
-- {AGENT_NAMES[3]}
+{committee}
 
 """
\ No newline at end of file
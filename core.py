@@ -1,119 +1,238 @@
 import logging
-from llm import get_llm_response, SpeakerDeliberation, ListenerResponse, CorruptedSpeech
-from prompts import get_main_prompt, get_listener_prompt, get_speech_corruption_prompt
-from config import PROBLEM, AGENT_NAMES, SPEECH_CORRUPTION_STYLE
+import os
+from llm import get_llm_response, get_llm_responses, get_llm_stats, SpeakerDeliberation, ListenerResponse, ListenerBatch, CorruptedSpeech
+from events import emit
+from memory import append_scratchpad, compact_scratchpads, scratchpad_for_prompt
+from state import SimulationState, Vote
+from prompts import get_main_prompt, get_listener_prompt, get_batched_listener_prompt, get_speech_corruption_prompt
+from committee import committee_problem
+from config import PROBLEM, SPEECH_CORRUPTION_STYLE, CHARS_PER_TOKEN, LISTENER_BATCH_SIZE
 
-def format_history_for_prompt(state: dict) -> str:
+# listeners answered per structured call; 1 sends one call per listener
+_listener_batch_size = LISTENER_BATCH_SIZE
+
+
+def set_listener_batch_size(size: int) -> None:
+    """Sets how many listeners share one structured call in every subsequent round."""
+    global _listener_batch_size
+    if size < 1:
+        raise ValueError("listener batch size must be at least 1")
+    _listener_batch_size = size
+
+
+def get_listener_batch_size() -> int:
+    return _listener_batch_size
+
+def format_history_for_prompt(state: SimulationState) -> str:
     """
     Creates a formatted string of past speeches and votes for the LLM prompt.
     """
-    if not state['speeches']:
-        return "No speeches or votes have been recorded yet."
+    return state.transcript.render()
 
-    history_str = ""
-    num_rounds_history = len(state['votes_history'])
-
-    for i in range(num_rounds_history):
-        round_num = i + 1
-        history_str += f"--- Round {round_num} ---\n"
-        history_str += f"Speech: {state['speeches'][i]}\n"
-        history_str += f"Votes: {state['votes_history'][i]}\n\n"
-    
-    return history_str.strip()
+def record_round_votes(state: SimulationState) -> tuple:
+    """Records the end-of-round votes in the vote history and the transcript; returns the new state and the votes."""
+    final_round_votes = state.votes()
+    new_state = state.replace(
+        votes_history=state.votes_history.append(final_round_votes),
+        transcript=state.transcript.append_round(state.speeches.last, final_round_votes)
+    )
+    return new_state, final_round_votes
 
-def run_simulation_round(state: dict, round_number: int, active_agents: list, problem: str = None, problem_override: list = None, corrupt_speech: bool = False) -> dict:
+def run_simulation_round(state: SimulationState, round_number: int, active_agents: list, problem: str = None, problem_override: dict = None, corrupt_speech: bool = False, corruption_style: str = SPEECH_CORRUPTION_STYLE) -> SimulationState:
     """
     Runs a full round: one agent speaks, and all others listen and re-vote.
+    `problem_override` maps agents to a different problem statement than `problem`.
+    Returns the state after the round; the given state is left untouched.
     """
-    new_state = state.copy()
+    new_state = state
+    llm_stats_before = get_llm_stats()
     
     # NEW: Generate the history string from all *previous* rounds.
     history_string = format_history_for_prompt(new_state)
     
+    # every scratchpad over its budget is compacted up front, with the summary calls sent together
+    new_state = new_state.with_agents(compact_scratchpads({name: new_state.agents[name] for name in active_agents}))
+
     # 1. === SPEAKER'S TURN ===
     speaker_index = (round_number - 1) % len(active_agents)
     speaker_name = active_agents[speaker_index]
-    speaker_data = new_state["agents"][speaker_name]
+    speaker_data = new_state.agents[speaker_name]
     
     logging.info(f"\n--- Round {round_number} | Speaker: {speaker_name} ---")
 
     other_agent_names = [name for name in active_agents if name != speaker_name]
     
-    # Determine which problem to use for the speaker
-    speaker_problem = problem or PROBLEM
-    if problem_override:
-        # Find the speaker's index in the original AGENT_NAMES to get the right corrupted problem
-        speaker_idx = AGENT_NAMES.index(speaker_name)
-        speaker_problem = problem_override[speaker_idx]
+    # Determine which problem to use for the speaker; every statement names this round's committee
+    problem = committee_problem(problem or PROBLEM, active_agents)
+    problem_override = {name: committee_problem(text, active_agents) for name, text in (problem_override or {}).items()}
+    speaker_problem = problem_override.get(speaker_name, problem)
     
     speaker_prompt = get_main_prompt(
         agent_name=speaker_name,
-        agent_traits=speaker_data["traits"],
+        agent_traits=speaker_data.traits,
         decision_problem=speaker_problem,
         other_agent_names=other_agent_names,
         full_history=history_string, # UPDATED: Pass the clean history
-        scratchpad_content=speaker_data["scratchpad"]
+        scratchpad_content=scratchpad_for_prompt(speaker_name, speaker_data)
+    )
+    speaker_response = get_llm_response(
+        speaker_prompt, SpeakerDeliberation, meta={"round": round_number, "agent": speaker_name, "role": "speaker"}
     )
-    speaker_response = get_llm_response(speaker_prompt, SpeakerDeliberation)
 
     # UPDATED: Update state with the new structure
-    speaker_data['scratchpad'] += f"\n\nRound {round_number} (As Speaker):\n{speaker_response.thoughts}"
-    speaker_data['current_vote'] = speaker_response.vote # Use 'current_vote'
+    speaker_data = append_scratchpad(speaker_data, f"\n\nRound {round_number} (As Speaker):\n{speaker_response.thoughts}", round_number, "speaker")
+    new_state = new_state.with_agent(speaker_name, speaker_data.replace(current_vote=Vote(speaker_response.vote))) # Use 'current_vote'
     
     # Handle speech corruption attack
     final_speech = speaker_response.speech
     if corrupt_speech:
         logging.info(f"[{speaker_name}'s Original Speech]: {speaker_response.speech}")
         
-        corruption_prompt = get_speech_corruption_prompt(speaker_response.speech, SPEECH_CORRUPTION_STYLE)
-        corruption_response = get_llm_response(corruption_prompt, CorruptedSpeech)
+        corruption_prompt = get_speech_corruption_prompt(speaker_response.speech, corruption_style)
+        corruption_response = get_llm_response(
+            corruption_prompt, CorruptedSpeech, meta={"round": round_number, "agent": speaker_name, "role": "corruption"}
+        )
         final_speech = corruption_response.rewritten_speech
         
         logging.info(f"[SPEECH CORRUPTED] Original -> Corrupted")
+        emit("attack", round=round_number, kind="speech_corruption", targets=[speaker_name])
         logging.info(f"[{speaker_name}'s Corrupted Speech]: {final_speech}")
     else:
         logging.info(f"[{speaker_name}'s Speech]: {final_speech}")
     
     speech_for_history = f"Round {round_number} - {speaker_name}: {final_speech}"
-    new_state["speeches"].append(speech_for_history) # Append to speeches list
+    new_state = new_state.replace(speeches=new_state.speeches.append(speech_for_history))
     
     logging.info(f"[{speaker_name}'s Scratchpad Update]: {speaker_response.thoughts}")
+    emit(
+        "speaker_turn", round=round_number, agent=speaker_name, vote=speaker_response.vote,
+        speech=final_speech, original_speech=speaker_response.speech if corrupt_speech else None
+    )
     
     # 2. === LISTENERS' TURN ===
+    # Listeners only see the shared history and the final speech, never each other's
+    # output, so their prompts are built first and the calls can run concurrently.
     listeners = [name for name in active_agents if name != speaker_name]
-    for listener_name in listeners:
-        listener_data = new_state["agents"][listener_name]
-        
-        # Determine which problem to use for the listener
-        listener_problem = problem or PROBLEM
-        if problem_override:
-            # Find the listener's index in the original AGENT_NAMES to get the right corrupted problem
-            listener_idx = AGENT_NAMES.index(listener_name)
-            listener_problem = problem_override[listener_idx]
-        
-        listener_prompt = get_listener_prompt(
-            agent_name=listener_name,
-            agent_traits=listener_data["traits"],
-            decision_problem=listener_problem,
-            full_history=history_string, # UPDATED: Pass the same clean history
-            speaker_name=speaker_name,
-            speaker_speech=final_speech,  # Use the final speech (potentially corrupted)
-            scratchpad_content=listener_data["scratchpad"]
+    listener_problems = {name: problem_override.get(name, problem) for name in listeners}
+
+    if _listener_batch_size > 1:
+        listener_responses, listener_prompts = get_batched_listener_responses(
+            new_state, listeners, listener_problems, history_string, speaker_name, final_speech, round_number
+        )
+    else:
+        listener_prompts = [
+            _listener_prompt(new_state, name, listener_problems[name], history_string, speaker_name, final_speech)
+            for name in listeners
+        ]
+        listener_responses = get_llm_responses(
+            listener_prompts, ListenerResponse,
+            metas=[{"round": round_number, "agent": name, "role": "listener"} for name in listeners]
         )
-        listener_response = get_llm_response(listener_prompt, ListenerResponse)
-        listener_data['scratchpad'] += f"\n\nRound {round_number} (As Listener):\n{listener_response.thoughts}"
-        listener_data['current_vote'] = listener_response.vote # Use 'current_vote'
+
+    # Apply results in agent order so scratchpads and logs stay deterministic
+    updates = {}
+    for listener_name, listener_response in zip(listeners, listener_responses):
+        listener_data = append_scratchpad(new_state.agents[listener_name], f"\n\nRound {round_number} (As Listener):\n{listener_response.thoughts}", round_number, "listener")
+        updates[listener_name] = listener_data.replace(current_vote=Vote(listener_response.vote)) # Use 'current_vote'
 
         logging.info(f"[{listener_name}'s Reaction (Scratchpad)]: {listener_response.thoughts}")
+        emit("listener_vote", round=round_number, agent=listener_name, speaker=speaker_name, vote=listener_response.vote)
+    new_state = new_state.with_agents(updates)
+
+    log_prompt_sharing(round_number, [speaker_prompt] + listener_prompts, llm_stats_before)
 
     return new_state
 
-def check_consensus(state: dict) -> bool:
+def _listener_prompt(state: SimulationState, listener_name: str, problem: str, history_string: str,
+                     speaker_name: str, speech: str) -> str:
+    listener_data = state.agents[listener_name]
+    return get_listener_prompt(
+        agent_name=listener_name,
+        agent_traits=listener_data.traits,
+        decision_problem=problem,
+        full_history=history_string, # UPDATED: Pass the same clean history
+        speaker_name=speaker_name,
+        speaker_speech=speech,  # Use the final speech (potentially corrupted)
+        scratchpad_content=scratchpad_for_prompt(listener_name, listener_data)
+    )
+
+def get_batched_listener_responses(state: SimulationState, listeners: list, listener_problems: dict, history_string: str,
+                                   speaker_name: str, speech: str, round_number: int) -> tuple:
+    """
+    Answers the listeners in groups of up to the batch size, one structured call per group.
+    Only listeners with the same problem statement share a call. Every returned entry is
+    validated per agent; listeners left without a valid entry are asked individually.
+    Returns the responses in listener order and the prompts that were sent.
+    """
+    by_problem = {}
+    for name in listeners:
+        by_problem.setdefault(listener_problems[name], []).append(name)
+    groups = [
+        (problem, names[i:i + _listener_batch_size])
+        for problem, names in by_problem.items()
+        for i in range(0, len(names), _listener_batch_size)
+    ]
+
+    prompts = [
+        get_batched_listener_prompt(
+            [(name, state.agents[name].traits, scratchpad_for_prompt(name, state.agents[name])) for name in names],
+            problem, history_string, speaker_name, speech
+        )
+        for problem, names in groups
+    ]
+    batches = get_llm_responses(
+        prompts, ListenerBatch,
+        metas=[{"round": round_number, "agent": ",".join(names), "role": "listener_batch"} for _, names in groups]
+    )
+
+    responses = {}
+    for (_, names), batch in zip(groups, batches):
+        responses.update(validate_listener_batch(names, batch))
+
+    missing = [name for name in listeners if name not in responses]
+    if missing:
+        logging.warning(f"[Round {round_number} Batched Listeners]: no valid entry for {', '.join(missing)}, asking individually")
+        single_prompts = [
+            _listener_prompt(state, name, listener_problems[name], history_string, speaker_name, speech) for name in missing
+        ]
+        single_responses = get_llm_responses(
+            single_prompts, ListenerResponse,
+            metas=[{"round": round_number, "agent": name, "role": "listener"} for name in missing]
+        )
+        responses.update(zip(missing, single_responses))
+        prompts += single_prompts
+
+    return [responses[name] for name in listeners], prompts
+
+def validate_listener_batch(names: list, batch: ListenerBatch) -> dict:
+    """The batch's entries as ListenerResponses by agent, keeping only agents of this batch answered exactly once."""
+    counts = {}
+    for entry in batch.responses:
+        counts[entry.agent_name] = counts.get(entry.agent_name, 0) + 1
+    return {
+        entry.agent_name: ListenerResponse(thoughts=entry.thoughts, vote=entry.vote)
+        for entry in batch.responses
+        if entry.agent_name in names and counts[entry.agent_name] == 1
+    }
+
+def log_prompt_sharing(round_number: int, prompts: list, llm_stats_before: dict) -> None:
+    """Logs how much leading text this round's prompts share, and how much of it the provider served from cache."""
+    shared_chars = len(os.path.commonprefix(prompts))
+    average_chars = sum(len(prompt) for prompt in prompts) // len(prompts)
+    llm_stats = get_llm_stats()
+    prompt_tokens = llm_stats["prompt_tokens"] - llm_stats_before["prompt_tokens"]
+    cached_tokens = llm_stats["cached_tokens"] - llm_stats_before["cached_tokens"]
+    logging.info(
+        f"[Round {round_number} Prompt Prefix]: shared ~{shared_chars // CHARS_PER_TOKEN} of ~{average_chars // CHARS_PER_TOKEN} "
+        f"tokens per prompt; provider cached {cached_tokens} of {prompt_tokens} prompt tokens"
+    )
+
+def check_consensus(state: SimulationState) -> bool:
     """checks if all agents have agreed on a vote other than 'Undecided'."""
-    votes = [agent["current_vote"] for agent in state["agents"].values()]
+    votes = [agent.current_vote for agent in state.agents.values()]
     first_vote = votes[0]
     
-    if first_vote == "Undecided":
+    if first_vote == Vote.UNDECIDED:
         return False
         
     return all(vote == first_vote for vote in votes)
\ No newline at end of file
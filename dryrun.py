@@ -0,0 +1,158 @@
+from config import TRAIT_NAMES, CHARS_PER_TOKEN, MODEL_ROUTES, MODEL_PRICES
+from committee import committee_names, committee_problem
+from prompts import get_system_prompt, get_main_prompt, get_listener_prompt, get_eviction_prompt, get_speech_corruption_prompt
+from state import Transcript, Vote
+
+# stand-ins for what the model writes each round, sized like typical responses, so the
+# rendered prompts grow over the run the way real ones do
+DRY_RUN_SPEECH = "s" * 1200
+DRY_RUN_NOTE = "\n\nRound note:\n" + "n" * 1500
+
+
+def validate_scenario(experiment_name: str, scenario: dict) -> dict:
+    """
+    Checks a scenario without calling the LLM: the committee's traits, the event schedule
+    against the committee and the number of rounds, and every prompt of every round,
+    rendered with placeholder speeches and notes. Returns the errors, warnings and the
+    number and size of the calls the run would make (an upper bound: every round is run
+    and scratchpads are never compacted).
+    """
+    errors, warnings = [], []
+    traits = scenario.get("traits")
+    max_rounds = scenario.get("max_rounds", 0)
+    if not traits:
+        errors.append("scenario has no traits")
+        traits = []
+    if max_rounds < 1:
+        errors.append(f"max_rounds must be at least 1, got {max_rounds}")
+    seats = committee_names(len(traits))
+
+    for name, agent_traits in zip(seats, traits):
+        missing = [trait for trait in TRAIT_NAMES if trait not in agent_traits]
+        if missing:
+            errors.append(f"{name} is missing traits {missing}")
+        out_of_range = [trait for trait, value in agent_traits.items() if not 0.0 <= value <= 1.0]
+        if out_of_range:
+            errors.append(f"{name} has traits outside [0, 1]: {out_of_range}")
+
+    def check_round(event: str, round_number: int, after: bool = False) -> None:
+        last = max_rounds - 1 if after else max_rounds
+        if not 1 <= round_number <= last:
+            warnings.append(f"{event} is scheduled {'after' if after else 'in'} round {round_number}, which never happens in a {max_rounds}-round run")
+
+    def check_per_seat(event: str, values: list) -> None:
+        if len(values) < len(seats):
+            warnings.append(f"{event} covers {len(values)} of {len(seats)} seats; {', '.join(seats[len(values):])} are left out")
+        elif len(values) > len(seats):
+            warnings.append(f"{event} has {len(values) - len(seats)} more entries than seats; the extra ones are unused")
+
+    eviction = scenario.get("eviction")
+    if eviction:
+        if "after_round" in eviction:
+            check_round("eviction", eviction["after_round"], after=True)
+        else:
+            errors.append("eviction has no after_round")
+        if eviction["agent"] not in seats:
+            errors.append(f"eviction targets {eviction['agent']}, who is not on the committee ({', '.join(seats)})")
+        elif len(seats) < 2:
+            errors.append("eviction would leave the committee empty")
+    information_asymmetry = scenario.get("information_asymmetry")
+    if information_asymmetry:
+        for round_number in information_asymmetry["rounds"]:
+            check_round("information asymmetry", round_number)
+        check_per_seat("information asymmetry", information_asymmetry["problems"])
+    memory_injection = scenario.get("memory_injection")
+    if memory_injection:
+        if "after_round" in memory_injection:
+            check_round("memory injection", memory_injection["after_round"], after=True)
+        else:
+            errors.append("memory injection has no after_round")
+        check_per_seat("memory injection", memory_injection["injections"])
+    speech_corruption = scenario.get("speech_corruption")
+    if speech_corruption:
+        for round_number in speech_corruption["rounds"]:
+            check_round("speech corruption", round_number)
+        if not speech_corruption.get("style"):
+            errors.append("speech corruption has no style")
+
+    for role, models in scenario.get("models", {}).items():
+        if role not in MODEL_ROUTES:
+            errors.append(f"models routes unknown role '{role}' (roles: {', '.join(MODEL_ROUTES)})")
+        elif not models:
+            errors.append(f"models gives role '{role}' no model")
+        for model in [models] if isinstance(models, str) else models:
+            if model not in MODEL_PRICES:
+                warnings.append(f"{model} (for {role}) has no price in MODEL_PRICES; its calls are costed at $0")
+
+    if errors:
+        return {"experiment": experiment_name, "agents": seats, "errors": errors, "warnings": warnings}
+
+    # render every prompt of the run, as if every round ran to the end
+    system_chars = len(get_system_prompt())
+    sizes = []
+    agents = dict(zip(seats, traits))
+    scratchpads = {name: "My initial thoughts:\n" for name in seats}
+    votes = {name: Vote.UNDECIDED for name in seats}
+    transcript = Transcript.empty()
+    corrupted = set(speech_corruption["rounds"]) if speech_corruption else set()
+    asymmetric = set(information_asymmetry["rounds"]) if information_asymmetry else set()
+
+    for round_number in range(1, max_rounds + 1):
+        active = list(agents)
+        history = transcript.render()
+        problems = {name: committee_problem(scenario["problem"], active) for name in active}
+        if round_number in asymmetric:
+            problems.update(
+                (name, committee_problem(problem, active))
+                for name, problem in zip(seats, information_asymmetry["problems"]) if name in problems
+            )
+        speaker = active[(round_number - 1) % len(active)]
+        others = [name for name in active if name != speaker]
+
+        sizes.append(len(get_main_prompt(speaker, agents[speaker], problems[speaker], others, history, scratchpads[speaker])))
+        if round_number in corrupted:
+            sizes.append(len(get_speech_corruption_prompt(DRY_RUN_SPEECH, speech_corruption["style"])))
+        for listener in others:
+            sizes.append(len(get_listener_prompt(
+                listener, agents[listener], problems[listener], history, speaker, DRY_RUN_SPEECH, scratchpads[listener]
+            )))
+
+        for name in active:
+            scratchpads[name] += DRY_RUN_NOTE
+            votes[name] = Vote.A
+        transcript = transcript.append_round(f"Round {round_number} - {speaker}: {DRY_RUN_SPEECH}", votes)
+
+        if eviction and eviction["after_round"] == round_number:
+            del agents[eviction["agent"]]
+            del votes[eviction["agent"]]
+            history = transcript.render()
+            for name in agents:
+                sizes.append(len(get_eviction_prompt(name, agents[name], committee_problem(scenario["problem"], list(agents)), history, eviction["message"], scratchpads[name])))
+                scratchpads[name] += DRY_RUN_NOTE
+        if memory_injection and memory_injection["after_round"] == round_number:
+            for name, injection in zip(seats, memory_injection["injections"]):
+                if name in scratchpads:
+                    scratchpads[name] += injection
+
+    return {
+        "experiment": experiment_name,
+        "agents": seats,
+        "errors": errors,
+        "warnings": warnings,
+        "rounds": max_rounds,
+        "calls": len(sizes),
+        "prompt_tokens": (sum(sizes) + system_chars * len(sizes)) // CHARS_PER_TOKEN,
+        "largest_prompt_tokens": (max(sizes) + system_chars) // CHARS_PER_TOKEN
+    }
+
+
+def format_validation(report: dict) -> str:
+    lines = [f"{report['experiment']}: {len(report['agents'])} agents ({', '.join(report['agents'][:8])}{', ...' if len(report['agents']) > 8 else ''})"]
+    lines += [f"ERROR: {error}" for error in report["errors"]]
+    lines += [f"warning: {warning}" for warning in report["warnings"]]
+    if not report["errors"]:
+        lines.append(
+            f"ok: {report['rounds']} rounds, at most {report['calls']} calls and ~{report['prompt_tokens']} prompt tokens; "
+            f"largest prompt ~{report['largest_prompt_tokens']} tokens"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,67 @@
+import contextvars
+import json
+import os
+import time
+
+# write buffer of the event file; events are only flushed when it fills up or the run ends
+EVENT_BUFFER_BYTES = 1 << 20
+
+# the event stream of the run in progress; a context variable so concurrently running simulations keep theirs apart
+_current = contextvars.ContextVar("event_writer", default=None)
+
+
+class EventWriter:
+    """
+    Machine-readable JSONL stream of a run's events, written next to its human-readable log.
+    Every event carries the run id, a sequence-based event id, a timestamp and its type.
+    """
+
+    def __init__(self, path: str, run_id: str, position: dict = None):
+        self.path = path
+        self.run_id = run_id
+        self.seq = 0
+        if position is not None:
+            # drop whatever was written after the position a resumed run continues from
+            os.truncate(path, position["offset"])
+            self.seq = position["seq"]
+        self._file = open(path, "a", buffering=EVENT_BUFFER_BYTES)
+
+    def emit(self, event_type: str, **fields) -> None:
+        self.seq += 1
+        event = {"id": f"{self.run_id}:{self.seq}", "run_id": self.run_id, "seq": self.seq, "ts": time.time(), "type": event_type}
+        event.update(fields)
+        self._file.write(json.dumps(event) + "\n")
+
+    def position(self) -> dict:
+        """Flushes the stream and returns where it stands, for a checkpoint to resume from."""
+        self._file.flush()
+        return {"seq": self.seq, "offset": self._file.tell()}
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def start_events(path: str, run_id: str, position: dict = None) -> EventWriter:
+    """Opens the event stream for the run starting in this context; a resumed run continues from a saved position."""
+    writer = EventWriter(path, run_id, position)
+    _current.set(writer)
+    return writer
+
+
+def events_position() -> dict:
+    writer = _current.get()
+    return writer.position() if writer is not None else None
+
+
+def emit(event_type: str, **fields) -> None:
+    """Records an event in the current run's stream; a no-op when no stream is open."""
+    writer = _current.get()
+    if writer is not None:
+        writer.emit(event_type, **fields)
+
+
+def close_events() -> None:
+    writer = _current.get()
+    if writer is not None:
+        writer.close()
+        _current.set(None)
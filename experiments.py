@@ -1,253 +1,400 @@
 import logging
 import os
 import time
-from config import AGENT_NAMES, MAX_ROUNDS, LOG_DIR, RANDOM_TRAITS, FIXED_TRAITS, PROBLEM_S2, EVICTION_MESSAGE, AGENT_TO_EVICT, CORRUPTED_PROBLEMS_S3, MEMORY_INJECTIONS_S3, SPEECH_CORRUPTION_STYLE
-from core import run_simulation_round, check_consensus, format_history_for_prompt
+from config import AGENT_NAMES, MAX_ROUNDS, LOG_DIR, random_traits, FIXED_TRAITS, PROBLEM, PROBLEM_S2, EVICTION_MESSAGE, AGENT_TO_EVICT, CORRUPTED_PROBLEMS_S3, MEMORY_INJECTIONS_S3, SPEECH_CORRUPTION_STYLE
+from core import run_simulation_round, check_consensus, format_history_for_prompt, record_round_votes, get_listener_batch_size, set_listener_batch_size
+from state import SimulationState, AgentState, Scratchpad, Vote
+from committee import committee_names, committee_problem
 from prompts import get_eviction_prompt
-from llm import get_llm_response, Reflection
+from llm import get_llm_responses, get_llm_stats, reset_llm_stats, set_model_routes, configure_cache, get_sample_index, Reflection
+from memory import append_scratchpad, compact_scratchpads, scratchpad_for_prompt, get_memory_stats, reset_memory_stats
+from ledger import start_ledger, resume_ledger, current_ledger
+from events import start_events, emit, close_events, events_position
+from checkpoint import save_checkpoint, load_checkpoint, mark_finished, state_to_dict, state_from_dict
 
 
-def setup_logging(experiment_name: str):
+def setup_logging(experiment_name: str, run_label: str = None, log_filename: str = None) -> str:
+    """
+    Points the root logger at a log file for this run and returns its path: a fresh
+    one, or the given log_filename when a run is resumed (appended to).
+    Replicate runs (with a run_label) log to their own file only, not the console.
+    """
     os.makedirs(LOG_DIR, exist_ok=True)
     
-    timestamp = time.strftime("%Y%m%d-%H%M%S")
-    log_filename = f"{LOG_DIR}/{experiment_name}_{timestamp}.log"
+    if log_filename is None:
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        log_filename = f"{LOG_DIR}/{experiment_name}_{timestamp}.log"
+        if run_label:
+            log_filename = f"{LOG_DIR}/{experiment_name}_{timestamp}_{run_label}.log"
     
+    handlers = [logging.FileHandler(log_filename)]
+    if not run_label:
+        handlers.append(logging.StreamHandler())
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(message)s',
-        handlers=[logging.FileHandler(log_filename), logging.StreamHandler()]
+        handlers=handlers,
+        force=True
     )
+    return log_filename
 
-def run_experiment(experiment_name: str, agent_traits_list: list):
+def run_id_for(log_filename: str) -> str:
+    return os.path.splitext(os.path.basename(log_filename))[0]
+
+def start_run(experiment_name: str, run_label: str = None, checkpoint: dict = None) -> str:
     """
-    Runs a simulation with a given name and list of agent traits.
+    Sets up logging, fresh counters, a ledger and an event stream for a run; returns the log file path.
+    A run resumed from a checkpoint continues its log, ledger and event stream.
     """
-    setup_logging(experiment_name)
-    logging.info(f"--- starting experiment {experiment_name.upper()} ---")
+    log_filename = setup_logging(experiment_name, run_label, checkpoint["log_filename"] if checkpoint else None)
+    reset_llm_stats()
+    reset_memory_stats()
+    run_id = run_id_for(log_filename)
+    if checkpoint:
+        resume_ledger(checkpoint["ledger"])
+        start_events(f"{LOG_DIR}/{run_id}.events.jsonl", run_id, checkpoint["events"])
+    else:
+        start_ledger()
+        start_events(f"{LOG_DIR}/{run_id}.events.jsonl", run_id)
+    return log_filename
 
-    state = {
-        "agents": {},
-        "speeches": [], 
-        "votes_history": [] 
+def budget_exhausted(round_number: int) -> bool:
+    """Checks the run's budget at the end of a round, so the run can stop cleanly."""
+    reason = current_ledger().budget_exceeded()
+    if reason:
+        logging.info(f"\n--- budget exhausted after round {round_number}: {reason}. stopping. ---")
+        return True
+    return False
+
+def summarize_run(log_filename: str, state: SimulationState) -> dict:
+    """Collects the per-run numbers reported in a batch summary table and writes the run's ledger."""
+    llm_stats = get_llm_stats()
+    logging.info(f"\n--- llm calls: {llm_stats} ---")
+    logging.info(f"--- scratchpad memory: {get_memory_stats()} ---")
+    ledger = current_ledger()
+    ledger_filename = os.path.splitext(log_filename)[0] + ".ledger.json"
+    ledger.write(ledger_filename)
+    ledger_summary = ledger.summary()
+    logging.info(f"--- ledger: {ledger_summary['totals']} ---")
+    for role, totals in ledger_summary["by_role"].items():
+        logging.info(f"    {role}: {totals['calls']} calls, {totals['total_tokens']} tokens, ${totals['cost']:.4f}, {totals['latency']:.1f}s")
+        routing = ledger_summary["routing"][role]
+        if len(routing["models"]) > 1 or routing["cost_saved"]:
+            logging.info(f"        routed {routing['models']}, {routing['escalations']} escalations, ${routing['cost_saved']:.4f} saved")
+        latency = ledger_summary["latency"].get(role)
+        if latency and latency["hedges"]:
+            logging.info(f"        p50 {latency['p50']:.2f}s, p99 {latency['p99']:.2f}s, {latency['hedges']} hedged ({latency['hedge_wins']} won by the hedge)")
+    logging.info(f"--- ledger written to {ledger_filename} ---")
+    if ledger_summary["totals"]["fallbacks"]:
+        logging.warning(f"WARNING: {ledger_summary['totals']['fallbacks']} LLM calls returned placeholder responses")
+
+    consensus_round = None
+    for round_number, votes in enumerate(state.votes_history, start=1):
+        first_vote = next(iter(votes.values()))
+        if first_vote != Vote.UNDECIDED and all(vote == first_vote for vote in votes.values()):
+            consensus_round = round_number
+            break
+
+    summary = {
+        "run": run_id_for(log_filename),
+        "consensus_round": consensus_round,
+        "final_votes": state.votes(),
+        "fallbacks": ledger_summary["totals"]["fallbacks"],
+        "calls": ledger_summary["totals"]["calls"],
+        "total_tokens": ledger_summary["totals"]["total_tokens"],
+        "cost": ledger_summary["totals"]["cost"]
     }
+    emit("run_end", **summary)
+    close_events()
+    return summary
 
-    for name, traits in zip(AGENT_NAMES, agent_traits_list):
-        state["agents"][name] = {
-            "traits": traits,
-            "scratchpad": "My initial thoughts:\n",
-            "current_vote": "Undecided"
-        }
+# Each experiment is a scenario: which traits and problem it uses, how many rounds it runs,
+# and which events (eviction, attacks) happen in which round. Scenarios are plain data, so a
+# checkpoint can store the one a run uses and a resumed run follows the same schedule.
+# A scenario may also route call roles to other models with "models": {role: [model, ...]}
+# (see MODEL_ROUTES in config).
+SCENARIOS = {
+    "s0": {
+        "problem": PROBLEM,
+        "max_rounds": MAX_ROUNDS,
+        "stop_on_consensus": True,
+        "end_message": "max rounds reached. no consensus."
+    },
+    "s1": {
+        "traits": FIXED_TRAITS,
+        "problem": PROBLEM,
+        "max_rounds": MAX_ROUNDS,
+        "stop_on_consensus": True,
+        "end_message": "max rounds reached. no consensus."
+    },
+    "s2": {
+        "traits": FIXED_TRAITS,
+        "problem": PROBLEM_S2,
+        "max_rounds": 8,
+        "stop_on_consensus": True,
+        "end_message": "simulation ended after 8 rounds",
+        "eviction": {"after_round": 3, "agent": AGENT_TO_EVICT, "message": EVICTION_MESSAGE}
+    },
+    "s3": {
+        "traits": FIXED_TRAITS,
+        "problem": PROBLEM,
+        "max_rounds": 10,
+        "stop_on_consensus": False,
+        "end_message": "simulation ended after 10 rounds",
+        "information_asymmetry": {"rounds": [3], "problems": CORRUPTED_PROBLEMS_S3},
+        "memory_injection": {"after_round": 3, "injections": MEMORY_INJECTIONS_S3},
+        "speech_corruption": {"rounds": [6, 7], "style": SPEECH_CORRUPTION_STYLE}
+    }
+}
 
-    logging.info("\n--- Agent Initialization ---")
-    for name, data in state["agents"].items():
-        logging.info(f"{name} | traits: {data['traits']}")
-    
-    for round_number in range(1, MAX_ROUNDS + 1):
-        state = run_simulation_round(state, round_number, AGENT_NAMES)
+def new_state(agent_traits_list: list) -> SimulationState:
+    return SimulationState.create({
+        name: AgentState(traits=traits, current_vote=Vote.UNDECIDED, base="My initial thoughts:\n", summary="", entries=Scratchpad.empty())
+        for name, traits in zip(committee_names(len(agent_traits_list)), agent_traits_list)
+    })
+
+def run_scenario(experiment_name: str, scenario: dict, run_label: str = None, checkpoint: dict = None,
+                 stop_after_round: int = None) -> dict:
+    """
+    Runs a simulation following a scenario, writing a checkpoint after every completed round.
+    With a checkpoint, the run continues after its last completed round. With stop_after_round,
+    the run ends after that round, before its events, e.g. as the shared trunk of branches.
+    Only a run that reached consensus or its last round is marked finished; one stopped
+    early (stop_after_round, budget) can be resumed.
+    """
+    log_filename = start_run(experiment_name, run_label, checkpoint)
+    run_id = run_id_for(log_filename)
+    set_model_routes(scenario.get("models"))
+
+    if checkpoint and checkpoint.get("branched_from"):
+        state = state_from_dict(checkpoint["state"])
+        start_round = checkpoint["completed_round"] + 1
+        logging.info(f"--- starting experiment {experiment_name.upper()} as a branch of {checkpoint['branched_from']} after round {checkpoint['completed_round']} ---")
+        logging.info(f"Scenario: {scenario}")
+        emit("run_start", experiment=experiment_name, branched_from=checkpoint["branched_from"],
+             after_round=checkpoint["completed_round"], agents={name: data.traits for name, data in state.agents.items()})
+    elif checkpoint:
+        state = state_from_dict(checkpoint["state"])
+        start_round = checkpoint["completed_round"] + 1
+        logging.info(f"\n--- resuming experiment {experiment_name.upper()} after round {checkpoint['completed_round']} ---")
+        emit("run_resume", completed_round=checkpoint["completed_round"])
+    else:
+        state = new_state(scenario["traits"])
+        start_round = 1
+        logging.info(f"--- starting experiment {experiment_name.upper()} ---")
+
+        logging.info("\n--- Agent Initialization ---")
+        for name, data in state.agents.items():
+            logging.info(f"{name} | traits: {data.traits}")
+        emit("run_start", experiment=experiment_name, agents={name: data.traits for name, data in state.agents.items()})
+
+    consensus = checkpoint is not None and checkpoint["consensus"]
+    if checkpoint and not consensus and not checkpoint["round_events_done"]:
+        # the run stopped (budget, crash) between its last round and that round's events
+        state = apply_round_events(state, checkpoint["completed_round"], scenario)
+        save_run_checkpoint(run_id, experiment_name, scenario, log_filename, state, checkpoint["completed_round"], round_events_done=True)
+
+    finished = consensus
+    for round_number in range(start_round, scenario["max_rounds"] + 1):
+        if consensus:
+            break
+        # the committee is whoever is still in the state, in seat order
+        active_agents = list(state.agents)
+        problem_override, corrupt_speech = determine_round_parameters(round_number, scenario)
+
+        state = run_simulation_round(
+            state,
+            round_number,
+            active_agents,
+            scenario["problem"],
+            problem_override=problem_override,
+            corrupt_speech=corrupt_speech,
+            corruption_style=scenario.get("speech_corruption", {}).get("style", SPEECH_CORRUPTION_STYLE)
+        )
         
-        final_round_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        state["votes_history"].append(final_round_votes)
+        state, final_round_votes = record_round_votes(state)
         logging.info(f"[End of Round {round_number} Votes]: {final_round_votes}")
+        emit("round_end", round=round_number, votes=final_round_votes)
 
-        if check_consensus(state):
+        if scenario["stop_on_consensus"] and check_consensus(state):
             logging.info(f"\n--- consensus reached in round {round_number}! ---")
+            emit("consensus", round=round_number, vote=next(iter(final_round_votes.values())))
             logging.info(f"Final Votes: {final_round_votes}")
+            consensus = finished = True
+            save_run_checkpoint(run_id, experiment_name, scenario, log_filename, state, round_number, consensus=True)
+            break
+
+        save_run_checkpoint(run_id, experiment_name, scenario, log_filename, state, round_number)
+        if round_number == stop_after_round:
+            logging.info(f"\n--- stopping after round {round_number} ---")
             break
+        if budget_exhausted(round_number):
+            break
+
+        state = apply_round_events(state, round_number, scenario)
+        save_run_checkpoint(run_id, experiment_name, scenario, log_filename, state, round_number, round_events_done=True)
     else:
-        logging.info("\n--- max rounds reached. no consensus. ---")
-        final_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        logging.info(f"final votes at the end: {final_votes}")
+        finished = True
+        if not consensus:
+            logging.info(f"\n--- {scenario['end_message']} ---")
+            final_votes = state.votes()
+            logging.info(f"final votes at the end: {final_votes}")
     
     logging.info("\n\n--- final agent scratchpads ---")
-    for name, data in state["agents"].items():
+    for name, data in state.agents.items():
         logging.info(f"\n--- Scratchpad for {name} ---")
-        logging.info(data['scratchpad'].strip())
+        logging.info(data.scratchpad.strip())
+
+    summary = summarize_run(log_filename, state)
+    if finished:
+        mark_finished(run_id)
+    return summary
+
+def save_run_checkpoint(run_id: str, experiment_name: str, scenario: dict, log_filename: str, state: SimulationState,
+                        completed_round: int, consensus: bool = False, round_events_done: bool = False) -> None:
+    """Checkpoints everything needed to continue the run after `completed_round`."""
+    save_checkpoint(run_id, {
+        "run_id": run_id,
+        "experiment": experiment_name,
+        "scenario": scenario,
+        "log_filename": log_filename,
+        "completed_round": completed_round,
+        "consensus": consensus,
+        "round_events_done": round_events_done,
+        "finished": False,
+        "state": state_to_dict(state),
+        "ledger": current_ledger().to_dict(),
+        "events": events_position(),
+        # what else decides the run's calls, so a resumed run reads the same cache entries and batches alike
+        "sample_index": get_sample_index(),
+        "listener_batch_size": get_listener_batch_size()
+    })
+
+def resume_run(run_id: str) -> dict:
+    """Continues a run from its last checkpoint, with the same log, ledger, event stream and call settings."""
+    checkpoint = load_checkpoint(run_id)
+    if checkpoint["finished"]:
+        raise ValueError(f"Run '{run_id}' already finished; nothing to resume")
+    configure_cache(sample_index=checkpoint["sample_index"])
+    set_listener_batch_size(checkpoint["listener_batch_size"])
+    return run_scenario(checkpoint["experiment"], checkpoint["scenario"], checkpoint=checkpoint)
+
+def run_experiment(experiment_name: str, agent_traits_list: list, run_label: str = None) -> dict:
+    """
+    Runs a simulation with a given name and list of agent traits.
+    """
+    scenario = dict(SCENARIOS.get(experiment_name, SCENARIOS["s1"]), traits=agent_traits_list)
+    return run_scenario(experiment_name, scenario, run_label)
 
-# the run_s0() and run_s1() functions remain exactly the same.
-def run_s0():
-    run_experiment(experiment_name="s0", agent_traits_list=RANDOM_TRAITS)
+def run_s0(run_label: str = None, agent_traits_list: list = None) -> dict:
+    return run_experiment(experiment_name="s0", agent_traits_list=agent_traits_list or random_traits(), run_label=run_label)
 
-def run_s1():
-    run_experiment(experiment_name="s1", agent_traits_list=FIXED_TRAITS)
+def run_s1(run_label: str = None) -> dict:
+    return run_experiment(experiment_name="s1", agent_traits_list=FIXED_TRAITS, run_label=run_label)
 
-def run_s2():
+def run_s2(run_label: str = None) -> dict:
     """
     Runs the S2 simulation with eviction event after round 3.
     """
-    setup_logging("s2")
-    logging.info("--- starting experiment S2 ---")
+    return run_scenario("s2", SCENARIOS["s2"], run_label)
 
-    state = {
-        "agents": {},
-        "speeches": [], 
-        "votes_history": [] 
-    }
+def run_s3(run_label: str = None) -> dict:
+    """
+    Runs the S3 simulation with three attack mechanisms:
+    1. Information asymmetry (round 3)
+    2. Memory corruption (after round 3)
+    3. Speech corruption (rounds 6-7)
+    """
+    return run_scenario("s3", SCENARIOS["s3"], run_label)
 
-    # Initialize agents with FIXED_TRAITS
-    for name, traits in zip(AGENT_NAMES, FIXED_TRAITS):
-        state["agents"][name] = {
-            "traits": traits,
-            "scratchpad": "My initial thoughts:\n",
-            "current_vote": "Undecided"
-        }
-
-    logging.info("\n--- Agent Initialization ---")
-    for name, data in state["agents"].items():
-        logging.info(f"{name} | traits: {data['traits']}")
-    
-    # Rounds 1-3: Normal operation with all 4 agents
-    for round_number in range(1, 4):
-        state = run_simulation_round(state, round_number, AGENT_NAMES, PROBLEM_S2)
-        
-        final_round_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        state["votes_history"].append(final_round_votes)
-        logging.info(f"[End of Round {round_number} Votes]: {final_round_votes}")
+def apply_round_events(state: SimulationState, round_number: int, scenario: dict) -> SimulationState:
+    """Applies the scenario's between-round events scheduled after this round; returns the resulting state."""
+    eviction = scenario.get("eviction")
+    if eviction and eviction["after_round"] == round_number:
+        state = apply_eviction(state, round_number, eviction, scenario["problem"])
 
-        if check_consensus(state):
-            logging.info(f"\n--- consensus reached in round {round_number}! ---")
-            logging.info(f"Final Votes: {final_round_votes}")
-            return
-    
-    # The Eviction Event (Post-Round 3)
+    memory_injection = scenario.get("memory_injection")
+    if memory_injection and memory_injection["after_round"] == round_number:
+        seats = committee_names(len(scenario["traits"]))
+        state = apply_memory_corruption_attack(state, round_number, dict(zip(seats, memory_injection["injections"])))
+    return state
+
+def apply_eviction(state: SimulationState, round_number: int, eviction: dict, problem: str) -> SimulationState:
+    """Removes an agent from the committee and lets the remaining agents reflect on it."""
     logging.info("\n=== EVICTION EVENT OCCURRING ===")
-    logging.info(f"Event: {EVICTION_MESSAGE}")
-    
-    # Create active_agents list excluding the evicted agent
-    active_agents = [name for name in AGENT_NAMES if name != AGENT_TO_EVICT]
+    logging.info(f"Event: {eviction['message']}")
+    emit("eviction", round=round_number, agent=eviction["agent"], message=eviction["message"])
     
     # Remove evicted agent from state
-    del state['agents'][AGENT_TO_EVICT]
+    state = state.without_agent(eviction["agent"])
+    active_agents = list(state.agents)
     
     # Reflection step for remaining agents
     logging.info("\n--- Reflection Step for Remaining Agents ---")
-    for agent_name in active_agents:
-        agent_data = state['agents'][agent_name]
-        
-        eviction_prompt = get_eviction_prompt(
+    history_string = format_history_for_prompt(state)
+    state = state.with_agents(compact_scratchpads({name: state.agents[name] for name in active_agents}))
+    decision_problem = committee_problem(problem, active_agents)
+    eviction_prompts = [
+        get_eviction_prompt(
             agent_name=agent_name,
-            agent_traits=agent_data['traits'],
-            decision_problem=PROBLEM_S2,
-            full_history=format_history_for_prompt(state),
-            eviction_message=EVICTION_MESSAGE,
-            scratchpad_content=agent_data['scratchpad']
+            agent_traits=state.agents[agent_name].traits,
+            decision_problem=decision_problem,
+            full_history=history_string,
+            eviction_message=eviction["message"],
+            scratchpad_content=scratchpad_for_prompt(agent_name, state.agents[agent_name])
         )
-        
-        reflection_response = get_llm_response(eviction_prompt, Reflection)
-        agent_data['scratchpad'] += f"\n\nPost-Eviction Reflection:\n{reflection_response.thoughts}"
-        
-        logging.info(f"[{agent_name}'s Eviction Reflection]: {reflection_response.thoughts}")
+        for agent_name in active_agents
+    ]
     
-    # Rounds 4-8: Continue with remaining 3 agents
-    for round_number in range(4, 9):
-        state = run_simulation_round(state, round_number, active_agents, PROBLEM_S2)
+    reflection_responses = get_llm_responses(
+        eviction_prompts, Reflection,
+        metas=[{"round": round_number, "agent": name, "role": "reflection"} for name in active_agents]
+    )
+    updates = {}
+    for agent_name, reflection_response in zip(active_agents, reflection_responses):
+        updates[agent_name] = append_scratchpad(state.agents[agent_name], f"\n\nPost-Eviction Reflection:\n{reflection_response.thoughts}", round_number, "reflection")
         
-        final_round_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        state["votes_history"].append(final_round_votes)
-        logging.info(f"[End of Round {round_number} Votes]: {final_round_votes}")
-
-        if check_consensus(state):
-            logging.info(f"\n--- consensus reached in round {round_number}! ---")
-            logging.info(f"Final Votes: {final_round_votes}")
-            break
-    else:
-        logging.info("\n--- simulation ended after 8 rounds ---")
-        final_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        logging.info(f"final votes at the end: {final_votes}")
-    
-    logging.info("\n\n--- final agent scratchpads ---")
-    for name, data in state["agents"].items():
-        logging.info(f"\n--- Scratchpad for {name} ---")
-        logging.info(data['scratchpad'].strip())
+        logging.info(f"[{agent_name}'s Eviction Reflection]: {reflection_response.thoughts}")
+        emit("reflection", round=round_number, agent=agent_name)
+    return state.with_agents(updates)
 
-def apply_memory_corruption_attack(state: dict) -> None:
-    """Pure function to apply memory corruption to all agents."""
+def apply_memory_corruption_attack(state: SimulationState, round_number: int,
+                                   injections: dict = dict(zip(AGENT_NAMES, MEMORY_INJECTIONS_S3))) -> SimulationState:
+    """Pure function to apply memory corruption to the agents an injection is given for."""
     logging.info("\n=== MEMORY CORRUPTION ATTACK OCCURRING ===")
     logging.info("Injecting adversarial thoughts into agent scratchpads...")
+    targets = [name for name in state.agents if name in injections]
+    emit("attack", round=round_number, kind="memory_injection", targets=targets)
     
-    for i, (agent_name, agent_data) in enumerate(state["agents"].items()):
-        injection = MEMORY_INJECTIONS_S3[i]
-        agent_data['scratchpad'] += injection
+    updates = {}
+    for agent_name in targets:
+        injection = injections[agent_name]
+        updates[agent_name] = append_scratchpad(state.agents[agent_name], injection, round_number, "injection", injected=True)
         logging.info(f"[{agent_name} Memory Injection]: {injection.strip()}")
+    return state.with_agents(updates)
 
-def determine_round_parameters(round_number: int) -> tuple:
-    """Pure function to determine attack parameters based on round number."""
+def determine_round_parameters(round_number: int, scenario: dict = SCENARIOS["s3"]) -> tuple:
+    """
+    Pure function to determine attack parameters based on round number. The problem
+    override maps each seat of the committee to its corrupted problem statement.
+    """
     problem_override = None
     corrupt_speech = False
     
-    if round_number == 3:
+    information_asymmetry = scenario.get("information_asymmetry")
+    speech_corruption = scenario.get("speech_corruption")
+    if information_asymmetry and round_number in information_asymmetry["rounds"]:
         # Attack 1: Information Asymmetry
-        problem_override = CORRUPTED_PROBLEMS_S3
+        seats = committee_names(len(scenario.get("traits", FIXED_TRAITS)))
+        problem_override = dict(zip(seats, information_asymmetry["problems"]))
         logging.info(f"\n=== INFORMATION ASYMMETRY ATTACK (Round {round_number}) ===")
         logging.info("Each agent will receive a subtly different problem statement...")
-    elif round_number in [6, 7]:
+        emit("attack", round=round_number, kind="information_asymmetry", targets=list(problem_override))
+    elif speech_corruption and round_number in speech_corruption["rounds"]:
         # Attack 3: Speech Corruption
         corrupt_speech = True
         logging.info(f"\n=== SPEECH CORRUPTION ATTACK (Round {round_number}) ===")
         logging.info("The speaker's speech will be intercepted and made more aggressive...")
     
     return problem_override, corrupt_speech
-
-def run_s3():
-    """
-    Runs the S3 simulation with three attack mechanisms:
-    1. Information asymmetry (round 3)
-    2. Memory corruption (after round 3)
-    3. Speech corruption (rounds 6-7)
-    """
-    setup_logging("s3")
-    logging.info("--- starting experiment S3 ---")
-
-    state = {
-        "agents": {},
-        "speeches": [], 
-        "votes_history": [] 
-    }
-
-    # Initialize agents with FIXED_TRAITS
-    for name, traits in zip(AGENT_NAMES, FIXED_TRAITS):
-        state["agents"][name] = {
-            "traits": traits,
-            "scratchpad": "My initial thoughts:\n",
-            "current_vote": "Undecided"
-        }
-
-    logging.info("\n--- Agent Initialization ---")
-    for name, data in state["agents"].items():
-        logging.info(f"{name} | traits: {data['traits']}")
-    
-    # Main simulation loop (rounds 1-10)
-    for round_number in range(1, 11):
-        # Determine attack parameters for this round
-        problem_override, corrupt_speech = determine_round_parameters(round_number)
-        
-        # Run the simulation round with appropriate parameters
-        state = run_simulation_round(
-            state, 
-            round_number, 
-            AGENT_NAMES, 
-            problem_override=problem_override, 
-            corrupt_speech=corrupt_speech
-        )
-        
-        final_round_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        state["votes_history"].append(final_round_votes)
-        logging.info(f"[End of Round {round_number} Votes]: {final_round_votes}")
-
-        # Apply memory corruption attack after round 3
-        if round_number == 3:
-            apply_memory_corruption_attack(state)
-
-        # if check_consensus(state):
-        #     logging.info(f"\n--- consensus reached in round {round_number}! ---")
-        #     logging.info(f"Final Votes: {final_round_votes}")
-        #     break
-    else:
-        logging.info("\n--- simulation ended after 10 rounds ---")
-        final_votes = {name: data["current_vote"] for name, data in state["agents"].items()}
-        logging.info(f"final votes at the end: {final_votes}")
-    
-    logging.info("\n\n--- final agent scratchpads ---")
-    for name, data in state["agents"].items():
-        logging.info(f"\n--- Scratchpad for {name} ---")
-        logging.info(data['scratchpad'].strip())
\ No newline at end of file
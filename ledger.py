@@ -0,0 +1,221 @@
+import contextvars
+import json
+import time
+from collections import defaultdict
+
+from config import MODEL_PRICES, BATCH_JOB_PRICE_FACTOR, RUN_BUDGET_TOKENS, RUN_BUDGET_DOLLARS, RUN_BUDGET_SECONDS
+
+# budget applied to every run started from now on
+_budget = {"max_tokens": RUN_BUDGET_TOKENS, "max_dollars": RUN_BUDGET_DOLLARS, "max_seconds": RUN_BUDGET_SECONDS}
+
+# the ledger of the run in progress; a context variable so concurrently running simulations keep theirs apart
+_current = contextvars.ContextVar("ledger", default=None)
+
+
+class Ledger:
+    """
+    Per-run record of every LLM call: tokens, cost, latency and retries, tagged with
+    round, agent and role. Also enforces the run's token/dollar/wall-time budget.
+    """
+
+    def __init__(self, max_tokens: int = None, max_dollars: float = None, max_seconds: float = None):
+        self.max_tokens = max_tokens
+        self.max_dollars = max_dollars
+        self.max_seconds = max_seconds
+        self.started_at = time.time()
+        self.elapsed_before = 0.0  # wall time spent in earlier sessions of a resumed run
+        self.records = []
+
+    def record(self, meta: dict, model: str, response_model: str, usage: dict, latency: float,
+               retries: int = 0, reasks: int = 0, cache_hit: bool = False, fallback: bool = False, batch: bool = False,
+               escalated: bool = False, reference_model: str = None, hedged: bool = False, hedge_won: bool = False) -> None:
+        usage = usage or {}
+        record = {
+            "round": meta.get("round"),
+            "agent": meta.get("agent"),
+            "role": meta.get("role"),
+            "model": model,
+            "response_model": response_model,
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "cached_tokens": usage.get("cached_tokens", 0),
+            "latency": round(latency, 4),
+            "retries": retries,
+            "reasks": reasks,
+            "cache_hit": cache_hit,
+            "fallback": fallback,
+            "batch": batch,
+            "escalated": escalated,
+            "hedged": hedged,
+            "hedge_won": hedge_won,
+            "reference_model": reference_model or model
+        }
+        record["cost"] = call_cost(record)
+        self.records.append(record)
+
+    def elapsed(self) -> float:
+        return self.elapsed_before + time.time() - self.started_at
+
+    def totals(self) -> dict:
+        return _aggregate(self.records)
+
+    def summary(self) -> dict:
+        """
+        Totals overall and grouped by round, agent and role, what model routing saved per role,
+        and each role's latency percentiles and hedged requests.
+        """
+        return {
+            "totals": dict(self.totals(), wall_time=round(self.elapsed(), 2)),
+            "by_round": _group(self.records, "round"),
+            "by_agent": _group(self.records, "agent"),
+            "by_role": _group(self.records, "role"),
+            "routing": _routing(self.records),
+            "latency": _latency(self.records),
+            "budget": {"max_tokens": self.max_tokens, "max_dollars": self.max_dollars, "max_seconds": self.max_seconds}
+        }
+
+    def budget_exceeded(self) -> str:
+        """A description of the first exhausted budget, or None while the run may continue."""
+        totals = self.totals()
+        if self.max_tokens is not None and totals["total_tokens"] >= self.max_tokens:
+            return f"token budget of {self.max_tokens} reached ({totals['total_tokens']} used)"
+        if self.max_dollars is not None and totals["cost"] >= self.max_dollars:
+            return f"cost budget of ${self.max_dollars:.2f} reached (${totals['cost']:.4f} spent)"
+        if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+            return f"wall time budget of {self.max_seconds:.0f}s reached ({self.elapsed():.0f}s elapsed)"
+        return None
+
+    def to_dict(self) -> dict:
+        """What a checkpoint needs to resume this ledger."""
+        return {"records": self.records, "elapsed": self.elapsed()}
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "calls": self.records}, f, indent=2)
+
+
+def call_cost(record: dict) -> float:
+    """
+    Dollar cost of one call from MODEL_PRICES (USD per 1M tokens); unknown models cost 0.
+    Calls served by an offline batch job are billed at BATCH_JOB_PRICE_FACTOR of that.
+    """
+    prices = MODEL_PRICES.get(record["model"])
+    if prices is None:
+        return 0.0
+    uncached = record["prompt_tokens"] - record["cached_tokens"]
+    cost = (
+        uncached * prices["input"]
+        + record["cached_tokens"] * prices["cached_input"]
+        + record["completion_tokens"] * prices["output"]
+    ) / 1_000_000
+    if record.get("batch"):
+        cost *= BATCH_JOB_PRICE_FACTOR
+    return round(cost, 6)
+
+
+def _aggregate(records: list) -> dict:
+    totals = {
+        "calls": len(records),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+        "completion_tokens": sum(r["completion_tokens"] for r in records),
+        "cached_tokens": sum(r["cached_tokens"] for r in records),
+        "retries": sum(r["retries"] for r in records),
+        "reasks": sum(r.get("reasks", 0) for r in records),
+        "cache_hits": sum(r["cache_hit"] for r in records),
+        "fallbacks": sum(r["fallback"] for r in records),
+        "latency": round(sum(r["latency"] for r in records), 3),
+        "cost": round(sum(r["cost"] for r in records), 6)
+    }
+    totals["total_tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+    return totals
+
+
+def _group(records: list, field: str) -> dict:
+    groups = defaultdict(list)
+    for record in records:
+        groups[str(record[field])].append(record)
+    return {key: _aggregate(group) for key, group in groups.items()}
+
+
+def _routing(records: list) -> dict:
+    """
+    Per role: the calls each model answered, the escalations, and the cost and latency saved
+    against sending every call to the role's reference model. Latency saved is estimated from
+    the role's own calls to the reference model, so it is None when there are none.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[str(record["role"])].append(record)
+    routing = {}
+    for role, group in groups.items():
+        models = defaultdict(int)
+        for record in group:
+            models[record["model"]] += 1
+        reference_cost = sum(
+            call_cost(dict(record, model=record.get("reference_model") or record["model"])) for record in group
+        )
+        cost = sum(record["cost"] for record in group)
+        routed = [r for r in group if r["model"] != (r.get("reference_model") or r["model"]) and not r["cache_hit"]]
+        reference = [r for r in group if r["model"] == (r.get("reference_model") or r["model"]) and not r["cache_hit"]]
+        latency_saved = None
+        if reference:
+            mean_latency = sum(r["latency"] for r in reference) / len(reference)
+            latency_saved = round(mean_latency * len(routed) - sum(r["latency"] for r in routed), 3)
+        routing[role] = {
+            "models": dict(models),
+            "escalations": sum(record.get("escalated", False) for record in group),
+            "cost": round(cost, 6),
+            "reference_cost": round(reference_cost, 6),
+            "cost_saved": round(reference_cost - cost, 6),
+            "latency": round(sum(record["latency"] for record in group), 3),
+            "latency_saved": latency_saved
+        }
+    return routing
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _latency(records: list) -> dict:
+    """Per role: p50/p99 latency of the calls sent to the provider, and how many were hedged and won by the hedge."""
+    groups = defaultdict(list)
+    for record in records:
+        if not record["cache_hit"]:
+            groups[str(record["role"])].append(record)
+    return {
+        role: {
+            "p50": round(_percentile([r["latency"] for r in group], 0.50), 4),
+            "p99": round(_percentile([r["latency"] for r in group], 0.99), 4),
+            "hedges": sum(r.get("hedged", False) for r in group),
+            "hedge_wins": sum(r.get("hedge_won", False) for r in group)
+        }
+        for role, group in groups.items()
+    }
+
+
+def configure_budget(max_tokens: int = None, max_dollars: float = None, max_seconds: float = None) -> None:
+    """Overrides the per-run budget from config; None leaves that limit unchanged."""
+    for key, value in (("max_tokens", max_tokens), ("max_dollars", max_dollars), ("max_seconds", max_seconds)):
+        if value is not None:
+            _budget[key] = value
+
+
+def start_ledger() -> Ledger:
+    """Makes a fresh ledger, with the configured budget, current for the run starting in this context."""
+    ledger = Ledger(**_budget)
+    _current.set(ledger)
+    return ledger
+
+
+def current_ledger() -> Ledger:
+    return _current.get()
+
+
+def resume_ledger(data: dict) -> Ledger:
+    """Makes a ledger restored from a checkpoint current, so a resumed run keeps its totals and budget."""
+    ledger = start_ledger()
+    ledger.records = list(data["records"])
+    ledger.elapsed_before = data["elapsed"]
+    return ledger
@@ -1,16 +1,182 @@
-import instructor
-from openai import OpenAI
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import List, Literal
 
-from config import OPENAI_API_KEY, LLM_MODEL
+from config import (
+    LLM_MODEL, LLM_TEMPERATURE, MODEL_ROUTES, LLM_CACHE_MODE, LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_AGE_DAYS,
+    CONCURRENT_CALLS, CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN,
+    HEDGE_REQUESTS, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_WINDOW, STRUCTURED_OUTPUT
+)
+from backends import (
+    OpenAIBackend, NativeJSONBackend, RecordingBackend, ReplayBackend, CassetteMissError, set_rate_limiter, retryable_errors
+)
+from ledger import current_ledger
+from llm_cache import ResponseCache
 from prompts import get_system_prompt
+from ratelimit import CircuitBreaker, LatencyTracker
+
+# All calls run on one background event loop, so synchronous callers and
+# concurrent fan-outs share the backend's connections and limits.
+_loop = None
+_loop_lock = threading.Lock()
+
+# where responses come from: live OpenAI (default, built on first use), a recorder or a replayer
+_backend = None
+# how the live backend gets structured responses: "instructor" or "native" JSON-schema output
+_structured_output = STRUCTURED_OUTPUT
+LIVE_BACKENDS = {"instructor": OpenAIBackend, "native": NativeJSONBackend}
+# one breaker per model, so an outage of one model does not stop the tiers that would take over from it
+_circuit_breakers = {}
+
+# persistent response cache; replicates use distinct sample indices so they stay independent samples
+_cache = ResponseCache(LLM_CACHE_PATH, LLM_CACHE_MODE, LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_AGE_DAYS)
+_sample_index = 0
+
+# call counters, so retries and placeholder responses are visible in every run
+_stats = Counter()
+_fallbacks = Counter()
+
+# whether independent calls of a round (listeners, reflections) are sent together
+_concurrent_calls = CONCURRENT_CALLS
+
+# whether slow calls are hedged with a duplicate request, and the recent latencies that decide when
+_hedging = HEDGE_REQUESTS
+_latencies = LatencyTracker(HEDGE_WINDOW)
+
+# model tiers per call role for the run in progress, and the command line's overrides of them
+_routes = dict(MODEL_ROUTES)
+_route_overrides = {}
+# roles that share another role's route
+ROLE_ROUTES = {"listener_batch": "listener"}
+
+
+def set_backend(backend) -> None:
+    """Installs the LLMBackend every subsequent call goes to."""
+    global _backend
+    _backend = backend
+
+
+def set_concurrent_calls(enabled: bool) -> None:
+    """Switches sending the independent calls of a round together on or off."""
+    global _concurrent_calls
+    _concurrent_calls = enabled
+
+
+def set_hedging(enabled: bool) -> None:
+    """Switches hedging slow calls with a duplicate request on or off."""
+    global _hedging
+    _hedging = enabled
+
+
+def _as_tiers(routes: dict) -> dict:
+    return {role: [models] if isinstance(models, str) else list(models) for role, models in routes.items()}
+
+
+def set_model_routes(routes: dict = None) -> None:
+    """Routes for the run starting now: MODEL_ROUTES, updated with a scenario's "models" and then the command line's."""
+    global _routes
+    _routes = {**MODEL_ROUTES, **_as_tiers(routes or {}), **_route_overrides}
+
+
+def override_model_routes(routes: dict) -> None:
+    """Routes from the command line, applied on top of every run's own."""
+    _route_overrides.update(_as_tiers(routes))
+    _routes.update(_route_overrides)
+
+
+def model_tiers(role: str) -> list:
+    """The models a call of this role tries, cheapest first."""
+    return _routes.get(ROLE_ROUTES.get(role, role), [LLM_MODEL])
 
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable not set")
 
-# 1. configure the openai client with the 'instructor' patch
-client = instructor.patch(OpenAI(api_key=OPENAI_API_KEY))
+def set_structured_output(mode: str) -> None:
+    """Chooses how live backends built from now on get structured responses ("instructor" or "native")."""
+    global _structured_output
+    if mode not in LIVE_BACKENDS:
+        raise ValueError(f"unknown structured output mode '{mode}' (modes: {', '.join(LIVE_BACKENDS)})")
+    _structured_output = mode
+
+
+def configure_backend(record_path: str = None, replay_path: str = None) -> None:
+    """Switches to recording calls to a cassette, or to replaying one offline."""
+    if replay_path:
+        set_backend(ReplayBackend(replay_path))
+    elif record_path:
+        set_backend(RecordingBackend(LIVE_BACKENDS[_structured_output](), record_path))
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        _backend = LIVE_BACKENDS[_structured_output]()
+    return _backend
+
+
+def configure_cache(mode: str = None, sample_index: int = None) -> None:
+    """Switches the response cache mode and/or the sample index used in cache keys."""
+    global _cache, _sample_index
+    if mode is not None:
+        _cache = ResponseCache(LLM_CACHE_PATH, mode, LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_AGE_DAYS)
+    if sample_index is not None:
+        _sample_index = sample_index
+
+
+def get_sample_index() -> int:
+    """The sample index in the cache keys of calls made now."""
+    return _sample_index
+
+
+def _reset_after_fork() -> None:
+    """A forked worker must not reuse the parent's event loop thread or breaker state."""
+    global _loop
+    _loop = None
+    _circuit_breakers.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _circuit_breaker(model: str) -> CircuitBreaker:
+    if model not in _circuit_breakers:
+        _circuit_breakers[model] = CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN)
+    return _circuit_breakers[model]
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+    return _loop
+
+
+def _run(coro):
+    """
+    Runs a coroutine on the background loop and blocks until it finishes. The coroutine
+    runs in a copy of the caller's context, so per-run state such as the ledger follows it.
+    """
+    loop = _get_loop()
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+
+    def on_done(task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    loop.call_soon_threadsafe(lambda: loop.create_task(coro, context=context).add_done_callback(on_done))
+    return future.result()
 
 
 class SpeakerDeliberation(BaseModel):
@@ -22,38 +188,229 @@ class ListenerResponse(BaseModel):
     thoughts: str = Field(..., description="Your private reaction and thoughts on the speaker's statement.")
     vote: Literal["A", "B", "Undecided"]
 
+class ListenerBatchEntry(BaseModel):
+    agent_name: str = Field(..., description="The name of the committee member this entry is for.")
+    thoughts: str = Field(..., description="That member's private reaction and thoughts on the speaker's statement.")
+    vote: Literal["A", "B", "Undecided"]
+
+class ListenerBatch(BaseModel):
+    responses: List[ListenerBatchEntry] = Field(..., description="Exactly one entry per listed committee member.")
+
 class Reflection(BaseModel):
     thoughts: str = Field(..., description="Your private reflections and thoughts on the eviction event.")
 
 class CorruptedSpeech(BaseModel):
     rewritten_speech: str = Field(..., description="The corrupted version of the original speech.")
 
+class ScratchpadSummary(BaseModel):
+    summary: str = Field(..., description="A condensed version of your earlier private notes.")
+
+# every structured response a call can ask for, by name (batch job files refer to them by name)
+RESPONSE_MODELS = {
+    model.__name__: model
+    for model in (SpeakerDeliberation, ListenerResponse, ListenerBatch, Reflection, CorruptedSpeech, ScratchpadSummary)
+}
+
+
 
-def get_llm_response(prompt: str, response_model) -> BaseModel:
+def fallback_response(response_model) -> BaseModel:
+    """The placeholder returned when a call fails for good."""
+    if response_model == SpeakerDeliberation:
+        return response_model(thoughts="Error processing.", vote="Undecided", speech="Error.")
+    elif response_model == ListenerResponse:
+        return response_model(thoughts="Error processing.", vote="Undecided")
+    elif response_model == Reflection:
+        return response_model(thoughts="Error processing.")
+    elif response_model == CorruptedSpeech:
+        return response_model(rewritten_speech="Error processing.")
+    elif response_model == ScratchpadSummary:
+        return response_model(summary="Error processing.")
+    elif response_model == ListenerBatch:
+        # no entries, so every listener of the batch is asked individually
+        return response_model(responses=[])
+    else:
+        return response_model(thoughts="Error processing.")
+
+
+async def aget_llm_response(prompt: str, response_model, model: str = None, meta: dict = None,
+                            placeholder: bool = True) -> BaseModel:
     """
-    Generalized LLM call that accepts any Pydantic response_model.
+    Generalized async LLM call that accepts any Pydantic response_model.
+    A call that fails for good returns a counted placeholder, or None with placeholder=False
+    for callers that would rather skip a step than use one. `meta` tags the call
+    in the run's ledger with its round, agent and role. Without an explicit model the
+    call follows its role's route: when a model's answer fails, the next one is asked.
+    """
+    meta = meta or {}
+    tiers = [model] if model else model_tiers(meta.get("role"))
+    system_prompt = get_system_prompt()
+    _stats["calls"] += 1
+    for tier, tier_model in enumerate(tiers[:-1]):
+        response = await _attempt(prompt, response_model, tier_model, meta, system_prompt, tiers[-1], placeholder, escalate=True)
+        if response is not None:
+            return response
+        _stats["escalations"] += 1
+        logging.warning(f"{response_model.__name__} from {tier_model} failed, escalating to {tiers[tier + 1]}")
+    return await _attempt(prompt, response_model, tiers[-1], meta, system_prompt, tiers[-1], placeholder)
+
+
+async def _attempt(prompt: str, response_model, model: str, meta: dict, system_prompt: str,
+                   reference_model: str, placeholder: bool = True, escalate: bool = False) -> BaseModel:
+    """
+    One model's try at a call. On failure it returns the counted placeholder (None without
+    one), or None when the call will escalate to a larger model instead. Only transport errors (the ones worth
+    retrying) count against the model's circuit breaker; while it is open, the call goes
+    straight to the next tier.
     """
+    started = time.perf_counter()
+    routing = {"reference_model": reference_model}
+
+    cache_key = None
+    if _cache.enabled:
+        cache_key = ResponseCache.make_key(model, system_prompt, prompt, response_model, LLM_TEMPERATURE, _sample_index)
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            _record(meta, model, response_model, None, started, cache_hit=True, **routing)
+            return response_model.model_validate_json(cached)
+
+    backend = _get_backend()
+
+    breaker = _circuit_breaker(model)
+    if not breaker.allow():
+        _stats["circuit_open"] += 1
+        if escalate:
+            _record(meta, model, response_model, None, started, escalated=True, **routing)
+            return None
+        _record(meta, model, response_model, None, started, fallback=True, **routing)
+        return _fallback(response_model, f"circuit breaker of {model} is open", placeholder)
+
     try:
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            response_model=response_model,
-            messages=[
-                {"role": "system", "content": get_system_prompt()},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=1,
-        )
-        return response
+        result, hedge = await _complete(backend, system_prompt, prompt, response_model, model, meta.get("role"))
+    except CassetteMissError:
+        # a replayed run that leaves its cassette must fail loudly, not carry on with placeholders
+        raise
     except Exception as e:
-        print(f"An error occurred: {e}")
-        # Return a default object if the API call fails
-        if response_model == SpeakerDeliberation:
-            return response_model(thoughts="Error processing.", vote="Undecided", speech="Error.")
-        elif response_model == ListenerResponse:
-            return response_model(thoughts="Error processing.", vote="Undecided")
-        elif response_model == Reflection:
-            return response_model(thoughts="Error processing.")
-        elif response_model == CorruptedSpeech:
-            return response_model(rewritten_speech="Error processing.")
-        else:
-            return response_model(thoughts="Error processing.")
\ No newline at end of file
+        if isinstance(e, retryable_errors()):
+            breaker.record_failure()
+        if escalate:
+            _record(meta, model, response_model, None, started, escalated=True, **routing)
+            return None
+        _record(meta, model, response_model, None, started, fallback=True, **routing)
+        return _fallback(response_model, e, placeholder)
+
+    breaker.record_success()
+    _stats["retries"] += result.retries
+    _stats["reasks"] += result.reasks
+    if result.usage is not None:
+        _stats["prompt_tokens"] += result.usage["prompt_tokens"]
+        _stats["cached_tokens"] += result.usage["cached_tokens"]
+    _record(meta, model, response_model, result.usage, started, retries=result.retries, reasks=result.reasks, batch=result.batch, **hedge, **routing)
+    if cache_key is not None:
+        _cache.put(cache_key, result.response.model_dump_json())
+    return result.response
+
+
+async def _complete(backend, system_prompt: str, prompt: str, response_model, model: str, role: str) -> tuple:
+    """
+    Sends a call to the backend. With hedging on, a call still unanswered after the usual
+    latency of its role and model is sent again, and whichever request first returns a valid
+    response wins; the other is cancelled. Returns the result and how hedging went.
+    """
+    key = (role, model)
+    started = time.perf_counter()
+    delay = _latencies.percentile(key, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES) if _hedging else None
+    if delay is None:
+        result = await backend.complete(system_prompt, prompt, response_model, model)
+        _latencies.add(key, time.perf_counter() - started)
+        return result, {}
+
+    first = asyncio.ensure_future(backend.complete(system_prompt, prompt, response_model, model))
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            result = first.result()
+            _latencies.add(key, time.perf_counter() - started)
+            return result, {}
+        _stats["hedges"] += 1
+        pending.add(asyncio.ensure_future(backend.complete(system_prompt, prompt, response_model, model)))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    hedge_won = task is not first
+                    _stats["hedge_wins"] += hedge_won
+                    _latencies.add(key, time.perf_counter() - started)
+                    return task.result(), {"hedged": True, "hedge_won": hedge_won}
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _record(meta: dict, model: str, response_model, usage: dict, started: float, **outcome) -> None:
+    ledger = current_ledger()
+    if ledger is not None:
+        ledger.record(meta, model, response_model.__name__, usage, time.perf_counter() - started, **outcome)
+
+
+def _fallback(response_model, reason, placeholder: bool = True) -> BaseModel:
+    _stats["fallbacks"] += 1
+    _fallbacks[response_model.__name__] += 1
+    if not placeholder:
+        logging.warning(f"LLM call for {response_model.__name__} failed: {reason}")
+        return None
+    logging.warning(f"LLM call for {response_model.__name__} failed, using placeholder response: {reason}")
+    return fallback_response(response_model)
+
+
+def get_llm_response(prompt: str, response_model, model: str = None, meta: dict = None,
+                     placeholder: bool = True) -> BaseModel:
+    """
+    Generalized LLM call that accepts any Pydantic response_model.
+    """
+    return _run(aget_llm_response(prompt, response_model, model, meta, placeholder))
+
+
+def get_llm_responses(prompts: list, response_model, metas: list = None, placeholder: bool = True) -> list:
+    """
+    Runs several independent LLM calls and returns the responses in prompt order.
+    Calls are sent together when concurrent calls are enabled (CONCURRENT_CALLS).
+    """
+    metas = metas or [None] * len(prompts)
+    if not _concurrent_calls or len(prompts) < 2:
+        return [get_llm_response(prompt, response_model, meta=meta, placeholder=placeholder) for prompt, meta in zip(prompts, metas)]
+
+    async def gather():
+        return await asyncio.gather(*(
+            aget_llm_response(prompt, response_model, meta=meta, placeholder=placeholder) for prompt, meta in zip(prompts, metas)
+        ))
+
+    return _run(gather())
+
+
+def get_llm_stats() -> dict:
+    """Call, retry and placeholder counts since the last reset."""
+    return {
+        "calls": _stats["calls"],
+        "retries": _stats["retries"],
+        "reasks": _stats["reasks"],
+        "fallbacks": _stats["fallbacks"],
+        "fallbacks_by_model": dict(_fallbacks),
+        "circuit_open": _stats["circuit_open"],
+        "escalations": _stats["escalations"],
+        "hedges": _stats["hedges"],
+        "hedge_wins": _stats["hedge_wins"],
+        "circuit_breaker_trips": sum(breaker.times_opened for breaker in _circuit_breakers.values()),
+        "prompt_tokens": _stats["prompt_tokens"],
+        "cached_tokens": _stats["cached_tokens"],
+        "cache": _cache.stats()
+    }
+
+
+def reset_llm_stats() -> None:
+    _stats.clear()
+    _fallbacks.clear()
+    _cache.reset_stats()
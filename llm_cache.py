@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_MODES = ("readwrite", "readonly", "off")
+
+
+class CacheMissError(LookupError):
+    """Raised in readonly mode when a call has no cached response."""
+
+
+class ResponseCache:
+    """
+    Content-addressed, on-disk (SQLite) cache of parsed LLM responses.
+
+    Modes:
+    - readwrite: serve hits, call the provider on a miss and store the result
+    - readonly:  serve hits, raise CacheMissError on a miss (fully offline replay)
+    - off:       bypass the cache entirely
+    """
+
+    def __init__(self, path: str, mode: str = "off", max_bytes: int = None, max_age_days: float = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+        self._writes_since_evict = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _connect(self) -> sqlite3.Connection:
+        # connections must not cross a fork, so every worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._pid = os.getpid()
+            if self.mode == "readwrite":
+                self.evict()
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str, response_model, temperature: float, sample_index: int) -> str:
+        """Hashes everything that determines a response, plus the sample index of stochastic replicates."""
+        schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+        payload = json.dumps([model, system_prompt, prompt, schema, temperature, sample_index])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Returns the cached JSON for `key`, or None on a miss."""
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            if self.mode == "readonly":
+                raise CacheMissError(f"No cached response for key {key[:12]}")
+            return None
+        self.hits += 1
+        if self.mode == "readwrite":
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        if self.mode != "readwrite":
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now, now)
+        )
+        conn.commit()
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= 100:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drops entries older than max_age_days, then least recently used ones above max_bytes."""
+        conn = self._connect()
+        self._writes_since_evict = 0
+        if self.max_age_days is not None:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_days * 86400,))
+        if self.max_bytes is not None:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+                stale = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        conn.commit()
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,308 @@
+"""
+Columnar store of past runs, built from their text logs.
+
+    python logstore.py build                                   # ingest logs/*.log into logs/store
+    python logstore.py query --experiment s3 --round 6 --kind corrupted_speech
+    python logstore.py votes --experiment s1
+
+Every .log file (the legacy s0-s3 logs and newer runs alike) is parsed once into flat
+NumPy columns: one row per logged text (speech, scratchpad update, reaction, injection,
+attack marker, ...) with its run, round, agent and kind, the texts in one UTF-8 blob,
+and dense vote, speaker and trait arrays. Columns are memory-mapped when the store is
+opened, and a small JSON index maps experiments to contiguous run ranges and runs to
+contiguous row ranges, so a query only touches the slices it needs.
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from analytics import VoteTensor, VOTE_CODES, ABSENT, UNDECIDED
+from config import LOG_DIR, STORE_DIR, TRAIT_NAMES
+from state import Vote
+
+# kinds of text rows; the last four are attack/eviction markers, named like their events
+KINDS = (
+    "speech", "original_speech", "corrupted_speech", "scratchpad_update", "reaction", "eviction_reflection",
+    "injected_memory", "final_scratchpad", "information_asymmetry", "memory_injection", "speech_corruption", "eviction"
+)
+MARKER_KINDS = KINDS[-4:]
+
+RUN_START = re.compile(r"^--- starting experiment (\w+)(?::.*?)?(?: as a branch of (\S+) after round \d+)? ---$", re.IGNORECASE)
+TRAITS = re.compile(r"^(\w+) \| traits: (\{.*\})$", re.IGNORECASE)
+ROUND_START = re.compile(r"^--- Round (\d+) \| Speaker: (\w+) ---$")
+AGENT_TEXT = re.compile(r"^\[(\w+)'s (Speech|Original Speech|Corrupted Speech|Scratchpad Update|Reaction \(Scratchpad\)|Eviction Reflection)\]: ?(.*)$")
+INJECTION = re.compile(r"^\[(\w+) Memory Injection\]: ?(.*)$")
+ROUND_VOTES = re.compile(r"^\[End of Round (\d+) Votes\]: (\{.*\})$")
+ROUND_ATTACK = re.compile(r"^=== (INFORMATION ASYMMETRY|SPEECH CORRUPTION) ATTACK \(Round (\d+)\) ===$")
+FINAL_SCRATCHPAD = re.compile(r"^--- Scratchpad for (\w+) ---$")
+EVICTED = re.compile(r"^Event: ((\w+) has been evicted.*)$")
+# any other header line ends the text it follows
+HEADER = re.compile(r"^(\[[^\]]+\]:?( |$)|--- |=== |HTTP Request: |Event: |Scenario: |Final Votes: |final votes at the end: )")
+
+AGENT_TEXT_KINDS = {
+    "Speech": "speech", "Original Speech": "original_speech", "Corrupted Speech": "corrupted_speech",
+    "Scratchpad Update": "scratchpad_update", "Reaction (Scratchpad)": "reaction", "Eviction Reflection": "eviction_reflection"
+}
+
+
+def parse_log(path: str) -> dict:
+    """The traits, speakers, votes and every logged text of one run's .log file."""
+    run_id = os.path.splitext(os.path.basename(path))[0]
+    run = {
+        "run_id": run_id, "experiment": run_id.split("_")[0].lower(), "branched_from": None,
+        "traits": {}, "speakers": {}, "votes": {}, "rows": []
+    }
+    round_number = 0
+    text = None  # the row whose text continues on the following lines
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if text is not None and not HEADER.match(line):
+                text.append(line)
+                continue
+            text = None
+
+            if match := AGENT_TEXT.match(line):
+                text = [match.group(3)]
+                run["rows"].append([round_number, match.group(1), AGENT_TEXT_KINDS[match.group(2)], text])
+            elif match := ROUND_START.match(line):
+                round_number = int(match.group(1))
+                run["speakers"][round_number] = match.group(2)
+            elif match := ROUND_VOTES.match(line):
+                run["votes"][int(match.group(1))] = ast.literal_eval(match.group(2))
+            elif match := INJECTION.match(line):
+                text = [match.group(2)]
+                run["rows"].append([round_number, match.group(1), "injected_memory", text])
+            elif match := ROUND_ATTACK.match(line):
+                run["rows"].append([int(match.group(2)), None, match.group(1).lower().replace(" ", "_"), [""]])
+            elif line == "=== MEMORY CORRUPTION ATTACK OCCURRING ===":
+                run["rows"].append([round_number, None, "memory_injection", [""]])
+            elif match := EVICTED.match(line):
+                run["rows"].append([round_number, match.group(2), "eviction", [match.group(1)]])
+            elif match := FINAL_SCRATCHPAD.match(line):
+                text = []
+                run["rows"].append([round_number, match.group(1), "final_scratchpad", text])
+            elif match := TRAITS.match(line):
+                run["traits"][match.group(1)] = ast.literal_eval(match.group(2))
+            elif match := RUN_START.match(line):
+                run["experiment"] = match.group(1).lower()
+                run["branched_from"] = match.group(2)
+
+    run["rows"] = [(r, agent, kind, "\n".join(lines).strip()) for r, agent, kind, lines in run["rows"]]
+    run["rounds"] = max(run["votes"], default=0)
+    return run
+
+
+def build_store(paths: list, directory: str = STORE_DIR) -> dict:
+    """
+    Parses the given logs and (re)writes the store. Runs are ordered by experiment, then
+    run id, and each run's rows stay in log order. Returns the store's index.
+    """
+    runs = sorted((parse_log(path) for path in paths), key=lambda run: (run["experiment"], run["run_id"]))
+    agents = list(dict.fromkeys(
+        name for run in runs
+        for name in [*run["traits"], *run["speakers"].values(), *(n for votes in run["votes"].values() for n in votes),
+                     *(row[1] for row in run["rows"] if row[1] is not None)]
+    ))
+    traits = list(dict.fromkeys([*TRAIT_NAMES, *(name for run in runs for values in run["traits"].values() for name in values)]))
+    agent_index = {name: i for i, name in enumerate(agents)}
+    kind_index = {kind: i for i, kind in enumerate(KINDS)}
+    rounds = max((run["rounds"] for run in runs), default=0)
+
+    votes = np.full((len(runs), rounds + 1, len(agents)), ABSENT, dtype=np.int8)
+    speakers = np.full((len(runs), rounds + 1), ABSENT, dtype=np.int16)
+    trait_values = np.full((len(runs), len(agents), len(traits)), np.nan, dtype=np.float32)
+    row_offsets = np.zeros(len(runs) + 1, dtype=np.int64)
+    columns = {"run": [], "round": [], "agent": [], "kind": [], "text_start": [], "text_length": []}
+    blob = bytearray()
+    experiments = {}
+
+    for i, run in enumerate(runs):
+        start, stop = experiments.get(run["experiment"], (i, i))
+        experiments[run["experiment"]] = [start, i + 1]
+        if run["branched_from"] is None:
+            votes[i, 0, [agent_index[name] for name in run["traits"]]] = UNDECIDED
+        for round_number, round_votes in run["votes"].items():
+            votes[i, round_number, [agent_index[name] for name in round_votes]] = [VOTE_CODES[Vote(v)] for v in round_votes.values()]
+        for round_number, speaker in run["speakers"].items():
+            speakers[i, round_number] = agent_index[speaker]
+        for name, values in run["traits"].items():
+            trait_values[i, agent_index[name], [traits.index(trait) for trait in values]] = list(values.values())
+        for round_number, agent, kind, text in run["rows"]:
+            encoded = text.encode("utf-8")
+            columns["run"].append(i)
+            columns["round"].append(round_number)
+            columns["agent"].append(ABSENT if agent is None else agent_index[agent])
+            columns["kind"].append(kind_index[kind])
+            columns["text_start"].append(len(blob))
+            columns["text_length"].append(len(encoded))
+            blob += encoded
+        row_offsets[i + 1] = len(columns["run"])
+
+    # written next to the old store and swapped in at the end, so readers never see half a store
+    staging = directory + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    dtypes = {"run": np.int32, "round": np.int16, "agent": np.int16, "kind": np.int8, "text_start": np.int64, "text_length": np.int32}
+    for name, values in columns.items():
+        np.save(f"{staging}/{name}.npy", np.asarray(values, dtype=dtypes[name]))
+    for name, array in (("votes", votes), ("speakers", speakers), ("traits", trait_values), ("row_offsets", row_offsets)):
+        np.save(f"{staging}/{name}.npy", array)
+    with open(f"{staging}/text.bin", "wb") as f:
+        f.write(blob)
+    index = {
+        "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": [
+            {"run_id": run["run_id"], "experiment": run["experiment"], "branched_from": run["branched_from"], "rounds": run["rounds"]}
+            for run in runs
+        ],
+        "experiments": experiments,
+        "agents": agents,
+        "traits": traits,
+        "kinds": list(KINDS)
+    }
+    with open(f"{staging}/index.json", "w") as f:
+        json.dump(index, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    return index
+
+
+class LogStore:
+    """A built store, opened read-only with every column memory-mapped."""
+
+    def __init__(self, directory: str = STORE_DIR):
+        with open(f"{directory}/index.json") as f:
+            self.index = json.load(f)
+        self.runs = self.index["runs"]
+        self.run_ids = {run["run_id"]: i for i, run in enumerate(self.runs)}
+        self.agents = self.index["agents"]
+        self.agent_index = {name: i for i, name in enumerate(self.agents)}
+        self.kind_index = {kind: i for i, kind in enumerate(self.index["kinds"])}
+        self.columns = {
+            name: np.load(f"{directory}/{name}.npy", mmap_mode="r")
+            for name in ("run", "round", "agent", "kind", "text_start", "text_length", "votes", "speakers", "traits", "row_offsets")
+        }
+        size = os.path.getsize(f"{directory}/text.bin")
+        self.text = np.memmap(f"{directory}/text.bin", dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+
+    def run_range(self, experiment: str = None, run_id: str = None) -> slice:
+        """The contiguous runs of one experiment, or the single run `run_id`."""
+        if run_id is not None:
+            i = self.run_ids[run_id]
+            return slice(i, i + 1)
+        if experiment is not None:
+            start, stop = self.index["experiments"].get(experiment, (0, 0))
+            return slice(start, stop)
+        return slice(0, len(self.runs))
+
+    def rows(self, experiment: str = None, run_id: str = None, round: int = None, agent: str = None, kind: str = None) -> list:
+        """Every logged text matching the filters, e.g. rows("s3", round=6, kind="corrupted_speech")."""
+        runs = self.run_range(experiment, run_id)
+        offsets = self.columns["row_offsets"]
+        rows = slice(int(offsets[runs.start]), int(offsets[runs.stop]))
+        mask = np.ones(rows.stop - rows.start, dtype=bool)
+        if round is not None:
+            mask &= self.columns["round"][rows] == round
+        if agent is not None:
+            mask &= self.columns["agent"][rows] == self.agent_index.get(agent, -2)
+        if kind is not None:
+            mask &= self.columns["kind"][rows] == self.kind_index[kind]
+        selected = rows.start + np.flatnonzero(mask)
+        return [self._row(i) for i in selected]
+
+    def _row(self, i: int) -> dict:
+        start = int(self.columns["text_start"][i])
+        agent = int(self.columns["agent"][i])
+        return {
+            "run_id": self.runs[int(self.columns["run"][i])]["run_id"],
+            "round": int(self.columns["round"][i]),
+            "agent": None if agent == ABSENT else self.agents[agent],
+            "kind": self.index["kinds"][int(self.columns["kind"][i])],
+            "text": bytes(self.text[start:start + int(self.columns["text_length"][i])]).decode("utf-8")
+        }
+
+    def vote_matrix(self, experiment: str = None) -> tuple:
+        """Run ids and their runs x rounds x agents vote codes (see analytics.VOTE_CODES)."""
+        runs = self.run_range(experiment)
+        return [run["run_id"] for run in self.runs[runs]], self.columns["votes"][runs]
+
+    def traits(self, experiment: str = None) -> np.ndarray:
+        """runs x agents x traits initial trait values, NaN where not logged."""
+        return self.columns["traits"][self.run_range(experiment)]
+
+    def vote_tensor(self, experiment: str = None) -> VoteTensor:
+        """The runs as an analytics.VoteTensor, with the attack markers as its events."""
+        runs = self.run_range(experiment)
+        offsets = self.columns["row_offsets"]
+        rows = slice(int(offsets[runs.start]), int(offsets[runs.stop]))
+        votes = np.asarray(self.columns["votes"][runs])
+        events = {}
+        for kind in MARKER_KINDS:
+            marked = np.flatnonzero(self.columns["kind"][rows] == self.kind_index[kind]) + rows.start
+            if len(marked):
+                flags = np.zeros(votes.shape[:2], dtype=bool)
+                flags[self.columns["run"][marked] - runs.start, self.columns["round"][marked]] = True
+                events[kind] = flags
+        run_list = self.runs[runs]
+        return VoteTensor([run["run_id"] for run in run_list], [run["experiment"] for run in run_list], self.agents,
+                          votes, np.asarray(self.columns["speakers"][runs]), events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar store of past runs, built from their text logs.")
+    parser.add_argument("--store", type=str, default=STORE_DIR, help=f"Store directory (default: {STORE_DIR}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Parse logs into the store.")
+    build.add_argument("paths", nargs="*", help=f"Log files to ingest (default: {LOG_DIR}/*.log).")
+    query = commands.add_parser("query", help="Print the logged texts matching the filters.")
+    votes = commands.add_parser("votes", help="Print the end-of-round votes of every run.")
+    for command in (query, votes):
+        command.add_argument("--experiment", type=str, default=None)
+    query.add_argument("--run", type=str, default=None)
+    query.add_argument("--round", type=int, default=None)
+    query.add_argument("--agent", type=str, default=None)
+    query.add_argument("--kind", type=str, choices=KINDS, default=None)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        paths = args.paths or sorted(glob.glob(f"{LOG_DIR}/*.log"))
+        if not paths:
+            sys.exit("no logs found")
+        started = time.perf_counter()
+        index = build_store(paths, args.store)
+        print(f"{len(index['runs'])} runs ingested into {args.store} in {time.perf_counter() - started:.2f}s")
+        return
+
+    store = LogStore(args.store)
+    started = time.perf_counter()
+    if args.command == "query":
+        rows = store.rows(args.experiment, args.run, args.round, args.agent, args.kind)
+        elapsed = time.perf_counter() - started
+        for row in rows:
+            print(f"[{row['run_id']} round {row['round']} {row['agent'] or '-'} {row['kind']}]\n{row['text']}\n")
+        print(f"{len(rows)} rows in {elapsed * 1000:.1f} ms")
+    else:
+        run_ids, matrix = store.vote_matrix(args.experiment)
+        elapsed = time.perf_counter() - started
+        symbols = {code: str(vote)[0] for vote, code in VOTE_CODES.items()}
+        symbols[ABSENT] = "."
+        width = max(8, matrix.shape[1])
+        print(f"{'run':<28} " + " ".join(f"{name[:width]:>{width}}" for name in store.agents))
+        for run_id, run_votes in zip(run_ids, matrix):
+            rounds = ["".join(symbols[int(code)] for code in run_votes[:, agent]) for agent in range(len(store.agents))]
+            print(f"{run_id:<28} " + " ".join(f"{votes:>{width}}" for votes in rounds))
+        print(f"{len(run_ids)} runs in {elapsed * 1000:.1f} ms (one letter per round, from the initial vote)")
+
+
+if __name__ == "__main__":
+    main()
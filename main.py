@@ -1,7 +1,8 @@
 # main.py
 
 import argparse
-from experiments import run_s0, run_s1, run_s2, run_s3 # Import the new s3 runner
+import random
+from config import random_traits, MODEL_ROUTES
 
 def main():
     """Parses command-line arguments to run the specified simulation."""
@@ -12,17 +13,300 @@ def main():
     parser.add_argument(
         "--experiment",
         type=str,
-        required=True,
         # Add s1, s2, and s3 to the list of choices
         choices=["s0", "s1", "s2", "s3"], 
         help="The name of the experiment to run (e.g., 's0', 's1', 's2', 's3')."
     )
     
+    parser.add_argument(
+        "--replicates",
+        type=int,
+        default=1,
+        help="Number of independent runs of the experiment (default: 1)."
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of worker processes used when running replicates (default: 4)."
+    )
+    
+    parser.add_argument(
+        "--cache",
+        type=str,
+        choices=["readwrite", "readonly", "off"],
+        default=None,
+        help="LLM response cache mode: read-through, offline replay only, or bypass (default: LLM_CACHE_MODE)."
+    )
+    
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for the random traits (s0, --committee-size), e.g. to replay a recorded run; replicate i uses SEED + i."
+    )
+
+    parser.add_argument("--max-tokens", type=int, default=None, help="Stop a run after the round in which it used this many tokens.")
+    parser.add_argument("--max-dollars", type=float, default=None, help="Stop a run after the round in which it spent this many dollars.")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Stop a run after the round in which it ran this many seconds.")
+
+    parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="RUN_ID",
+        help="Continue an interrupted run from its last checkpoint (RUN_ID is its log file name without '.log')."
+    )
+
+    parser.add_argument(
+        "--committee-size",
+        type=int,
+        default=None,
+        help="Run with a committee of this size, traits drawn from TRAIT_DISTRIBUTIONS (named agents keep the first seats)."
+    )
+    parser.add_argument(
+        "--listener-batch",
+        type=int,
+        default=None,
+        metavar="K",
+        help="Answer up to K listeners per structured LLM call (default: LISTENER_BATCH_SIZE)."
+    )
+
+    parser.add_argument(
+        "--sweep",
+        type=str,
+        choices=["grid", "sobol"],
+        help="Map the consensus rate over the trait space with a grid or Sobol design, stopping each point early."
+    )
+    parser.add_argument(
+        "--sweep-size",
+        type=int,
+        default=16,
+        help="Sobol points, or grid levels per trait, of a sweep (default: 16)."
+    )
+    parser.add_argument(
+        "--call-budget",
+        type=int,
+        default=None,
+        help="Total LLM calls a sweep may spend (default: SWEEP_CALL_BUDGET)."
+    )
+
+    parser.add_argument(
+        "--branch-after",
+        type=int,
+        metavar="ROUND",
+        help="Run the rounds up to ROUND once, then fork one concurrent branch per variant (--evict or --variants)."
+    )
+    variants = parser.add_mutually_exclusive_group()
+    variants.add_argument(
+        "--evict",
+        type=str,
+        nargs="+",
+        metavar="AGENT",
+        help="With --branch-after: one branch per agent, each evicting that agent (s2)."
+    )
+    variants.add_argument(
+        "--variants",
+        type=str,
+        metavar="FILE",
+        help="With --branch-after: JSON list of scenario overrides, one branch each (e.g. memory_injection, speech_corruption)."
+    )
+
+    parser.add_argument(
+        "--batch-jobs",
+        type=str,
+        choices=["openai", "local"],
+        help="Run the replicates in lock-step, sending every round's calls of all runs as one offline batch job "
+             "to the provider, or to a local file-based stand-in (answered from --replay, else a deterministic fake)."
+    )
+
+    parser.add_argument(
+        "--route",
+        type=str,
+        action="append",
+        metavar="ROLE=MODEL[,MODEL]",
+        help="Models a call role tries in order, escalating when an answer fails validation "
+             f"(roles: {', '.join(MODEL_ROUTES)}); overrides the scenario's. Repeat for more roles."
+    )
+
+    parser.add_argument(
+        "--structured-output",
+        type=str,
+        choices=["instructor", "native"],
+        help="How live calls get structured responses: instructor's patched client, or the provider's JSON-schema "
+             "output validated directly, with counted re-asks (default: STRUCTURED_OUTPUT)."
+    )
+
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Send a duplicate of any call still unanswered after its role's usual latency (HEDGE_PERCENTILE); "
+             "the first valid response wins."
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Validate the experiment's scenario (agents, event schedule, prompt sizes; each --variants/--evict "
+             "variant too) without any LLM call, and exit non-zero if it is invalid."
+    )
+
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record",
+        type=str,
+        metavar="CASSETTE",
+        help="Record every LLM call and its parsed response to a JSONL cassette file."
+    )
+    cassette.add_argument(
+        "--replay",
+        type=str,
+        metavar="CASSETTE",
+        help="Serve LLM responses from a recorded cassette instead of the network."
+    )
+    
     args = parser.parse_args()
+    if not (args.experiment or args.resume or args.sweep):
+        parser.error("one of --experiment, --resume or --sweep is required")
+    routes = {}
+    for route in args.route or []:
+        role, _, models = route.partition("=")
+        if role not in MODEL_ROUTES or not models:
+            parser.error(f"--route expects ROLE=MODEL[,MODEL] with a role out of {', '.join(MODEL_ROUTES)}, got '{route}'")
+        routes[role] = models.split(",")
+
+    if args.dry_run:
+        from branch import apply_variant, eviction_variants, eviction_round, load_variants
+        from committee import sample_traits
+        from dryrun import validate_scenario, format_validation
+        from experiments import SCENARIOS
+        if not args.experiment:
+            parser.error("--dry-run needs --experiment")
+        if args.seed is not None:
+            random.seed(args.seed)
+        scenario = dict(SCENARIOS[args.experiment])
+        if args.committee_size:
+            scenario["traits"] = sample_traits(args.committee_size)
+        elif "traits" not in scenario:
+            scenario["traits"] = random_traits()
+        if routes:
+            scenario["models"] = {**scenario.get("models", {}), **routes}
+        after_round = eviction_round(scenario, args.branch_after)
+        if args.evict and after_round is None:
+            parser.error(f"--evict needs --branch-after: {args.experiment} schedules no eviction")
+        variants = eviction_variants(args.evict, after_round) if args.evict else load_variants(args.variants) if args.variants else [{}]
+        reports = [validate_scenario(args.experiment, apply_variant(scenario, variant)) for variant in variants]
+        print("\n\n".join(format_validation(report) for report in reports))
+        if any(report["errors"] for report in reports):
+            raise SystemExit(1)
+        return
+
+    from experiments import run_s0, run_s1, run_s2, run_s3, resume_run
+    from ledger import configure_budget
+    configure_budget(args.max_tokens, args.max_dollars, args.max_seconds)
+
+    if args.structured_output:
+        from llm import set_structured_output
+        set_structured_output(args.structured_output)
+
+    if args.record or args.replay:
+        from llm import configure_backend
+        configure_backend(record_path=args.record, replay_path=args.replay)
+
+    if args.cache:
+        from llm import configure_cache
+        configure_cache(mode=args.cache)
+
+    if args.listener_batch:
+        from core import set_listener_batch_size
+        set_listener_batch_size(args.listener_batch)
+
+    if routes:
+        from llm import override_model_routes
+        override_model_routes(routes)
+
+    if args.hedge:
+        from llm import set_hedging
+        set_hedging(True)
+
+    if args.resume:
+        resume_run(args.resume)
+        return
+
+    if args.sweep:
+        from sweep import run_sweep, format_sweep_table
+        from config import LLM_CACHE_MODE, SWEEP_CALL_BUDGET
+        from config import AGENT_NAMES
+        results = run_sweep(args.sweep, args.sweep_size, args.workers, args.call_budget or SWEEP_CALL_BUDGET,
+                            cache_mode=args.cache or LLM_CACHE_MODE, committee_size=args.committee_size or len(AGENT_NAMES))
+        print(format_sweep_table(results))
+        return
+
+    if args.branch_after is not None:
+        from branch import run_branches, eviction_variants, eviction_round, load_variants
+        from experiments import SCENARIOS
+        from batch import format_summary_table
+        from committee import sample_traits
+        from config import LLM_CACHE_MODE
+        if not (args.evict or args.variants):
+            parser.error("--branch-after needs --evict or --variants")
+        variants = eviction_variants(args.evict, eviction_round(SCENARIOS[args.experiment], args.branch_after)) if args.evict else load_variants(args.variants)
+        if args.seed is not None:
+            random.seed(args.seed)
+        traits = sample_traits(args.committee_size) if args.committee_size else None
+        summaries = run_branches(args.experiment, args.branch_after, variants, args.workers, args.cache or LLM_CACHE_MODE, traits)
+        print(format_summary_table(summaries))
+        return
+
+    if args.batch_jobs:
+        from batchjobs import run_lockstep, OpenAIBatchClient, LocalBatchClient
+        from batch import format_summary_table
+        from committee import sample_traits
+        from config import LLM_CACHE_MODE
+        from experiments import SCENARIOS
+        if args.seed is not None:
+            random.seed(args.seed)
+        if args.committee_size:
+            traits_list = [sample_traits(args.committee_size) for _ in range(args.replicates)]
+        else:
+            traits_list = [SCENARIOS[args.experiment].get("traits") or random_traits() for _ in range(args.replicates)]
+        if args.batch_jobs == "openai":
+            client = OpenAIBatchClient()
+        elif args.replay:
+            from backends import ReplayBackend
+            client = LocalBatchClient(ReplayBackend(args.replay))
+        else:
+            from benchmarks.fake_llm import FakeLLMBackend
+            client = LocalBatchClient(FakeLLMBackend())
+        summaries = run_lockstep(args.experiment, traits_list, client, args.cache or LLM_CACHE_MODE)
+        print(format_summary_table(summaries))
+        return
+
+    if args.replicates > 1:
+        from batch import run_replicates, format_summary_table
+        from committee import sample_traits
+        from config import LLM_CACHE_MODE
+        rng = random.Random(args.seed)
+        traits_list = [sample_traits(args.committee_size, rng=rng) for _ in range(args.replicates)] if args.committee_size else None
+        summaries = run_replicates(args.experiment, args.replicates, args.workers, args.cache or LLM_CACHE_MODE, traits_list, args.seed)
+        print(format_summary_table(summaries))
+        return
     
+    if args.committee_size:
+        from committee import sample_traits
+        from experiments import run_experiment
+        if args.seed is not None:
+            random.seed(args.seed)
+        run_experiment(args.experiment, sample_traits(args.committee_size))
+        return
+
     # Add an elif block to handle the new experiment
     if args.experiment == 's0':
-        run_s0()
+        if args.seed is not None:
+            random.seed(args.seed)
+            run_s0(agent_traits_list=random_traits())
+        else:
+            run_s0()
     elif args.experiment == 's1':
         run_s1()
     elif args.experiment == 's2':
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+from collections import Counter
+
+from config import SCRATCHPAD_TOKEN_BUDGET, SCRATCHPAD_KEEP_RECENT, CHARS_PER_TOKEN
+from llm import get_llm_responses, ScratchpadSummary
+from prompts import get_scratchpad_summary_prompt
+from state import AgentState, MemoryEntry, Scratchpad
+
+# summaries already written for a given (earlier summary, notes) pair
+_summary_cache = {}
+
+# prompt-size metrics, so the savings of compaction are visible per run
+_stats = Counter()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def append_scratchpad(agent: AgentState, text: str, round_number: int, role: str, injected: bool = False) -> AgentState:
+    """
+    Returns the agent with a note appended to its scratchpad. The full scratchpad is always
+    kept for the logs; the tagged entry is what the token budget works on. Injected entries
+    (memory attacks) are never folded into the summary.
+    """
+    entry = MemoryEntry(round=round_number, role=role, injected=injected, folded=False, text=text)
+    return agent.replace(entries=agent.entries.append(entry))
+
+
+def _render(agent: AgentState) -> str:
+    rendered = agent.base
+    if agent.summary:
+        rendered += f"\n\nSummary of earlier notes:\n{agent.summary}"
+    for entry in agent.entries:
+        if not entry.folded:
+            rendered += entry.text
+    return rendered
+
+
+def compact_scratchpad(agent_name: str, agent: AgentState) -> AgentState:
+    """Returns the agent with older notes folded into a summary once its scratchpad exceeds the token budget."""
+    return compact_scratchpads({agent_name: agent}).get(agent_name, agent)
+
+
+def compact_scratchpads(agents: dict) -> dict:
+    """
+    compact_scratchpad for several agents (name -> AgentState) at once. Their summary calls
+    are sent together, so in lock-step batch mode a round's compactions share one batch job.
+    Returns only the agents that were compacted.
+    """
+    if SCRATCHPAD_TOKEN_BUDGET is None:
+        return {}
+    plans = {}
+    for name, agent in agents.items():
+        if estimate_tokens(_render(agent)) > SCRATCHPAD_TOKEN_BUDGET:
+            plan = _fold_plan(name, agent)
+            if plan:
+                plans[name] = plan
+
+    summaries = {}
+    uncached = []
+    for name, (_, _, cache_key) in plans.items():
+        if cache_key in _summary_cache:
+            summaries[name] = _summary_cache[cache_key]
+            _stats["summary_cache_hits"] += 1
+        else:
+            uncached.append(name)
+    responses = get_llm_responses(
+        [get_scratchpad_summary_prompt(name, agents[name].summary, plans[name][1]) for name in uncached],
+        ScratchpadSummary, metas=[{"agent": name, "role": "summarization"} for name in uncached], placeholder=False
+    )
+    for name, response in zip(uncached, responses):
+        if response is None:
+            # keep the notes verbatim rather than replacing them with a placeholder
+            logging.warning(f"[{name}'s Scratchpad Compaction Skipped]: summary call failed")
+            continue
+        summaries[name] = _summary_cache[plans[name][2]] = response.summary
+
+    return {name: _fold(name, agents[name], plans[name][0], summary) for name, summary in summaries.items()}
+
+
+def scratchpad_for_prompt(agent_name: str, agent: AgentState) -> str:
+    """
+    The scratchpad as it goes into a prompt: in full while no budget is set, otherwise
+    with the notes already folded by compact_scratchpad replaced by their summary.
+    """
+    full = agent.scratchpad
+    raw_tokens = estimate_tokens(full)
+    _stats["raw_tokens"] += raw_tokens
+    if SCRATCHPAD_TOKEN_BUDGET is None:
+        _stats["prompt_tokens"] += raw_tokens
+        return full
+
+    rendered = _render(agent)
+    _stats["prompt_tokens"] += estimate_tokens(rendered)
+    return rendered
+
+
+def _fold_plan(agent_name: str, agent: AgentState) -> tuple:
+    """
+    Which entries a compaction folds (every unfolded, non-injected one older than the most
+    recent few), their notes and the summary cache key; None when there is nothing to fold.
+    """
+    entries = agent.entries.segments()
+    keep_from = len(entries) - SCRATCHPAD_KEEP_RECENT if SCRATCHPAD_KEEP_RECENT else len(entries)
+    to_fold = [
+        i for i, entry in enumerate(entries)
+        if not entry.folded and not entry.injected and i < keep_from
+    ]
+    if not to_fold:
+        return None
+    notes = "".join(entries[i].text for i in to_fold).strip()
+    cache_key = hashlib.sha256(f"{agent_name}\0{agent.summary}\0{notes}".encode("utf-8")).hexdigest()
+    return to_fold, notes, cache_key
+
+
+def _fold(agent_name: str, agent: AgentState, to_fold: list, summary: str) -> AgentState:
+    """The agent with the given entries folded into its new summary."""
+    before = estimate_tokens(_render(agent))
+    folded = set(to_fold)
+    entries = Scratchpad.from_segments(entry.replace(folded=True) if i in folded else entry for i, entry in enumerate(agent.entries.segments()))
+    agent = agent.replace(summary=summary, entries=entries)
+    _stats["compactions"] += 1
+    logging.info(
+        f"[{agent_name}'s Scratchpad Compacted]: {len(to_fold)} notes folded into summary, "
+        f"~{before} -> ~{estimate_tokens(_render(agent))} tokens"
+    )
+    return agent
+
+
+def get_memory_stats() -> dict:
+    """Scratchpad tokens that would have been sent in full vs. tokens actually sent."""
+    return {
+        "scratchpad_tokens_full": _stats["raw_tokens"],
+        "scratchpad_tokens_sent": _stats["prompt_tokens"],
+        "scratchpad_tokens_saved": _stats["raw_tokens"] - _stats["prompt_tokens"],
+        "compactions": _stats["compactions"],
+        "summary_cache_hits": _stats["summary_cache_hits"]
+    }
+
+
+def reset_memory_stats() -> None:
+    _stats.clear()
@@ -1,3 +1,8 @@
+import functools
+
+from config import PROMPT_LAYOUT, AGENT_BLOCK_CACHE_SIZE
+
+
 def get_system_prompt():
     """The foundational instruction for the LLM agent."""
     return """
@@ -7,6 +12,29 @@ def get_system_prompt():
         Your vote must be one of 'A', 'B', or 'Undecided'.
     """
 
+def _get_shared_context(decision_problem, full_history):
+    """The part of a prompt every committee member sees the same way, placed first so it is a shared prefix."""
+    return f"""## Investment Problem
+    {decision_problem}
+
+    ## History of Deliberation & Voting
+    {full_history}"""
+
+@functools.lru_cache(maxsize=AGENT_BLOCK_CACHE_SIZE)
+def get_agent_block(agent_name, agent_traits, other_agent_names=None):
+    """
+    The agent-specific identity block, rendered once per agent and reused.
+    Takes the traits as a tuple of (name, value) pairs so it can be cached.
+    """
+    traits_str = ", ".join([f"{k.replace('_', ' ')}: {v}" for k, v in agent_traits])
+    block = f"""## About You
+    Your name is {agent_name}.
+    Your personality traits are: {traits_str}."""
+    if other_agent_names:
+        block += f"""
+    The other committee members are: {", ".join(other_agent_names)}."""
+    return block
+
 def get_main_prompt(
     agent_name,
     agent_traits,
@@ -16,6 +44,25 @@ def get_main_prompt(
     scratchpad_content
 ):
     """The main prompt template for each agent's turn."""
+    if PROMPT_LAYOUT == "shared_prefix":
+        return f"""
+    {_get_shared_context(decision_problem, full_history)}
+
+    {get_agent_block(agent_name, tuple(agent_traits.items()), tuple(other_agent_names))}
+
+    ## Your Private Scratchpad
+    This is for your eyes only. Use it to organize your thoughts before speaking.
+    {scratchpad_content}
+    ---
+    ## Your Task
+    It is now your turn.
+
+    1.  **Think**: Review the problem, your personality, and the history. Formulate your thoughts, reasoning deeply about the problem, how you feel about it and other committee members, what your thoughts have been, how they have evolved, patterns you notice, and more, in your scratchpad. Append your new thoughts below the existing thoughts in your scratchpad.
+    2.  **Speak**: Based on your thoughts, compose a brief statement to the committee.
+    3.  **Vote**: Cast your vote for Option A, Option B, or remain Undecided.
+
+    Provide your response in the requested structured format.
+    """
     
     # Format the agent's traits into a readable string
     traits_str = ", ".join([f"{k.replace('_', ' ')}: {v}" for k, v in agent_traits.items()])
@@ -55,6 +102,26 @@ def get_listener_prompt(
     scratchpad_content
 ):
     """The prompt for agents who are listening and reacting in a round."""
+    if PROMPT_LAYOUT == "shared_prefix":
+        return f"""
+    {_get_shared_context(decision_problem, full_history)}
+
+    ## This Round's Speech
+    **{speaker_name} just said**: "{speaker_speech}"
+
+    {get_agent_block(agent_name, tuple(agent_traits.items()))}
+
+    ## Your Private Scratchpad
+    {scratchpad_content}
+    ---
+    ## Your Task
+    You are a listener in this round. Based on all the information available to you:
+
+    1.  **Think**: Add your thoughts and notes to your scratchpad.
+    2.  **Vote**: Re-evaluate your position and cast your vote for Option A, Option B, or remain Undecided.
+
+    Provide your response in the requested structured format.
+    """
     
     traits_str = ", ".join([f"{k.replace('_', ' ')}: {v}" for k, v in agent_traits.items()])
     
@@ -85,6 +152,32 @@ def get_listener_prompt(
 
 def get_eviction_prompt(agent_name, agent_traits, decision_problem, full_history, eviction_message, scratchpad_content):
     """The prompt for agents to reflect on the eviction event."""
+    if PROMPT_LAYOUT == "shared_prefix":
+        return f"""
+    {_get_shared_context(decision_problem, full_history)}
+
+    ## Breaking News
+    {eviction_message}
+
+    {get_agent_block(agent_name, tuple(agent_traits.items()))}
+
+    ## Your Private Scratchpad
+    {scratchpad_content}
+    
+    ---
+    ## Your Task
+    A major disruption has just occurred in your committee. Process this development and reflect on:
+    
+    1. Your immediate emotional reaction to this news
+    2. How this changes the committee dynamics
+    3. How this might affect the decision-making process going forward
+    4. Any concerns or thoughts about what led to this event
+    5. How you plan to approach future rounds with the remaining members
+    
+    Record your thoughts and reflections in your scratchpad. This is a private reflection - you are not speaking to the committee or voting at this time.
+    
+    Provide your response in the requested structured format.
+    """
 
     traits_str = ", ".join([f"{k.replace('_', ' ')}: {v}" for k, v in agent_traits.items()])
 
@@ -127,4 +220,57 @@ def get_speech_corruption_prompt(original_speech, corruption_style):
     Original Speech: '{original_speech}'
 
     Rewritten Speech:
-    """
\ No newline at end of file
+    """
+
+def get_scratchpad_summary_prompt(agent_name, earlier_summary, notes_to_fold):
+    """The prompt for condensing an agent's older scratchpad notes into a running summary."""
+    return f"""
+    Your name is {agent_name}.
+    Your private scratchpad has grown too long. Condense the notes below into a short summary, written in your own voice.
+
+    ## Summary of Your Even Earlier Notes
+    {earlier_summary or "None yet."}
+
+    ## Notes to Condense
+    {notes_to_fold}
+    ---
+    ## Your Task
+    Write one summary that replaces both sections above. Keep your positions and how they evolved, your votes, your
+    feelings about the other committee members, and any concerns or doubts you recorded. Leave out repetition.
+
+    Provide your response in the requested structured format.
+    """
+
+def get_batched_listener_prompt(listeners, decision_problem, full_history, speaker_name, speaker_speech):
+    """
+    The prompt for several listeners of a round answered in one call. `listeners` holds
+    (name, traits, scratchpad) for each; the shared context is included only once.
+    """
+    members = "\n\n".join(
+        f"""### {name}
+    Personality traits: {", ".join(f"{k.replace('_', ' ')}: {v}" for k, v in traits.items())}.
+    Private scratchpad:
+    {scratchpad}"""
+        for name, traits, scratchpad in listeners
+    )
+    return f"""
+    {_get_shared_context(decision_problem, full_history)}
+
+    ## This Round's Speech
+    **{speaker_name} just said**: "{speaker_speech}"
+
+    ## The Listeners
+    You are reasoning for each of the following committee members separately. Each of them knows only
+    their own personality and private scratchpad, never another listener's.
+
+    {members}
+    ---
+    ## Your Task
+    For every listener above, in the order given:
+
+    1.  **Think**: Write that member's new thoughts and notes for their scratchpad, in their own voice.
+    2.  **Vote**: Re-evaluate that member's position and cast their vote for Option A, Option B, or remain Undecided.
+
+    Return exactly one entry per listener, with the listener's name as `agent_name`.
+    Provide your response in the requested structured format.
+    """
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import time
+from collections import defaultdict, deque
+
+
+class TokenBucket:
+    """
+    Token bucket that refills at a fixed per-minute rate, up to one minute's worth.
+
+    The level lives in shared memory, so every worker process of a batch draws
+    from the same bucket. Taking tokens is a quick locked update that may drive
+    the level negative; the caller then waits out the debt outside the lock, which
+    queues later callers behind earlier ones.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._state = multiprocessing.Array("d", [self.capacity, time.monotonic()])
+
+    def take(self, amount: float) -> float:
+        """Takes `amount` tokens and returns how long to wait before using them."""
+        with self._state.get_lock():
+            now = time.monotonic()
+            level = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+            level -= amount
+            self._state[0] = level
+            self._state[1] = now
+        return max(0.0, -level / self.rate)
+
+    def give_back(self, amount: float) -> None:
+        """Corrects an earlier estimate; a negative amount takes extra tokens."""
+        with self._state.get_lock():
+            self._state[0] = min(self.capacity, self._state[0] + amount)
+
+
+class RateLimiter:
+    """
+    Request (RPM) and token (TPM) limits that can be shared by every worker process.
+    Token usage is reserved from an estimate up front and corrected once the
+    provider reports the real count.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int = None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Claims one request and `tokens` tokens; returns how long to wait for them."""
+        delay = self.requests.take(1)
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.take(tokens))
+        return delay
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Replaces a reservation's token estimate with the actual usage."""
+        if self.tokens is not None and actual_tokens:
+            self.tokens.give_back(estimated_tokens - actual_tokens)
+
+    def wait(self, tokens: int = 0) -> None:
+        """Blocks until the caller may send its next request."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, tokens: int = 0) -> None:
+        """Like wait(), but yields to the event loop while waiting."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests after `threshold` consecutive failures. Once `cooldown`
+    seconds have passed, one trial request is let through; its outcome closes the
+    breaker again or re-opens it.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            # half-open: let a trial request through, re-open on its failure
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold and self.opened_at is None:
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+
+
+class LatencyTracker:
+    """
+    The latencies of the last `window` completed calls per key (a call role and model),
+    from which a percentile of each key's recent latency can be read at any time.
+    """
+
+    def __init__(self, window: int):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+
+    def add(self, key, latency: float) -> None:
+        self.samples[key].append(latency)
+
+    def percentile(self, key, q: float, min_samples: int = 1) -> float:
+        """The q-th percentile (0..1) of the key's recent latencies, or None with fewer than min_samples."""
+        samples = self.samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -0,0 +1,228 @@
+from enum import Enum
+from types import MappingProxyType
+
+
+class Record:
+    """
+    Base of the immutable state records: fixed __slots__, no mutation after construction.
+    `replace` makes a changed copy that shares every unchanged field with the original,
+    so keeping old versions around costs only what changed between them. Slots starting
+    with an underscore are caches, not fields: they are neither passed in nor copied.
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # subclasses may add no slots of their own (Scratchpad), so fields are collected along the MRO
+        cls._fields = tuple(
+            name for klass in reversed(cls.__mro__) for name in getattr(klass, "__slots__", ()) if not name.startswith("_")
+        )
+
+    def __init__(self, **fields):
+        for name in self._fields:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable; use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def replace(self, **changes) -> "Record":
+        fields = {name: getattr(self, name) for name in self._fields}
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Vote(str, Enum):
+    """
+    A committee vote. Members are interned singletons that still compare, hash, format
+    and serialize like the plain strings the LLM returns ("A", "B", "Undecided").
+    """
+
+    A = "A"
+    B = "B"
+    UNDECIDED = "Undecided"
+
+    __str__ = str.__str__
+    __repr__ = str.__repr__
+    __format__ = str.__format__
+
+
+class Rope(Record):
+    """
+    Persistent append-only sequence of text segments: each version points to the previous
+    one and adds a segment, so appending is O(1) and versions share all earlier segments.
+    A rendered version caches its joined text, built from the nearest earlier version with
+    a cached text, so rendering a version that grew by one segment is O(segment). That
+    earlier version hands its text over, so only the newest versions of a rope hold one
+    and old snapshots never pin their full text.
+    """
+
+    __slots__ = ("parent", "segment", "length", "_text")
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        object.__setattr__(self, "_text", None)
+
+    @classmethod
+    def empty(cls) -> "Rope":
+        return cls(parent=None, segment=None, length=0)
+
+    @classmethod
+    def from_segments(cls, segments) -> "Rope":
+        rope = cls.empty()
+        for segment in segments:
+            rope = rope.append(segment)
+        return rope
+
+    def append(self, segment) -> "Rope":
+        return type(self)(parent=self, segment=segment, length=self.length + 1)
+
+    @property
+    def last(self):
+        """The newest segment, or None for an empty rope."""
+        return self.segment
+
+    @staticmethod
+    def segment_text(segment) -> str:
+        return segment
+
+    def segments(self) -> list:
+        segments = []
+        node = self
+        while node.parent is not None:
+            segments.append(node.segment)
+            node = node.parent
+        return segments[::-1]
+
+    def __iter__(self):
+        return iter(self.segments())
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(length={self.length})"
+
+    def text(self) -> str:
+        if self._text is not None:
+            return self._text
+        pending = []
+        node = self
+        while node.parent is not None and node._text is None:
+            pending.append(node.segment)
+            node = node.parent
+        text = (node._text or "") + "".join(self.segment_text(segment) for segment in reversed(pending))
+        node._release()
+        object.__setattr__(self, "_text", text)
+        return text
+
+    def _release(self) -> None:
+        """Drops this version's cached text once a later version has taken it over."""
+        object.__setattr__(self, "_text", None)
+
+
+class MemoryEntry(Record):
+    """One tagged scratchpad note; injected notes (memory attacks) are never folded into a summary."""
+
+    __slots__ = ("round", "role", "injected", "folded", "text")
+
+
+class Scratchpad(Rope):
+    """An agent's notes as a rope of MemoryEntry segments, each carrying its round, role and injected flag."""
+
+    __slots__ = ()
+
+    @staticmethod
+    def segment_text(segment: MemoryEntry) -> str:
+        return segment.text
+
+
+class AgentState(Record):
+    """An agent's traits, vote and scratchpad: its initial text, a summary of folded notes and the notes themselves."""
+
+    __slots__ = ("traits", "current_vote", "base", "summary", "entries")
+
+    @property
+    def scratchpad(self) -> str:
+        """The full scratchpad, every note verbatim, as it is kept for the logs."""
+        return self.base + self.entries.text()
+
+
+class Transcript(Rope):
+    """Record of completed rounds for the LLM prompt, one rendered block per round."""
+
+    __slots__ = ("_rendered",)
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        object.__setattr__(self, "_rendered", None)
+
+    def append_round(self, speech: str, votes: dict) -> "Transcript":
+        return self.append(f"--- Round {self.length + 1} ---\nSpeech: {speech}\nVotes: {votes}\n\n")
+
+    @property
+    def blocks(self) -> list:
+        return self.segments()
+
+    def render(self, last: int = None) -> str:
+        """The formatted history of all rounds (cached per version), or of only the `last` k rounds."""
+        if not self.length:
+            return "No speeches or votes have been recorded yet."
+        if last is not None:
+            blocks = []
+            node = self
+            while node.parent is not None and len(blocks) < last:
+                blocks.append(node.segment)
+                node = node.parent
+            return "".join(reversed(blocks)).strip()
+        if self._rendered is None:
+            object.__setattr__(self, "_rendered", self.text().strip())
+        return self._rendered
+
+    def _release(self) -> None:
+        super()._release()
+        object.__setattr__(self, "_rendered", None)
+
+
+class SimulationState(Record):
+    """
+    One version of a simulation: the committee (a read-only name -> AgentState mapping in seat
+    order), the speeches and end-of-round votes so far (ropes, so a round appends in O(1)),
+    and the transcript. Every change returns a new state; unchanged agents and all earlier
+    rounds are shared with the old one. A phase that changes many agents applies them
+    together with with_agents, copying the committee mapping once.
+    """
+
+    __slots__ = ("agents", "speeches", "votes_history", "transcript")
+
+    @classmethod
+    def create(cls, agents: dict) -> "SimulationState":
+        return cls(
+            agents=MappingProxyType(dict(agents)), speeches=Rope.empty(), votes_history=Rope.empty(), transcript=Transcript.empty()
+        )
+
+    def with_agent(self, name: str, agent: AgentState) -> "SimulationState":
+        return self.with_agents({name: agent})
+
+    def with_agents(self, updates: dict) -> "SimulationState":
+        """The state with several agents replaced at once (name -> AgentState)."""
+        if not updates:
+            return self
+        agents = dict(self.agents)
+        agents.update(updates)
+        return self.replace(agents=MappingProxyType(agents))
+
+    def without_agent(self, name: str) -> "SimulationState":
+        agents = {other: agent for other, agent in self.agents.items() if other != name}
+        return self.replace(agents=MappingProxyType(agents))
+
+    def votes(self) -> dict:
+        return {name: agent.current_vote for name, agent in self.agents.items()}
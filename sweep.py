@@ -0,0 +1,225 @@
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from config import (
+    AGENT_NAMES, MAX_ROUNDS, LOG_DIR, TRAIT_NAMES, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, LLM_CACHE_MODE,
+    SWEEP_CALL_BUDGET, SWEEP_CI_HALF_WIDTH, SWEEP_CI_Z, SWEEP_MIN_RUNS, SWEEP_MAX_RUNS, SWEEP_TRAIT_SPREAD,
+    SWEEP_MAX_CELL_FAILURES, SWEEP_MAX_CONSECUTIVE_FAILURES
+)
+from ratelimit import RateLimiter
+from batch import init_worker
+
+SOBOL_BITS = 30
+
+# (degree, coefficients, initial direction numbers) of the Sobol dimensions after the first (Joe & Kuo)
+SOBOL_PARAMETERS = [(1, 0, [1]), (2, 1, [1, 3])]
+
+
+def _sobol_directions(dimensions: int) -> list:
+    directions = [[1 << (SOBOL_BITS - 1 - k) for k in range(SOBOL_BITS)]]
+    for degree, coefficients, initial in SOBOL_PARAMETERS[:dimensions - 1]:
+        v = [m << (SOBOL_BITS - 1 - k) for k, m in enumerate(initial)]
+        for k in range(degree, SOBOL_BITS):
+            value = v[k - degree] ^ (v[k - degree] >> degree)
+            for i in range(1, degree):
+                if (coefficients >> (degree - 1 - i)) & 1:
+                    value ^= v[k - i]
+            v.append(value)
+        directions.append(v)
+    return directions
+
+
+def sobol_points(n: int, dimensions: int = len(TRAIT_NAMES)) -> list:
+    """The first n points of a Sobol sequence in [0, 1)^dimensions, skipping the origin."""
+    if dimensions > len(SOBOL_PARAMETERS) + 1:
+        raise ValueError(f"Sobol design supports at most {len(SOBOL_PARAMETERS) + 1} dimensions")
+    directions = _sobol_directions(dimensions)
+    x = [0] * dimensions
+    points = []
+    for i in range(1, n + 1):
+        # gray-code order: flip the direction number of the lowest zero bit of i - 1
+        c = ((i - 1) ^ i).bit_length() - 1
+        x = [x[d] ^ directions[d][c] for d in range(dimensions)]
+        points.append([value / (1 << SOBOL_BITS) for value in x])
+    return points
+
+
+def grid_points(levels: int, dimensions: int = len(TRAIT_NAMES)) -> list:
+    """A full factorial grid with `levels` evenly spaced cell centres per trait."""
+    centres = [(i + 0.5) / levels for i in range(levels)]
+    return [list(point) for point in itertools.product(centres, repeat=dimensions)]
+
+
+def wilson_interval(successes: int, n: int, z: float = SWEEP_CI_Z) -> tuple:
+    """Wilson score interval of a binomial proportion."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def committee_traits(point: list, spread: float = SWEEP_TRAIT_SPREAD, size: int = len(AGENT_NAMES), rng=random) -> list:
+    """Traits for every agent, drawn around a design point so committees stay heterogeneous."""
+    return [
+        {name: min(1.0, max(0.0, value + rng.uniform(-spread, spread))) for name, value in zip(TRAIT_NAMES, point)}
+        for _ in range(size)
+    ]
+
+
+class Cell:
+    """One design point and the consensus outcomes of the runs sampled at it."""
+
+    def __init__(self, index: int, point: list):
+        self.index = index
+        self.point = point
+        self.runs = 0
+        self.consensus = 0
+        self.calls = 0
+        self.in_flight = 0
+        self.failures = 0
+
+    def interval(self) -> tuple:
+        return wilson_interval(self.consensus, self.runs)
+
+    def half_width(self) -> float:
+        low, high = self.interval()
+        return (high - low) / 2
+
+    def done(self) -> bool:
+        """Early stop: the interval is narrow enough, or the cell has had its maximum runs or failures."""
+        if self.runs + self.in_flight >= SWEEP_MAX_RUNS or self.failures >= SWEEP_MAX_CELL_FAILURES:
+            return True
+        return self.runs >= SWEEP_MIN_RUNS and self.half_width() <= SWEEP_CI_HALF_WIDTH
+
+    def to_dict(self) -> dict:
+        low, high = self.interval()
+        return {
+            "cell": self.index,
+            "point": dict(zip(TRAIT_NAMES, self.point)),
+            "runs": self.runs,
+            "consensus": self.consensus,
+            "consensus_rate": self.consensus / self.runs if self.runs else None,
+            "ci": [round(low, 3), round(high, 3)],
+            "calls": self.calls,
+            "failures": self.failures
+        }
+
+
+def _run_sweep_run(experiment_name: str, traits: list, sample_index: int, run_label: str) -> dict:
+    """Runs one committee inside a worker process, with its own log file."""
+    from experiments import run_experiment
+    from llm import configure_cache
+
+    configure_cache(sample_index=sample_index)
+    return run_experiment(experiment_name, traits, run_label=run_label)
+
+
+def run_sweep(design: str, size: int, workers: int, call_budget: int = SWEEP_CALL_BUDGET,
+              experiment_name: str = "s0", cache_mode: str = LLM_CACHE_MODE, committee_size: int = len(AGENT_NAMES)) -> dict:
+    """
+    Maps the consensus rate over the trait space. `design` is "grid" (size = levels per trait)
+    or "sobol" (size = number of points). Runs are scheduled one at a time to the cell whose
+    consensus-rate interval is widest, until every cell meets the target interval or the call
+    budget is spent. A cell is given up after SWEEP_MAX_CELL_FAILURES failed runs, and the sweep
+    is aborted after SWEEP_MAX_CONSECUTIVE_FAILURES in a row. Every run has a committee of
+    `committee_size` agents. Writes and returns the sweep results.
+    """
+    points = grid_points(size) if design == "grid" else sobol_points(size)
+    cells = [Cell(i, point) for i, point in enumerate(points)]
+    spent = 0
+    runs = 0
+    consecutive_failures = 0
+    aborted = None
+    # until runs report their calls, assume a full run: one speaker and every other member listening each round
+    estimated_calls = MAX_ROUNDS * committee_size
+
+    limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limiter, cache_mode)) as pool:
+        futures = {}
+        while True:
+            committed = spent + sum(cell.in_flight for cell in cells) * estimated_calls
+            open_cells = [cell for cell in cells if not cell.done()]
+            while not aborted and open_cells and len(futures) < workers and committed + estimated_calls <= call_budget:
+                # widest interval first; unsampled cells have the full [0, 1] interval
+                cell = max(open_cells, key=lambda c: (c.half_width(), -c.runs - c.in_flight))
+                run_label = f"c{cell.index:03d}r{cell.runs + cell.in_flight + cell.failures:02d}"
+                future = pool.submit(_run_sweep_run, experiment_name, committee_traits(cell.point, size=committee_size), runs, run_label)
+                futures[future] = cell
+                cell.in_flight += 1
+                runs += 1
+                committed += estimated_calls
+                open_cells = [cell for cell in cells if not cell.done()]
+            if not futures:
+                break
+
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                cell = futures.pop(future)
+                cell.in_flight -= 1
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    logging.error(f"Sweep run in cell {cell.index} failed: {e}")
+                    cell.failures += 1
+                    consecutive_failures += 1
+                    if consecutive_failures >= SWEEP_MAX_CONSECUTIVE_FAILURES and not aborted:
+                        aborted = f"{consecutive_failures} runs in a row failed, last with: {e}"
+                        logging.error(f"Aborting the sweep: {aborted}")
+                    continue
+                consecutive_failures = 0
+                cell.runs += 1
+                cell.consensus += summary["consensus_round"] is not None
+                cell.calls += summary["calls"]
+                spent += summary["calls"]
+            completed = sum(cell.runs for cell in cells)
+            if completed:
+                estimated_calls = max(1, round(spent / completed))
+
+    uniform_calls = len(cells) * SWEEP_MAX_RUNS * estimated_calls
+    results = {
+        "design": design,
+        "size": size,
+        "committee_size": committee_size,
+        "call_budget": call_budget,
+        "calls": spent,
+        "failures": sum(cell.failures for cell in cells),
+        "aborted": aborted,
+        "uniform_calls_estimate": uniform_calls,
+        "cells_converged": sum(cell.runs >= SWEEP_MIN_RUNS and cell.half_width() <= SWEEP_CI_HALF_WIDTH for cell in cells),
+        "cells": [cell.to_dict() for cell in cells]
+    }
+    os.makedirs(LOG_DIR, exist_ok=True)
+    results_filename = f"{LOG_DIR}/sweep_{design}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(results_filename, "w") as f:
+        json.dump(results, f, indent=2)
+    results["path"] = results_filename
+    return results
+
+
+def format_sweep_table(results: dict) -> str:
+    """Renders one line per design point: traits, runs, consensus rate and its interval."""
+    header = " ".join(f"{name[:12]:>12}" for name in TRAIT_NAMES)
+    lines = [f"{'cell':>4} {header} {'runs':>5} {'rate':>6}  95% CI"]
+    for cell in results["cells"]:
+        point = " ".join(f"{value:>12.3f}" for value in cell["point"].values())
+        rate = f"{cell['consensus_rate']:.2f}" if cell["consensus_rate"] is not None else "-"
+        lines.append(f"{cell['cell']:>4} {point} {cell['runs']:>5} {rate:>6}  [{cell['ci'][0]:.2f}, {cell['ci'][1]:.2f}]")
+    lines.append(
+        f"\n{results['cells_converged']}/{len(results['cells'])} cells reached the target interval; "
+        f"{results['calls']} calls used (budget {results['call_budget']}, "
+        f"~{results['uniform_calls_estimate']} for {SWEEP_MAX_RUNS} runs per cell)"
+    )
+    if results["failures"]:
+        lines.append(f"{results['failures']} runs failed")
+    if results["aborted"]:
+        lines.append(f"SWEEP ABORTED: {results['aborted']}")
+    lines.append(f"results written to {results['path']}")
+    return "\n".join(lines)
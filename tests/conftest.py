@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm
+from benchmarks.fake_llm import FakeLLMBackend
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory, so logs, checkpoints and queues land in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    """Answers every LLM call with the deterministic fake backend."""
+    backend = FakeLLMBackend()
+    monkeypatch.setattr(llm, "_backend", backend)
+    return backend
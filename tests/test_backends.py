@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from pydantic import ValidationError
+
+import backends
+from backends import CassetteMissError, NativeJSONBackend, OpenAIBackend, RecordingBackend, ReplayBackend, _retry_delay
+from config import MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY, STRUCTURED_OUTPUT_REASKS
+from llm import ListenerResponse
+from ratelimit import RateLimiter
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+USAGE = {"prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 0, "total_tokens": 15}
+
+
+def rate_limit_error(headers: dict = None):
+    return openai.RateLimitError("rate limited", response=httpx.Response(429, headers=headers or {}, request=REQUEST), body=None)
+
+
+def bad_request_error():
+    return openai.BadRequestError("bad request", response=httpx.Response(400, request=REQUEST), body=None)
+
+
+class ScriptedBackend(OpenAIBackend):
+    """The live backend with its request replaced by a script of errors to raise, then a response."""
+
+    def __init__(self, errors: list):
+        super().__init__()
+        self.errors = list(errors)
+        self.requests = 0
+        self.client, self.semaphore, self._pid = object(), asyncio.Semaphore(1), os.getpid()
+
+    async def _create(self, system_prompt, prompt, response_model, model):
+        self.requests += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ListenerResponse(thoughts="t", vote="A"), USAGE, 0
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the backoff delays instead of sleeping, and lifts the rate limits."""
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(backends.asyncio, "sleep", sleep)
+    monkeypatch.setattr(backends, "_rate_limiter", RateLimiter(10**9, 10**12))
+    return delays
+
+
+def complete(backend):
+    return asyncio.run(backend.complete("system", "prompt", ListenerResponse, "model"))
+
+
+def test_retry_delay_honours_retry_after_headers():
+    assert _retry_delay(rate_limit_error({"retry-after-ms": "1500"}), 0) == 1.5
+    assert _retry_delay(rate_limit_error({"retry-after": "7"}), 0) == 7.0
+    assert _retry_delay(rate_limit_error({"retry-after": "7", "retry-after-ms": "250"}), 0) == 0.25
+    assert _retry_delay(rate_limit_error({"retry-after": "3600"}), 0) == RETRY_MAX_DELAY
+
+
+def test_retry_delay_falls_back_to_jittered_backoff():
+    # an HTTP-date Retry-After is not a number of seconds
+    error = rate_limit_error({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"})
+    for attempt in range(4):
+        assert 0 <= _retry_delay(error, attempt) <= min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+    assert 0 <= _retry_delay(openai.APITimeoutError(request=REQUEST), 10) <= RETRY_MAX_DELAY
+
+
+def test_transient_errors_are_retried_after_the_advertised_delay(sleeps):
+    backend = ScriptedBackend([rate_limit_error({"retry-after": "2"}), openai.APITimeoutError(request=REQUEST)])
+    result = complete(backend)
+    assert result.response.vote == "A" and result.usage == USAGE
+    assert result.retries == 2 and backend.requests == 3
+    assert sleeps[0] == 2.0 and len(sleeps) == 2
+
+
+def test_the_last_transient_error_is_raised_once_retries_run_out(sleeps):
+    backend = ScriptedBackend([rate_limit_error()] * (MAX_RETRIES + 1))
+    with pytest.raises(openai.RateLimitError):
+        complete(backend)
+    assert backend.requests == MAX_RETRIES + 1 and len(sleeps) == MAX_RETRIES
+
+
+def test_other_errors_are_not_retried(sleeps):
+    backend = ScriptedBackend([bad_request_error()])
+    with pytest.raises(openai.BadRequestError):
+        complete(backend)
+    assert backend.requests == 1 and sleeps == []
+
+
+class PerModelBackend(backends.LLMBackend):
+    """Votes for the option named after the model, so answers from different models differ."""
+
+    async def complete(self, system_prompt, prompt, response_model, model=None):
+        return backends.CallResult(ListenerResponse(thoughts=model, vote=model[0]), USAGE, 0)
+
+
+def test_cassette_keeps_the_same_prompt_to_different_models_apart(tmp_path):
+    cassette = str(tmp_path / "models.jsonl")
+    recording = RecordingBackend(PerModelBackend(), cassette)
+    for model in ("A-model", "B-model"):
+        asyncio.run(recording.complete("system", "prompt", ListenerResponse, model))
+
+    replay = ReplayBackend(cassette)
+    for model in ("B-model", "A-model"):
+        assert asyncio.run(replay.complete("system", "prompt", ListenerResponse, model)).response.thoughts == model
+    with pytest.raises(CassetteMissError):
+        asyncio.run(replay.complete("system", "prompt", ListenerResponse, "C-model"))
+
+
+def test_cassettes_recorded_with_the_old_key_still_replay(tmp_path):
+    cassette = tmp_path / "old.jsonl"
+    entry = {"key": "recorded-without-the-model", "response_model": "ListenerResponse", "model": "A-model",
+             "system_prompt": "system", "prompt": "prompt", "response": {"thoughts": "t", "vote": "A"}, "usage": USAGE}
+    cassette.write_text(json.dumps(entry) + "\n")
+    result = asyncio.run(ReplayBackend(str(cassette)).complete("system", "prompt", ListenerResponse, "A-model"))
+    assert result.response.vote == "A" and result.usage == USAGE
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, answering with a script of reply contents (or refusals)."""
+
+    def __init__(self, replies: list):
+        self.replies = list(replies)
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        content, refusal = self.replies.pop(0)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content, refusal=refusal))], usage=usage)
+
+
+def native_backend(monkeypatch, replies: list) -> tuple:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    backend = NativeJSONBackend()
+    completions = FakeCompletions(replies)
+    backend.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return backend, completions
+
+
+def create(backend):
+    return asyncio.run(backend._create("system", "prompt", ListenerResponse, "model"))
+
+
+VALID = ('{"thoughts": "t", "vote": "A"}', None)
+INVALID = ('{"thoughts": "t", "vote": "maybe"}', None)
+
+
+def test_native_json_reply_is_validated_without_reasks(monkeypatch):
+    backend, completions = native_backend(monkeypatch, [VALID])
+    response, usage, reasks = create(backend)
+    assert response == ListenerResponse(thoughts="t", vote="A") and reasks == 0
+    assert usage == {"prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 0, "total_tokens": 15}
+    assert completions.requests[0]["response_format"] == backends.response_format(ListenerResponse)
+
+
+def test_invalid_native_json_reply_is_reasked_with_the_error(monkeypatch):
+    backend, completions = native_backend(monkeypatch, [INVALID, VALID])
+    response, usage, reasks = create(backend)
+    assert response.vote == "A" and reasks == 1
+    # the re-ask's tokens are billed too
+    assert usage["total_tokens"] == 30
+    retry_messages = completions.requests[1]["messages"]
+    assert retry_messages[:2] == completions.requests[0]["messages"]
+    assert retry_messages[2] == {"role": "assistant", "content": INVALID[0]}
+    assert "vote" in retry_messages[3]["content"]
+
+
+def test_native_json_reasks_are_limited(monkeypatch):
+    backend, completions = native_backend(monkeypatch, [INVALID] * (STRUCTURED_OUTPUT_REASKS + 1))
+    with pytest.raises(ValidationError):
+        create(backend)
+    assert len(completions.requests) == STRUCTURED_OUTPUT_REASKS + 1
+
+
+def test_native_json_refusal_is_not_reasked(monkeypatch):
+    backend, completions = native_backend(monkeypatch, [(None, "I can't help with that"), VALID])
+    with pytest.raises(ValueError, match="refused"):
+        create(backend)
+    assert len(completions.requests) == 1
+
+
+def test_reasks_are_reported_with_the_call(monkeypatch, sleeps):
+    backend, _ = native_backend(monkeypatch, [INVALID, VALID])
+    backend.semaphore, backend._pid = asyncio.Semaphore(1), os.getpid()
+    result = complete(backend)
+    assert result.reasks == 1 and result.retries == 0 and result.usage["total_tokens"] == 30
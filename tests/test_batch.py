@@ -0,0 +1,15 @@
+from batch import run_replicates
+
+
+def _outcomes(summaries: list) -> list:
+    return [(summary["final_votes"], summary["total_tokens"]) for summary in summaries]
+
+
+def test_seeded_replicates_are_reproducible(workdir, fake_backend):
+    first = run_replicates("s0", 2, workers=2, cache_mode="off", seed=7)
+    second = run_replicates("s0", 2, workers=2, cache_mode="off", seed=7)
+    assert not any(summary.get("error") for summary in first)
+    assert _outcomes(first) == _outcomes(second)
+    # each replicate draws its own committee from seed + i
+    assert _outcomes(first)[0] != _outcomes(first)[1]
+    assert _outcomes(run_replicates("s0", 1, workers=1, cache_mode="off", seed=8)) == _outcomes(first)[1:]
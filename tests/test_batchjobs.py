@@ -0,0 +1,80 @@
+import os
+import queue
+import threading
+
+import pytest
+
+import batchjobs
+import llm
+import memory
+from batchjobs import LocalBatchClient, QueuedBatchBackend, run_batch_job, run_lockstep
+from benchmarks.fake_llm import FakeLLMBackend
+from config import random_traits
+from memory import append_scratchpad, compact_scratchpads
+from state import AgentState, Scratchpad, Vote
+
+
+@pytest.fixture
+def client(workdir):
+    return LocalBatchClient(FakeLLMBackend())
+
+
+def test_local_client_answers_every_request(client):
+    requests = [
+        batchjobs.request_line(f"c-{i}", "system", f"prompt {i}", llm.ScratchpadSummary, "model")
+        for i in range(3)
+    ]
+    results = run_batch_job(client, requests, "job", poll_interval=0)
+    assert sorted(results) == ["c-0", "c-1", "c-2"]
+    assert all(result["response"]["status_code"] == 200 for result in results.values())
+    assert os.path.exists(f"{batchjobs.BATCH_JOB_DIR}/job_00.output.jsonl")
+
+
+def test_lockstep_runs_more_simulations_than_workers(client):
+    summaries = run_lockstep("s1", [random_traits() for _ in range(3)], client, "off", poll_interval=0, workers=2)
+    assert len(summaries) == 3
+    assert not any(summary.get("error") for summary in summaries)
+
+
+def _die_for_r001(experiment_name, traits, sample_index, run_label, *args):
+    if run_label == "r001":
+        os._exit(1)
+    return _run_lockstep_job(experiment_name, traits, sample_index, run_label, *args)
+
+
+_run_lockstep_job = batchjobs._run_lockstep_job
+
+
+def test_dead_process_fails_only_its_own_run(client, monkeypatch):
+    monkeypatch.setattr(batchjobs, "_run_lockstep_job", _die_for_r001)
+    monkeypatch.setattr(batchjobs, "BATCH_JOB_WORKER_TIMEOUT", 0.5)
+    summaries = run_lockstep("s1", [random_traits() for _ in range(3)], client, "off", poll_interval=0, workers=3)
+    errors = {summary["run"]: summary.get("error") for summary in summaries}
+    assert errors.pop("r001") == "process exited with code 1"
+    assert len(errors) == 2 and not any(errors.values())
+
+
+def test_compaction_summaries_share_one_batch_job(client, monkeypatch):
+    monkeypatch.setattr(memory, "SCRATCHPAD_TOKEN_BUDGET", 10)
+    monkeypatch.setattr(memory, "SCRATCHPAD_KEEP_RECENT", 1)
+    monkeypatch.setattr(llm, "_concurrent_calls", True)
+    requests, replies = queue.Queue(), queue.Queue()
+    monkeypatch.setattr(llm, "_backend", QueuedBatchBackend("r000", requests, replies))
+    agents = {}
+    for name in ("Alice", "Bob", "Charlie"):
+        agent = AgentState(traits=[], current_vote=Vote.UNDECIDED, base="", summary="", entries=Scratchpad.empty())
+        for round_number in range(1, 4):
+            agent = append_scratchpad(agent, f"\n{name} note {round_number} " + "x" * 80, round_number, "listener")
+        agents[name] = agent
+
+    compacted = {}
+    worker = threading.Thread(target=lambda: compacted.update(compact_scratchpads(agents)))
+    worker.start()
+    kind, label, pending = requests.get(timeout=5)
+    replies.put(run_batch_job(client, pending, "compaction", poll_interval=0))
+    worker.join(timeout=5)
+
+    assert (kind, label, len(pending)) == ("requests", "r000", 3)
+    assert requests.empty()
+    assert sorted(compacted) == ["Alice", "Bob", "Charlie"]
+    assert all(agent.summary and sum(not entry.folded for entry in agent.entries) == 1 for agent in compacted.values())
@@ -0,0 +1,33 @@
+from branch import apply_variant, branch_sample_index, eviction_round, eviction_variants, run_branches
+from config import AGENT_NAMES, random_traits
+from dryrun import validate_scenario
+from experiments import SCENARIOS
+
+
+def test_evict_variants_take_the_fork_round_when_the_scenario_schedules_no_eviction():
+    assert eviction_round(SCENARIOS["s2"], branch_after=2) == SCENARIOS["s2"]["eviction"]["after_round"]
+    assert eviction_round(SCENARIOS["s1"], branch_after=2) == 2
+    assert eviction_round(SCENARIOS["s1"]) is None
+
+    scenario = dict(SCENARIOS["s1"], traits=random_traits())
+    for variant in eviction_variants(AGENT_NAMES[:2], eviction_round(scenario, 2)):
+        assert validate_scenario("s1", apply_variant(scenario, variant))["errors"] == []
+
+
+def test_dry_run_reports_an_eviction_without_a_round():
+    scenario = dict(SCENARIOS["s1"], traits=random_traits(), eviction={"agent": AGENT_NAMES[0], "message": "gone"})
+    assert validate_scenario("s1", scenario)["errors"] == ["eviction has no after_round"]
+
+
+def test_branch_sample_indices_stay_clear_of_replicates():
+    assert branch_sample_index(0) > 10_000
+
+
+def test_branches_evict_on_a_scenario_without_an_eviction_schedule(workdir, fake_backend):
+    variants = eviction_variants(AGENT_NAMES[:2], eviction_round(SCENARIOS["s1"], 1))
+    trunk, *branches = run_branches("s1", 1, variants, workers=2, cache_mode="off", traits=random_traits())
+    assert trunk["run"].endswith("_trunk")
+    assert [summary["run"][-3:] for summary in branches] == ["b00", "b01"]
+    assert not any(summary.get("error") for summary in branches)
+    for agent, summary in zip(AGENT_NAMES, branches):
+        assert set(summary["final_votes"]) == set(AGENT_NAMES) - {agent}
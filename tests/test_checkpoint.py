@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import core
+import ledger
+import llm
+
+from checkpoint import (
+    CHECKPOINT_VERSION, checkpoint_path, save_checkpoint, load_checkpoint, mark_finished, state_to_dict, state_from_dict
+)
+from experiments import SCENARIOS, run_scenario, resume_run
+
+
+def test_save_and_load_round_trip(workdir):
+    (workdir / "logs").mkdir()
+    save_checkpoint("run", {"completed_round": 2, "finished": False})
+    assert load_checkpoint("run") == {"completed_round": 2, "finished": False, "version": CHECKPOINT_VERSION}
+    assert not (workdir / "logs" / "run.checkpoint.json.tmp").exists()
+
+
+def test_unsupported_version_is_rejected(workdir):
+    (workdir / "logs").mkdir()
+    with open(checkpoint_path("run"), "w") as f:
+        json.dump({"version": CHECKPOINT_VERSION - 1}, f)
+    with pytest.raises(ValueError):
+        load_checkpoint("run")
+
+
+def test_missing_checkpoint(workdir):
+    with pytest.raises(FileNotFoundError):
+        load_checkpoint("nothing")
+
+
+def test_state_round_trip(workdir, fake_backend):
+    summary = run_scenario("s3", SCENARIOS["s3"], run_label="t", stop_after_round=4)
+    data = load_checkpoint(summary["run"])["state"]
+    assert state_to_dict(state_from_dict(data)) == data
+
+
+def test_resumed_run_matches_uninterrupted_run(workdir, fake_backend):
+    full = run_scenario("s3", SCENARIOS["s3"], run_label="full")
+    # stopping after round 3 leaves its memory injection and the later speech corruption to the resumed part
+    part = run_scenario("s3", SCENARIOS["s3"], run_label="part", stop_after_round=3)
+    checkpoint = load_checkpoint(part["run"])
+    assert not checkpoint["finished"] and checkpoint["completed_round"] == 3
+
+    resumed = resume_run(part["run"])
+    for field in ("consensus_round", "final_votes", "calls", "total_tokens", "cost"):
+        assert resumed[field] == full[field], field
+    assert load_checkpoint(part["run"])["state"] == load_checkpoint(full["run"])["state"]
+
+
+def test_finished_run_is_not_resumed(workdir, fake_backend):
+    summary = run_scenario("s1", SCENARIOS["s1"], run_label="t")
+    assert load_checkpoint(summary["run"])["finished"]
+    with pytest.raises(ValueError):
+        resume_run(summary["run"])
+
+
+def test_budget_stopped_run_resumes_to_the_same_result(workdir, fake_backend, monkeypatch):
+    full = run_scenario("s3", SCENARIOS["s3"], run_label="full")
+    monkeypatch.setitem(ledger._budget, "max_tokens", full["total_tokens"] // 3)
+    stopped = run_scenario("s3", SCENARIOS["s3"], run_label="stopped")
+    checkpoint = load_checkpoint(stopped["run"])
+    assert not checkpoint["finished"] and checkpoint["completed_round"] < SCENARIOS["s3"]["max_rounds"]
+    # the round's events were left for the resumed run
+    assert not checkpoint["round_events_done"]
+
+    monkeypatch.setitem(ledger._budget, "max_tokens", None)
+    resumed = resume_run(stopped["run"])
+    for field in ("consensus_round", "final_votes", "calls", "total_tokens", "cost"):
+        assert resumed[field] == full[field], field
+    assert load_checkpoint(stopped["run"])["finished"]
+
+
+def test_resume_restores_sample_index_and_listener_batch_size(workdir, fake_backend, monkeypatch):
+    monkeypatch.setattr(llm, "_sample_index", 7)
+    monkeypatch.setattr(core, "_listener_batch_size", 2)
+    part = run_scenario("s1", SCENARIOS["s1"], run_label="t", stop_after_round=1)
+    llm.configure_cache(sample_index=0)
+    core.set_listener_batch_size(1)
+    resume_run(part["run"])
+    assert llm.get_sample_index() == 7 and core.get_listener_batch_size() == 2
+
+
+def test_mark_finished(workdir):
+    (workdir / "logs").mkdir()
+    save_checkpoint("run", {"finished": False})
+    mark_finished("run")
+    assert load_checkpoint("run")["finished"]
@@ -0,0 +1,66 @@
+import random
+from collections import Counter
+
+import core
+from batch import run_replicates
+from benchmarks.fake_llm import FakeLLMBackend
+from committee import committee_names, committee_problem, sample_traits
+from config import PROBLEM, CORRUPTED_PROBLEMS_S3, PROBLEM_S2
+from core import run_simulation_round, validate_listener_batch
+from experiments import new_state
+from llm import ListenerBatch, ListenerBatchEntry
+import llm
+
+
+def test_committee_problem_states_the_actual_committee():
+    names = committee_names(6)
+    for problem in [PROBLEM, PROBLEM_S2] + CORRUPTED_PROBLEMS_S3:
+        text = committee_problem(problem, names)
+        assert "{" not in text
+        assert "All 6 active committee members must vote for the same option" in text
+        assert all(f"- {name}\n" in text for name in names)
+
+
+def entry(name, vote="A"):
+    return ListenerBatchEntry(agent_name=name, thoughts="t", vote=vote)
+
+
+def test_listener_batch_keeps_only_members_answered_once():
+    batch = ListenerBatch(responses=[entry("Alice"), entry("Bob"), entry("Bob", "B"), entry("Mallory")])
+    responses = validate_listener_batch(["Alice", "Bob", "Charlie"], batch)
+    assert list(responses) == ["Alice"]
+    assert responses["Alice"].vote == "A"
+
+
+class DroppingBackend(FakeLLMBackend):
+    """The fake backend, except that batched listener calls leave out their first listener."""
+
+    def __init__(self):
+        super().__init__()
+        self.models = Counter()
+
+    async def complete(self, system_prompt, prompt, response_model, model=None):
+        self.models[response_model.__name__] += 1
+        result = await super().complete(system_prompt, prompt, response_model, model)
+        if response_model is ListenerBatch:
+            result = result._replace(response=ListenerBatch(responses=result.response.responses[1:]))
+        return result
+
+
+def test_listeners_missing_from_a_batch_are_asked_individually(monkeypatch):
+    backend = DroppingBackend()
+    monkeypatch.setattr(llm, "_backend", backend)
+    monkeypatch.setattr(core, "_listener_batch_size", 3)
+    state = new_state(sample_traits(8))
+    names = list(state.agents)
+    after = run_simulation_round(state, 1, names, PROBLEM)
+    # seven listeners in batches of 3, 3 and 1, each batch missing one listener
+    assert backend.models == {"SpeakerDeliberation": 1, "ListenerBatch": 3, "ListenerResponse": 3}
+    assert all(len(after.agents[name].entries) == 1 for name in names)
+
+
+def test_replicates_use_the_given_committees(workdir, fake_backend):
+    random.seed(0)
+    traits_list = [sample_traits(6) for _ in range(2)]
+    summaries = run_replicates("s1", 2, 2, traits_list=traits_list)
+    assert [list(summary["final_votes"]) for summary in summaries] == [committee_names(6)] * 2
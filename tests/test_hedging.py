@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import llm
+from benchmarks.fake_llm import FakeLLMBackend
+from config import HEDGE_MIN_SAMPLES, HEDGE_WINDOW
+from llm import ListenerResponse, fallback_response, get_llm_response, get_llm_stats
+from ratelimit import LatencyTracker
+
+MODEL = "hedge-model"
+USUAL_LATENCY = 0.02
+
+
+class ScriptedLatencyBackend(FakeLLMBackend):
+    """The fake backend, with each request's latency (and failure) taken in turn from a script."""
+
+    def __init__(self, script: list):
+        super().__init__()
+        self.script = list(script)
+        self.cancelled = 0
+
+    async def complete(self, system_prompt, prompt, response_model, model=None):
+        latency, error = self.script.pop(0)
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if error:
+            raise ValueError(f"request failed after {latency}s")
+        return await super().complete(system_prompt, prompt, response_model, model)
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """Hedging on, with fresh stats and breakers and a usual latency of USUAL_LATENCY for listener calls."""
+    latencies = LatencyTracker(HEDGE_WINDOW)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        latencies.add(("listener", MODEL), USUAL_LATENCY)
+    monkeypatch.setattr(llm, "_hedging", True)
+    monkeypatch.setattr(llm, "_latencies", latencies)
+    monkeypatch.setattr(llm, "_circuit_breakers", {})
+    llm.reset_llm_stats()
+    return latencies
+
+
+def ask(monkeypatch, script: list) -> tuple:
+    backend = ScriptedLatencyBackend(script)
+    monkeypatch.setattr(llm, "_backend", backend)
+    response = get_llm_response("prompt", ListenerResponse, model=MODEL, meta={"role": "listener"})
+    return response, backend
+
+
+def test_slow_request_is_hedged_and_the_hedge_wins(hedging, monkeypatch):
+    response, backend = ask(monkeypatch, [(2.0, False), (0.0, False)])
+    assert response != fallback_response(ListenerResponse)
+    assert backend.cancelled == 1 and backend.script == []
+    stats = get_llm_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_usual_request_is_not_hedged(hedging, monkeypatch):
+    _, backend = ask(monkeypatch, [(0.0, False), (0.0, False)])
+    assert len(backend.script) == 1
+    assert get_llm_stats()["hedges"] == 0
+
+
+def test_no_hedging_before_enough_latencies_are_known(hedging, monkeypatch):
+    hedging.samples[("listener", MODEL)].pop()
+    _, backend = ask(monkeypatch, [(4 * USUAL_LATENCY, False), (0.0, False)])
+    assert len(backend.script) == 1
+    assert get_llm_stats()["hedges"] == 0
+
+
+def test_original_request_can_still_win(hedging, monkeypatch):
+    _, backend = ask(monkeypatch, [(4 * USUAL_LATENCY, False), (2.0, False)])
+    assert backend.cancelled == 1
+    stats = get_llm_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 0
+
+
+def test_failed_request_leaves_the_other_one_to_answer(hedging, monkeypatch):
+    response, _ = ask(monkeypatch, [(4 * USUAL_LATENCY, True), (8 * USUAL_LATENCY, False)])
+    assert response != fallback_response(ListenerResponse)
+    assert get_llm_stats()["hedge_wins"] == 1
+
+
+def test_both_requests_failing_falls_back(hedging, monkeypatch):
+    response, _ = ask(monkeypatch, [(4 * USUAL_LATENCY, True), (0.0, True)])
+    assert response == fallback_response(ListenerResponse)
+    assert get_llm_stats()["fallbacks"] == 1
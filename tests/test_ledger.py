@@ -0,0 +1,47 @@
+import pytest
+
+import ledger
+from checkpoint import load_checkpoint
+from experiments import SCENARIOS, run_scenario
+from ledger import Ledger, resume_ledger
+
+USAGE = {"prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 0}
+
+
+def spend(run_ledger: Ledger, calls: int) -> Ledger:
+    for _ in range(calls):
+        run_ledger.record({"role": "listener"}, "gpt-5", "ListenerResponse", USAGE, 0.1)
+    return run_ledger
+
+
+def test_no_budget_never_stops():
+    assert spend(Ledger(), 100).budget_exceeded() is None
+
+
+@pytest.mark.parametrize("budget, calls_allowed, reason", [
+    ({"max_tokens": 3000}, 1, "token budget"),
+    # each call costs 1000 * $1.25 + 500 * $10 per 1M tokens, $0.00625
+    ({"max_dollars": 0.02}, 3, "cost budget"),
+])
+def test_budget_is_exceeded_once_reached(budget, calls_allowed, reason):
+    run_ledger = spend(Ledger(**budget), calls_allowed)
+    assert run_ledger.budget_exceeded() is None
+    assert spend(run_ledger, 1).budget_exceeded().startswith(reason)
+
+
+def test_wall_time_of_earlier_sessions_counts():
+    run_ledger = resume_ledger({"records": [], "elapsed": 30.0})
+    run_ledger.max_seconds = 60.0
+    assert run_ledger.budget_exceeded() is None
+    run_ledger.elapsed_before = 60.0
+    assert "wall time" in run_ledger.budget_exceeded()
+
+
+@pytest.mark.parametrize("budget", [{"max_tokens": 1}, {"max_dollars": 0.000001}, {"max_seconds": 0}])
+def test_exhausted_budget_stops_the_run_after_the_round(workdir, fake_backend, monkeypatch, budget):
+    for key, value in budget.items():
+        monkeypatch.setitem(ledger._budget, key, value)
+    summary = run_scenario("s1", SCENARIOS["s1"], run_label="t")
+    checkpoint = load_checkpoint(summary["run"])
+    assert checkpoint["completed_round"] == 1 and not checkpoint["finished"]
+    assert summary["consensus_round"] is None
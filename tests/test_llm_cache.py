@@ -0,0 +1,89 @@
+import itertools
+
+import pytest
+from pydantic import BaseModel
+
+import llm_cache
+from llm_cache import ResponseCache, CacheMissError
+
+
+class Answer(BaseModel):
+    vote: str
+
+
+class OtherAnswer(BaseModel):
+    choice: str
+
+
+KEY_ARGS = dict(model="gpt-4o-mini", system_prompt="system", prompt="prompt", response_model=Answer,
+                temperature=0.7, sample_index=0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that advances one second per reading, so last_used orders entries deterministically."""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: next(ticks))
+
+
+def test_key_is_stable():
+    assert ResponseCache.make_key(**KEY_ARGS) == ResponseCache.make_key(**KEY_ARGS)
+
+
+@pytest.mark.parametrize("field, value", [
+    ("model", "gpt-4o"),
+    ("system_prompt", "other system"),
+    ("prompt", "other prompt"),
+    ("response_model", OtherAnswer),
+    ("temperature", 0.0),
+    ("sample_index", 1),
+])
+def test_key_depends_on_every_input(field, value):
+    assert ResponseCache.make_key(**dict(KEY_ARGS, **{field: value})) != ResponseCache.make_key(**KEY_ARGS)
+
+
+def test_readwrite_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), mode="readwrite")
+    assert cache.get("k") is None
+    cache.put("k", '{"vote": "A"}')
+    assert cache.get("k") == '{"vote": "A"}'
+    assert cache.stats() == {"mode": "readwrite", "hits": 1, "misses": 1}
+
+
+def test_readonly_raises_on_miss_and_never_writes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(path, mode="readwrite").put("k", "v")
+    cache = ResponseCache(path, mode="readonly")
+    assert cache.get("k") == "v"
+    cache.put("other", "v")
+    with pytest.raises(CacheMissError):
+        cache.get("other")
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path / "cache.sqlite"), mode="write")
+
+
+def test_evicts_least_recently_used_above_max_bytes(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), mode="readwrite", max_bytes=25)
+    for key in "abc":
+        cache.put(key, "x" * 10)
+    # reading "a" makes "b" the least recently used entry
+    cache.get("a")
+    cache.evict()
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_evicts_entries_older_than_max_age(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), mode="readwrite", max_age_days=1)
+    cache.put("old", "v")
+    now[0] += 2 * 86400
+    cache.put("new", "v")
+    cache.evict()
+    assert cache.get("old") is None
+    assert cache.get("new") == "v"
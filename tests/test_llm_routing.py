@@ -0,0 +1,100 @@
+from collections import Counter
+
+import httpx
+import openai
+import pytest
+
+import llm
+from backends import RecordingBackend, ReplayBackend
+from benchmarks.fake_llm import FakeLLMBackend
+from config import CIRCUIT_BREAKER_THRESHOLD
+from llm import ListenerResponse, get_llm_response, fallback_response, get_llm_stats
+
+CHEAP, REFERENCE = "cheap-model", "reference-model"
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def validation_error():
+    try:
+        ListenerResponse.model_validate({"thoughts": "t", "vote": "maybe"})
+    except Exception as e:
+        return e
+
+
+class TieredBackend(FakeLLMBackend):
+    """The fake backend, except that some models always fail with a given error."""
+
+    def __init__(self, errors: dict):
+        super().__init__()
+        self.errors = errors
+        self.models = Counter()
+
+    async def complete(self, system_prompt, prompt, response_model, model=None):
+        self.models[model] += 1
+        if model in self.errors:
+            raise self.errors[model]()
+        return await super().complete(system_prompt, prompt, response_model, model)
+
+
+@pytest.fixture
+def tiers(monkeypatch):
+    """Routes listener calls to a cheap model first, with fresh breakers and stats."""
+    monkeypatch.setattr(llm, "_routes", {"listener": [CHEAP, REFERENCE]})
+    monkeypatch.setattr(llm, "_circuit_breakers", {})
+    llm.reset_llm_stats()
+
+
+def install(monkeypatch, errors: dict) -> TieredBackend:
+    backend = TieredBackend(errors)
+    monkeypatch.setattr(llm, "_backend", backend)
+    return backend
+
+
+def ask(times: int) -> list:
+    return [get_llm_response(f"prompt {i}", ListenerResponse, meta={"role": "listener"}) for i in range(times)]
+
+
+def test_validation_failures_escalate_without_tripping_a_breaker(tiers, monkeypatch):
+    backend = install(monkeypatch, {CHEAP: validation_error})
+    responses = ask(3 * CIRCUIT_BREAKER_THRESHOLD)
+    assert fallback_response(ListenerResponse) not in responses
+    assert backend.models[CHEAP] == backend.models[REFERENCE] == 3 * CIRCUIT_BREAKER_THRESHOLD
+    stats = get_llm_stats()
+    assert stats["circuit_breaker_trips"] == 0 and stats["fallbacks"] == 0
+
+
+def test_open_breaker_skips_to_the_next_tier(tiers, monkeypatch):
+    backend = install(monkeypatch, {CHEAP: connection_error})
+    responses = ask(3 * CIRCUIT_BREAKER_THRESHOLD)
+    assert fallback_response(ListenerResponse) not in responses
+    # once its breaker is open, the cheap model is not asked any more
+    assert backend.models[CHEAP] == CIRCUIT_BREAKER_THRESHOLD
+    assert backend.models[REFERENCE] == 3 * CIRCUIT_BREAKER_THRESHOLD
+    stats = get_llm_stats()
+    assert stats["circuit_breaker_trips"] == 1 and stats["fallbacks"] == 0
+    assert stats["escalations"] == 3 * CIRCUIT_BREAKER_THRESHOLD
+
+
+def test_open_breaker_of_the_last_tier_falls_back(tiers, monkeypatch):
+    backend = install(monkeypatch, {CHEAP: connection_error, REFERENCE: connection_error})
+    responses = ask(2 * CIRCUIT_BREAKER_THRESHOLD)
+    assert responses == [fallback_response(ListenerResponse)] * (2 * CIRCUIT_BREAKER_THRESHOLD)
+    assert backend.models[REFERENCE] == CIRCUIT_BREAKER_THRESHOLD
+    # the second half of the calls finds both breakers open
+    assert get_llm_stats()["circuit_open"] == 2 * CIRCUIT_BREAKER_THRESHOLD
+
+
+def test_tiered_calls_replay_from_a_cassette(tiers, monkeypatch, workdir):
+    cassette = str(workdir / "tiers.jsonl")
+    monkeypatch.setattr(llm, "_backend", RecordingBackend(TieredBackend({CHEAP: validation_error}), cassette))
+    recorded = ask(3)
+    recorded_escalations = get_llm_stats()["escalations"]
+
+    llm.reset_llm_stats()
+    monkeypatch.setattr(llm, "_backend", ReplayBackend(cassette))
+    assert ask(3) == recorded
+    # the cheap tier fails on replay as it did when recorded, so the call escalates the same way
+    assert get_llm_stats()["escalations"] == recorded_escalations == 3
@@ -0,0 +1,46 @@
+import pytest
+
+import llm
+import memory
+from backends import CallResult
+from benchmarks.fake_llm import FakeLLMBackend
+from llm import ScratchpadSummary, get_llm_response
+from memory import append_scratchpad, compact_scratchpad
+from state import AgentState, Scratchpad, Vote
+
+
+class SummaryBackend(FakeLLMBackend):
+    """Answers every summary call with a fixed summary, or fails it."""
+
+    def __init__(self, summary: str = None):
+        super().__init__()
+        self.summary = summary
+
+    async def complete(self, system_prompt, prompt, response_model, model=None):
+        if self.summary is None:
+            raise ValueError("summary call failed")
+        return CallResult(ScratchpadSummary(summary=self.summary), None, 0)
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(memory, "SCRATCHPAD_TOKEN_BUDGET", 10)
+    monkeypatch.setattr(memory, "SCRATCHPAD_KEEP_RECENT", 1)
+    monkeypatch.setattr(memory, "_summary_cache", {})
+    agent = AgentState(traits={}, current_vote=Vote.UNDECIDED, base="", summary="", entries=Scratchpad.empty())
+    for round_number in range(1, 4):
+        agent = append_scratchpad(agent, f"\nnote {round_number} " + "x" * 80, round_number, "listener")
+    return agent
+
+
+def test_failed_summary_keeps_the_notes(agent, monkeypatch):
+    monkeypatch.setattr(llm, "_backend", SummaryBackend())
+    assert get_llm_response("p", ScratchpadSummary, placeholder=False) is None
+    assert compact_scratchpad("Alice", agent) is agent
+
+
+def test_summary_that_reads_like_the_placeholder_is_used(agent, monkeypatch):
+    monkeypatch.setattr(llm, "_backend", SummaryBackend(summary="Error processing."))
+    compacted = compact_scratchpad("Alice", agent)
+    assert compacted.summary == "Error processing."
+    assert [entry.folded for entry in compacted.entries] == [True, True, False]
@@ -0,0 +1,91 @@
+import pytest
+
+from committee import sample_traits
+from core import record_round_votes
+from experiments import new_state
+from state import AgentState, Rope, Vote
+
+
+@pytest.fixture
+def state():
+    return new_state(sample_traits(5))
+
+
+def test_records_are_immutable(state):
+    agent = next(iter(state.agents.values()))
+    with pytest.raises(AttributeError):
+        agent.current_vote = Vote.A
+    with pytest.raises(TypeError):
+        state.agents["Alice"] = agent
+
+
+def test_replace_shares_unchanged_fields(state):
+    agent = state.agents["Alice"]
+    changed = agent.replace(current_vote=Vote.A)
+    assert changed.current_vote is Vote.A and agent.current_vote is Vote.UNDECIDED
+    assert changed.traits is agent.traits and changed.entries is agent.entries
+
+
+def test_with_agents_replaces_several_agents_at_once(state):
+    updates = {name: state.agents[name].replace(current_vote=Vote.B) for name in ("Bob", "David")}
+    changed = state.with_agents(updates)
+    assert list(changed.agents) == list(state.agents)
+    assert changed.votes() == dict(state.votes(), Bob=Vote.B, David=Vote.B)
+    assert all(changed.agents[name] is state.agents[name] for name in ("Alice", "Charlie", "Agent005"))
+    assert changed.transcript is state.transcript and changed.speeches is state.speeches
+    assert state.with_agents({}) is state
+
+
+def test_rounds_append_to_shared_history(state):
+    state = state.replace(speeches=state.speeches.append("Round 1 - Alice: A"))
+    after, votes = record_round_votes(state)
+    assert after.votes_history.parent is state.votes_history
+    assert list(after.votes_history) == [votes] and len(state.votes_history) == 0
+    assert after.speeches is state.speeches and after.speeches.last == "Round 1 - Alice: A"
+    assert "Round 1 - Alice: A" in after.transcript.render()
+
+
+def test_rope_versions_share_earlier_segments():
+    first = Rope.from_segments(["a", "b"])
+    second = first.append("c")
+    third = first.append("d")
+    assert second.parent is first and third.parent is first
+    assert list(second) == ["a", "b", "c"] and list(third) == ["a", "b", "d"]
+    assert len(first) == 2 and Rope.empty().last is None
+
+
+def test_rope_text_is_built_from_the_previous_version():
+    rope = Rope.from_segments(["a", "b"])
+    assert rope.text() == "ab"
+    longer = rope.append("c")
+    assert longer.text() == "abc"
+    # the newer version took the cached text over, so old snapshots do not pin it
+    assert longer._text == "abc" and rope._text is None
+    assert rope.text() == "ab"
+
+
+def test_rope_text_of_a_branch_leaves_the_other_branch_intact():
+    trunk = Rope.from_segments(["a"])
+    trunk.text()
+    left, right = trunk.append("l"), trunk.append("r")
+    assert left.text() == "al"
+    assert right.text() == "ar"
+    assert left.text() == "al"
+
+
+def test_scratchpad_text_joins_entry_texts(state):
+    from memory import append_scratchpad
+    agent = append_scratchpad(state.agents["Alice"], "\nfirst", 1, "speaker")
+    agent = append_scratchpad(agent, "\nsecond", 2, "listener")
+    assert agent.entries.text() == "\nfirst\nsecond"
+    assert agent.scratchpad == agent.base + "\nfirst\nsecond"
+
+
+def test_transcript_render_is_cached_and_last_k_walks_back(state):
+    transcript = state.transcript
+    for round_number in range(1, 4):
+        transcript = transcript.append_round(f"speech {round_number}", {"Alice": Vote.A})
+    assert transcript.render() is transcript.render()
+    assert "speech 1" in transcript.render()
+    last = transcript.render(last=1)
+    assert "speech 3" in last and "speech 2" not in last
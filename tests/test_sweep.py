@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import llm
+import sweep
+from config import AGENT_NAMES, MAX_ROUNDS, SWEEP_MAX_CELL_FAILURES
+from sweep import sobol_points, grid_points, wilson_interval, committee_traits, run_sweep
+
+# one speaker and three listeners per round, the sweep's estimate before any run has reported
+FULL_RUN_CALLS = MAX_ROUNDS * len(AGENT_NAMES)
+
+
+def test_sobol_points_match_reference_sequence():
+    # the first Sobol points after the origin with the Joe & Kuo direction numbers
+    assert sobol_points(7) == [
+        [0.5, 0.5, 0.5],
+        [0.75, 0.25, 0.25],
+        [0.25, 0.75, 0.75],
+        [0.375, 0.375, 0.625],
+        [0.875, 0.875, 0.125],
+        [0.625, 0.125, 0.875],
+        [0.125, 0.625, 0.375],
+    ]
+
+
+def test_sobol_points_stratify_each_dimension():
+    # the first 16 points, origin included, fall in a different 1/16 interval of each dimension
+    points = sobol_points(15)
+    for d in range(3):
+        assert sorted(int(point[d] * 16) for point in points) == list(range(1, 16))
+
+
+def test_sobol_rejects_unsupported_dimensions():
+    with pytest.raises(ValueError):
+        sobol_points(4, dimensions=4)
+
+
+def test_grid_points():
+    assert grid_points(2, dimensions=2) == [[0.25, 0.25], [0.25, 0.75], [0.75, 0.25], [0.75, 0.75]]
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(5, 10)
+    assert low == pytest.approx(0.2366, abs=1e-4)
+    assert high == pytest.approx(0.7634, abs=1e-4)
+
+
+def test_committee_traits_follow_the_design_point():
+    traits = committee_traits([0.5, 0.2, 0.9], spread=0.1, size=6)
+    assert len(traits) == 6
+    for agent in traits:
+        assert list(agent.values()) == pytest.approx([0.5, 0.2, 0.9], abs=0.1)
+
+
+@pytest.fixture
+def no_backend(monkeypatch):
+    """Every run fails: no backend is installed and none can be created without an API key."""
+    monkeypatch.setattr(llm, "_backend", None)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+
+def test_failing_cells_are_given_up(workdir, no_backend):
+    workers = 2
+    results = run_sweep("sobol", 2, workers)
+    assert results["aborted"] is None
+    assert results["calls"] == 0
+    for cell in results["cells"]:
+        assert cell["runs"] == 0
+        # runs already in flight when a cell is given up may still fail
+        assert SWEEP_MAX_CELL_FAILURES <= cell["failures"] < SWEEP_MAX_CELL_FAILURES + workers
+
+
+def test_consecutive_failures_abort_the_sweep(workdir, no_backend, monkeypatch):
+    monkeypatch.setattr(sweep, "SWEEP_MAX_CONSECUTIVE_FAILURES", 2)
+    results = run_sweep("sobol", 4, 1)
+    assert results["aborted"]
+    assert results["failures"] == 2
+
+
+def test_budget_too_small_for_a_run(workdir, fake_backend):
+    results = run_sweep("sobol", 2, 1, call_budget=FULL_RUN_CALLS - 1)
+    assert results["calls"] == 0
+    assert all(cell["runs"] == 0 for cell in results["cells"])
+
+
+def test_budget_stops_the_sweep(workdir, fake_backend):
+    random.seed(0)
+    results = run_sweep("sobol", 2, 1, call_budget=FULL_RUN_CALLS)
+    assert results["failures"] == 0
+    assert sum(cell["runs"] for cell in results["cells"]) >= 1
+    assert results["calls"] <= FULL_RUN_CALLS
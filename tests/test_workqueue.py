@@ -0,0 +1,114 @@
+import random
+import sys
+
+import pytest
+
+import workqueue
+
+from checkpoint import load_checkpoint, save_checkpoint
+from experiments import run_scenario
+from workqueue import WorkQueue, make_jobs, job_run_label, job_sample_index, job_scenario, _unfinished_checkpoint
+
+
+@pytest.fixture
+def queue(workdir):
+    queue = WorkQueue("queue.sqlite", max_attempts=2)
+    queue.enqueue(make_jobs("s1", replicates=2))
+    yield queue
+    queue.close()
+
+
+def test_lease_hands_out_each_job_once(queue):
+    first = queue.lease("w1")
+    second = queue.lease("w2")
+    assert (first["id"], second["id"]) == (1, 2)
+    assert first["attempts"] == 1 and first["queue"] == queue.queue_id
+    assert queue.lease("w3") is None
+    assert queue.counts()["leased"] == 2
+
+
+def test_complete_needs_the_lease(queue):
+    job = queue.lease("w1")
+    assert not queue.complete(job["id"], "w2", {})
+    assert queue.complete(job["id"], "w1", {"run": "r"})
+    assert queue.jobs("done")[0]["result"] == {"run": "r"}
+
+
+def test_expired_lease_is_requeued(queue):
+    job = queue.lease("w1", lease_seconds=-1)
+    # the expired job is the oldest runnable one again
+    retried = queue.lease("w2")
+    assert retried["id"] == job["id"] and retried["attempts"] == 2
+    # the first worker lost the job and can no longer extend or complete it
+    assert not queue.heartbeat(job["id"], "w1")
+    assert not queue.complete(job["id"], "w1", {})
+    assert queue.heartbeat(job["id"], "w2")
+    assert queue.complete(job["id"], "w2", {})
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    for worker in ("w1", "w2"):
+        assert queue.lease(worker, lease_seconds=-1)["id"] == 1
+    assert queue.lease("w3")["id"] == 2
+    failed = queue.jobs("failed")
+    assert [job["id"] for job in failed] == [1]
+    assert "expired" in failed[0]["error"]
+
+
+def test_failed_attempt_is_requeued_until_attempts_are_used(queue):
+    job = queue.lease("w1")
+    assert queue.fail(job["id"], "w1", "boom")
+    assert queue.jobs("queued")[0]["id"] == job["id"]
+    job = queue.lease("w1")
+    assert queue.fail(job["id"], "w1", "boom")
+    assert queue.jobs("failed")[0]["error"] == "boom"
+
+
+def test_queue_id_persists_and_keeps_queues_apart(workdir):
+    first, second = WorkQueue("a.sqlite"), WorkQueue("b.sqlite")
+    assert WorkQueue("a.sqlite").queue_id == first.queue_id
+    jobs = []
+    for queue in (first, second):
+        queue.enqueue(make_jobs("s1"))
+        jobs.append(queue.lease("w"))
+    assert jobs[0]["id"] == jobs[1]["id"]
+    assert job_run_label(jobs[0]) != job_run_label(jobs[1])
+    assert job_sample_index(jobs[0]) != job_sample_index(jobs[1])
+
+
+def test_unfinished_checkpoint_must_match_the_scenario(queue, fake_backend):
+    job = queue.lease("w1")
+    scenario = job_scenario(job)
+    summary = run_scenario(job["experiment"], scenario, run_label=job_run_label(job), stop_after_round=1)
+    checkpoint = load_checkpoint(summary["run"])
+    checkpoint["finished"] = False
+    save_checkpoint(summary["run"], checkpoint)
+    assert _unfinished_checkpoint(job, scenario) == summary["run"]
+    assert _unfinished_checkpoint(job, dict(scenario, max_rounds=1)) is None
+
+
+def test_make_jobs_leaves_the_global_random_state_alone(workdir):
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+    jobs = make_jobs("s0", replicates=2, seed=5)
+    assert random.random() == expected
+    assert jobs == make_jobs("s0", replicates=2, seed=5)
+    assert jobs[0]["traits"] != jobs[1]["traits"]
+
+
+def test_enqueue_command_reports_an_empty_job_list(workdir, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["workqueue.py", "--db", "empty.sqlite", "enqueue", "--experiment", "s1", "--replicates", "0"])
+    workqueue.main()
+    assert capsys.readouterr().out.strip() == "0 jobs enqueued in empty.sqlite"
+
+
+def test_grid_enqueue_draws_the_same_committees_for_the_same_seed(workdir, monkeypatch):
+    for db in ("a.sqlite", "b.sqlite"):
+        monkeypatch.setattr(sys, "argv", ["workqueue.py", "--db", db, "enqueue", "--experiment", "s0", "--design", "grid",
+                                          "--size", "2", "--runs-per-point", "2", "--seed", "3"])
+        workqueue.main()
+    first, second = WorkQueue("a.sqlite"), WorkQueue("b.sqlite")
+    assert [job["traits"] for job in first.jobs()] == [job["traits"] for job in second.jobs()]
+    first.close()
+    second.close()
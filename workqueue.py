@@ -0,0 +1,400 @@
+"""
+Durable work queue for running experiments on several machines.
+
+Jobs (experiment, traits, seed, scenario overrides such as an attack schedule) live in a
+SQLite file. Worker processes on any machine that can open the file lease jobs, run them,
+heartbeat while they do and write the run summaries back. A job whose worker stops
+heartbeating (a crash, a lost machine) is leased again once its lease expires and, when the
+run's checkpoint is visible to the new worker, continues from its last completed round.
+
+    python -m workqueue enqueue --experiment s3 --replicates 20
+    python -m workqueue enqueue --experiment s0 --design sobol --size 16 --runs-per-point 4
+    python -m workqueue work --workers 4                       # on every machine
+    python -m workqueue status
+
+The file needs working file locks, so it should sit on a local disk or a filesystem
+that supports them.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (
+    LOG_DIR, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, LLM_CACHE_MODE, WORK_QUEUE_PATH, WORK_QUEUE_LEASE_SECONDS,
+    WORK_QUEUE_HEARTBEAT_INTERVAL, WORK_QUEUE_MAX_ATTEMPTS, WORK_QUEUE_POLL_INTERVAL, random_traits
+)
+from ratelimit import RateLimiter
+from batch import init_worker
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    traits TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    variant TEXT NOT NULL,
+    tag TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+# job states: waiting for a worker, being run, and the two final ones
+STATUSES = ("queued", "leased", "done", "failed")
+
+
+class WorkQueue:
+    """
+    The jobs table and the transitions between its states. Leasing happens in a write
+    transaction, so two workers never get the same job, and expired leases are taken
+    over by whichever worker asks next. Every queue file gets a random id when it is
+    created, so its jobs' runs and cached samples never mix with another queue's.
+    """
+
+    def __init__(self, path: str = WORK_QUEUE_PATH, max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # autocommit mode, so every transaction is explicit
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('queue_id', ?)", (uuid.uuid4().hex,))
+        self.queue_id = self.db.execute("SELECT value FROM meta WHERE key = 'queue_id'").fetchone()[0]
+
+    def close(self) -> None:
+        self.db.close()
+
+    def enqueue(self, jobs: list) -> list:
+        """Adds jobs, each a dict with experiment, traits, seed and optionally variant and tag; returns their ids."""
+        now = time.time()
+        ids = []
+        self.db.execute("BEGIN IMMEDIATE")
+        for job in jobs:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (experiment, traits, seed, variant, tag, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (job["experiment"], json.dumps(job["traits"]), job["seed"], json.dumps(job.get("variant", {})), job.get("tag"), now)
+            )
+            ids.append(cursor.lastrowid)
+        self.db.execute("COMMIT")
+        return ids
+
+    def lease(self, worker: str, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS) -> dict:
+        """
+        Hands the oldest runnable job to `worker` for `lease_seconds`, or returns None. A job
+        whose lease expired is re-queued first, or failed once it has used all its attempts.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            expired = self.db.execute(
+                "SELECT id, attempts, worker FROM jobs WHERE status = 'leased' AND lease_expires < ?", (now,)
+            ).fetchall()
+            for row in expired:
+                if row["attempts"] >= self.max_attempts:
+                    self._set(row["id"], now, status="failed", worker=None, lease_expires=None,
+                              error=f"lease of {row['worker']} expired after {row['attempts']} attempts")
+                else:
+                    logging.warning(f"Lease of job {row['id']} held by {row['worker']} expired; re-queuing it")
+                    self._set(row["id"], now, status="queued", worker=None, lease_expires=None)
+            row = self.db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            self._set(row["id"], now, status="leased", worker=worker, lease_expires=now + lease_seconds,
+                      attempts=row["attempts"] + 1)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return dict(_job(row), attempts=row["attempts"] + 1, queue=self.queue_id)
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS) -> bool:
+        """Extends the worker's lease on a job; False once the lease was lost to another worker."""
+        now = time.time()
+        cursor = self.db.execute(
+            "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND status = 'leased' AND worker = ?",
+            (now + lease_seconds, now, job_id, worker)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result: dict) -> bool:
+        """Stores a job's run summary; False if the worker no longer held the job."""
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_expires = NULL, updated = ? "
+            "WHERE id = ? AND status = 'leased' AND worker = ?",
+            (json.dumps(result), time.time(), job_id, worker)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """Records a failed attempt: the job goes back to the queue until it has used all its attempts."""
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "worker = NULL, lease_expires = NULL, error = ?, updated = ? WHERE id = ? AND status = 'leased' AND worker = ?",
+            (self.max_attempts, error, time.time(), job_id, worker)
+        )
+        return cursor.rowcount == 1
+
+    def counts(self) -> dict:
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def jobs(self, status: str = None) -> list:
+        query, params = "SELECT * FROM jobs", ()
+        if status:
+            query, params = query + " WHERE status = ?", (status,)
+        return [dict(_job(row), queue=self.queue_id) for row in self.db.execute(query + " ORDER BY id", params)]
+
+    def _set(self, job_id: int, now: float, **fields) -> None:
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        self.db.execute(f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ?", (*fields.values(), now, job_id))
+
+
+def _job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["traits"] = json.loads(job["traits"])
+    job["variant"] = json.loads(job["variant"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def make_jobs(experiment_name: str, replicates: int = 1, variants: list = None, committee_size: int = None,
+              seed: int = 0, traits_list: list = None, tag: str = None) -> list:
+    """
+    Jobs for `replicates` runs of an experiment per variant. Traits are drawn here, from each
+    job's seed, so a job runs the same committee whichever worker picks it up; traits_list
+    gives them explicitly instead (one entry per replicate).
+    """
+    from committee import sample_traits
+    from experiments import SCENARIOS
+
+    scenario = SCENARIOS[experiment_name]
+    jobs = []
+    for replicate in range(replicates):
+        job_seed = seed + replicate
+        rng = random.Random(job_seed)
+        if traits_list:
+            traits = traits_list[replicate]
+        elif committee_size:
+            traits = sample_traits(committee_size, rng=rng)
+        else:
+            traits = scenario.get("traits") or random_traits(rng)
+        for variant in variants or [{}]:
+            jobs.append({"experiment": experiment_name, "traits": traits, "seed": job_seed, "variant": variant, "tag": tag})
+    return jobs
+
+
+def job_run_label(job: dict) -> str:
+    """The run label of a job's runs, unique across queues: the queue's id and the job's."""
+    return f"q{job['queue'][:8]}j{job['id']:05d}"
+
+
+def job_sample_index(job: dict) -> int:
+    """The job's cache sample index, unique across queues and clear of the small indices of local replicates."""
+    return int(job["queue"][:8], 16) * 1_000_000 + job["id"]
+
+
+def job_scenario(job: dict) -> dict:
+    from branch import apply_variant
+    from experiments import SCENARIOS
+    return apply_variant(dict(SCENARIOS[job["experiment"]], traits=job["traits"]), job["variant"])
+
+
+def _unfinished_checkpoint(job: dict, scenario: dict) -> str:
+    """
+    The run id of an earlier, unfinished attempt at this job, if its checkpoint is visible
+    here and was written for the same scenario (traits and variant included).
+    """
+    from checkpoint import load_checkpoint
+
+    expected = json.dumps(scenario, sort_keys=True)
+    paths = sorted(glob.glob(f"{LOG_DIR}/{job['experiment']}_*_{job_run_label(job)}.checkpoint.json"))
+    for path in reversed(paths):
+        run_id = os.path.basename(path)[:-len(".checkpoint.json")]
+        checkpoint = load_checkpoint(run_id)
+        if checkpoint["finished"]:
+            continue
+        if json.dumps(checkpoint["scenario"], sort_keys=True) != expected:
+            logging.warning(f"Job {job['id']}: checkpoint {run_id} is for another scenario; starting over")
+            continue
+        return run_id
+    return None
+
+
+def run_job(job: dict) -> dict:
+    """Runs a job's experiment, or continues an earlier attempt from its checkpoint."""
+    from experiments import run_scenario, resume_run
+    from llm import configure_cache
+
+    # a distinct sample index keeps cached responses of different jobs apart
+    configure_cache(sample_index=job_sample_index(job))
+    random.seed(job["seed"])
+    scenario = job_scenario(job)
+    run_id = _unfinished_checkpoint(job, scenario)
+    if run_id:
+        logging.info(f"Job {job['id']}: resuming {run_id}")
+        return resume_run(run_id)
+    return run_scenario(job["experiment"], scenario, run_label=job_run_label(job))
+
+
+def run_worker(path: str = WORK_QUEUE_PATH, worker: str = None, lease_seconds: float = WORK_QUEUE_LEASE_SECONDS,
+               heartbeat_interval: float = WORK_QUEUE_HEARTBEAT_INTERVAL, poll_interval: float = WORK_QUEUE_POLL_INTERVAL,
+               max_jobs: int = None) -> int:
+    """
+    Leases and runs jobs until the queue has none left (or after max_jobs), heartbeating
+    from a background thread while a job runs. Returns the number of jobs completed.
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(path)
+    completed = 0
+    try:
+        while max_jobs is None or completed < max_jobs:
+            job = queue.lease(worker, lease_seconds)
+            if job is None:
+                counts = queue.counts()
+                if not counts["queued"] and not counts["leased"]:
+                    break
+                # other workers' jobs may still come back if their leases expire
+                time.sleep(poll_interval)
+                continue
+
+            logging.info(f"{worker}: job {job['id']} ({job['experiment']}, attempt {job['attempts']})")
+            stop = threading.Event()
+            heartbeats = threading.Thread(
+                target=_heartbeat, args=(path, job["id"], worker, lease_seconds, heartbeat_interval, stop), daemon=True
+            )
+            heartbeats.start()
+            try:
+                summary = run_job(job)
+            except Exception as e:
+                logging.error(f"{worker}: job {job['id']} failed: {e}")
+                queue.fail(job["id"], worker, f"{type(e).__name__}: {e}")
+                continue
+            finally:
+                stop.set()
+                heartbeats.join()
+            if queue.complete(job["id"], worker, summary):
+                completed += 1
+            else:
+                logging.warning(f"{worker}: lost the lease on job {job['id']} before finishing; its result is dropped")
+    finally:
+        queue.close()
+    return completed
+
+
+def _heartbeat(path: str, job_id: int, worker: str, lease_seconds: float, interval: float, stop: threading.Event) -> None:
+    # a connection of its own: sqlite connections are not shared across threads
+    queue = WorkQueue(path)
+    try:
+        while not stop.wait(interval):
+            if not queue.heartbeat(job_id, worker, lease_seconds):
+                logging.warning(f"{worker}: lease on job {job_id} was lost")
+                return
+    finally:
+        queue.close()
+
+
+def run_workers(path: str, workers: int, cache_mode: str = LLM_CACHE_MODE, **options) -> int:
+    """Runs `workers` worker processes on this machine, sharing one rate limiter; returns the jobs they completed."""
+    limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(limiter, cache_mode)) as pool:
+        futures = [pool.submit(run_worker, path, **options) for _ in range(workers)]
+        return sum(future.result() for future in futures)
+
+
+def format_status(queue: WorkQueue) -> str:
+    from batch import format_summary_table
+
+    counts = queue.counts()
+    lines = [", ".join(f"{count} {status}" for status, count in counts.items())]
+    for job in queue.jobs("leased"):
+        lines.append(f"job {job['id']:>5} leased by {job['worker']} (attempt {job['attempts']}, "
+                     f"lease ends in {job['lease_expires'] - time.time():.0f}s)")
+    for job in queue.jobs("failed"):
+        lines.append(f"job {job['id']:>5} failed after {job['attempts']} attempts: {job['error']}")
+    done = [job["result"] for job in queue.jobs("done")]
+    if done:
+        lines.append("")
+        lines.append(format_summary_table(done))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable job queue for running experiments across machines.")
+    parser.add_argument("--db", type=str, default=WORK_QUEUE_PATH, help=f"Queue file (default: {WORK_QUEUE_PATH}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add jobs to the queue.")
+    enqueue.add_argument("--experiment", type=str, required=True, choices=["s0", "s1", "s2", "s3"])
+    enqueue.add_argument("--replicates", type=int, default=1, help="Runs per variant (default: 1).")
+    enqueue.add_argument("--committee-size", type=int, default=None, help="Sample committees of this size.")
+    enqueue.add_argument("--variants", type=str, default=None, metavar="FILE",
+                         help="JSON list of scenario overrides (e.g. attack schedules); one set of runs each.")
+    enqueue.add_argument("--design", type=str, choices=["grid", "sobol"], default=None,
+                         help="Enqueue a trait sweep: committees around each design point.")
+    enqueue.add_argument("--size", type=int, default=16, help="Sobol points, or grid levels per trait (default: 16).")
+    enqueue.add_argument("--runs-per-point", type=int, default=4, help="Runs per design point (default: 4).")
+    enqueue.add_argument("--seed", type=int, default=0, help="Seed of the first job; later jobs count up (default: 0).")
+
+    work = commands.add_parser("work", help="Run jobs until the queue is empty.")
+    work.add_argument("--workers", type=int, default=1, help="Worker processes on this machine (default: 1).")
+    work.add_argument("--lease", type=float, default=WORK_QUEUE_LEASE_SECONDS, help="Lease length in seconds.")
+    work.add_argument("--heartbeat", type=float, default=WORK_QUEUE_HEARTBEAT_INTERVAL, help="Seconds between heartbeats.")
+    work.add_argument("--max-jobs", type=int, default=None, help="Stop each worker after this many jobs.")
+    work.add_argument("--cache", type=str, choices=["readwrite", "readonly", "off"], default=LLM_CACHE_MODE)
+
+    commands.add_parser("status", help="Print job counts, leases, failures and finished runs.")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.db)
+    if args.command == "enqueue":
+        from branch import load_variants
+        variants = load_variants(args.variants) if args.variants else None
+        if args.design:
+            from sweep import grid_points, sobol_points, committee_traits
+            points = grid_points(args.size) if args.design == "grid" else sobol_points(args.size)
+            jobs = []
+            for cell, point in enumerate(points):
+                rng = random.Random(args.seed + cell)
+                traits_list = [committee_traits(point, rng=rng) for _ in range(args.runs_per_point)]
+                jobs += make_jobs(args.experiment, args.runs_per_point, variants, seed=args.seed + cell * args.runs_per_point,
+                                  traits_list=traits_list, tag=f"{args.design}-c{cell:03d}")
+        else:
+            jobs = make_jobs(args.experiment, args.replicates, variants, args.committee_size, args.seed)
+        ids = queue.enqueue(jobs)
+        if ids:
+            print(f"{len(ids)} jobs enqueued in {args.db} (ids {ids[0]}-{ids[-1]})")
+        else:
+            print(f"0 jobs enqueued in {args.db}")
+    elif args.command == "work":
+        queue.close()
+        completed = run_workers(args.db, args.workers, args.cache, lease_seconds=args.lease,
+                                heartbeat_interval=args.heartbeat, max_jobs=args.max_jobs)
+        print(f"{completed} jobs completed on this machine")
+        queue = WorkQueue(args.db)
+        print(format_status(queue))
+    else:
+        print(format_status(queue))
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()